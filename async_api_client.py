@@ -1,8 +1,70 @@
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional, Union, Callable
 import aiohttp
 import asyncio
+import json
 import time
 
+# 빠른 JSON 디코더는 설치돼 있을 때만 사용 (없으면 표준 json)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# 응답 본문이 이보다 크면 디코딩을 스레드로 넘겨서 이벤트 루프가 멈추지 않게 함
+DECODE_IN_THREAD_BYTES = 256 * 1024
+
+def decode_json(body: bytes) -> Any:
+    """일반 JSON 디코딩 (orjson이 있으면 orjson)"""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+if msgspec is not None:
+    # 경매장 응답에서 실제로 읽는 필드만 정의. 나머지(Icon, 입찰 정보 등)는 디코딩하지 않고 건너뜀
+    class AuctionOptionFields(msgspec.Struct):
+        Type: str = ""
+        OptionName: str = ""
+        Value: Union[int, float, None] = None
+        IsValuePercentage: bool = False
+
+    class AuctionInfoFields(msgspec.Struct):
+        BuyPrice: Optional[int] = None
+        TradeAllowCount: Optional[int] = None
+        EndDate: Optional[str] = None
+
+    class AuctionItemFields(msgspec.Struct):
+        Name: str = ""
+        Grade: str = ""
+        GradeQuality: Optional[int] = None
+        AuctionInfo: AuctionInfoFields = msgspec.field(default_factory=AuctionInfoFields)
+        Options: List[AuctionOptionFields] = []
+
+    class AuctionResponseFields(msgspec.Struct):
+        TotalCount: int = 0
+        Items: Optional[List[AuctionItemFields]] = None
+
+    _auction_response_decoder = msgspec.json.Decoder(AuctionResponseFields)
+
+    def decode_auction_struct(body: bytes) -> "AuctionResponseFields":
+        """경매장 응답을 필요한 필드만 가진 Struct로 디코딩"""
+        return _auction_response_decoder.decode(body)
+else:
+    decode_auction_struct = None
+
+def decode_auction_response(body: bytes) -> Dict:
+    """
+    경매장 응답을 dict로 디코딩 (process_requests 기본 decoder)
+    dict가 필요하면 orjson 전체 디코딩이 msgspec dict 변환보다 빠름
+    """
+    if orjson is None and decode_auction_struct is not None:
+        return msgspec.to_builtins(decode_auction_struct(body))
+    return decode_json(body)
+
 class TokenBatchRequester:
     def __init__(self, tokens: List[str]):
         self.tokens = tokens
@@ -91,8 +153,8 @@ class TokenBatchRequester:
             # 헤더 파싱 실패시 보수적으로 remaining을 0으로 설정
             self.token_info[token]['remaining'] = 0
 
-    def _get_available_tokens(self) -> List[Tuple[str, int]]:
-        """사용 가능한 토큰들을 더 지능적으로 선택"""
+    async def _get_available_tokens(self) -> List[Tuple[str, int]]:
+        """사용 가능한 토큰들을 더 지능적으로 선택 (대기는 이벤트 루프를 막지 않음)"""
         current_time = time.time()
         available_tokens = []
         soon_available = []  # 곧 사용 가능해질 토큰들
@@ -135,7 +197,7 @@ class TokenBatchRequester:
             next_reset = soon_available[0][2]
             wait_time = max(0, next_reset - current_time)
             if wait_time < 5:  # 5초 이내로 기다려도 되는 경우
-                time.sleep(wait_time + 0.1)  # 여유 있게 0.1초 추가
+                await asyncio.sleep(wait_time + 0.1)  # 여유 있게 0.1초 추가
                 return [(soon_available[0][0], soon_available[0][1])]
         
         # 모든 토큰이 소진된 경우, 가장 빠른 리셋 시간까지 대기
@@ -144,23 +206,41 @@ class TokenBatchRequester:
             wait_time = max(0, next_reset - current_time)
             print(f"All tokens exhausted. Waiting {wait_time:.1f} seconds for next reset")
             # print(f"Current token status: {self._token_info_str()}")
-            time.sleep(wait_time + 0.1)
-            return self._get_available_tokens()
+            await asyncio.sleep(wait_time + 0.1)
+            return await self._get_available_tokens()
             
         # 모든 토큰의 리셋 시간 정보가 없는 경우
         print("No token reset information available. Waiting 60 seconds as fallback")
-        time.sleep(60)
-        return self._get_available_tokens()
+        await asyncio.sleep(60)
+        return await self._get_available_tokens()
 
-    async def process_requests(self, requests: List[Dict]) -> List[Dict]:
-        """요청들을 토큰별 여유 용량에 따라 분배하여 처리"""
+    def _reserve_token(self, token: str, count: int):
+        """
+        배치를 보내기 전에 토큰 여유분을 미리 차감.
+        수집기와 스캐너가 같은 요청기를 동시에 쓰므로, 응답 헤더가 오기 전에 다른 코루틴이 같은 여유분을 또 쓰지 않게 함
+        """
+        info = self.token_info[token]
+        info['remaining'] = max(0, info['remaining'] - count)
+        if info['remaining'] == 0 and info['reset_time'] is None:
+            # 헤더로 정확한 값이 오기 전까지는 1분 윈도우로 보수적으로 잡음
+            info['reset_time'] = time.time() + 60
+
+    async def process_requests(self, requests: List[Dict],
+                               decoder: Optional[Callable[[bytes], Any]] = None) -> List[Any]:
+        """
+        요청들을 토큰별 여유 용량에 따라 분배하여 처리
+        decoder: 응답 본문(bytes)을 받아 결과를 만드는 함수 (큰 응답은 스레드에서 실행)
+                 기본은 decode_auction_response -> 응답 전체 dict (orjson이 없고 msgspec만 있으면 읽는 필드만 남긴 dict)
+        반환값: 요청 순서대로 decoder 결과 (collector는 decode_auction_page로 AuctionPage를 받음)
+        """
+        decoder = decoder or decode_auction_response
         await self.initialize()
         results = [None] * len(requests)
         pending_indices = list(range(len(requests)))
 
         while pending_indices:
             # print(f"\nBefore using tokens...{self._token_info_str()}")
-            available_tokens = self._get_available_tokens()
+            available_tokens = await self._get_available_tokens()
             if not available_tokens:
                 continue
 
@@ -173,10 +253,11 @@ class TokenBatchRequester:
                     
                 batch_indices = pending_indices[:remaining]
                 pending_indices = pending_indices[remaining:]
+                self._reserve_token(token, len(batch_indices))
                 
                 batch_requests = [requests[i] for i in batch_indices]
                 task = self._process_batch_with_indices(
-                    batch_requests, batch_indices, token, results)
+                    batch_requests, batch_indices, token, results, decoder)
                 processing_tasks.append(task)
                 # print(f"token {self.token_info[token]['index']}번이 {len(batch_requests)}개 사용")
 
@@ -203,10 +284,11 @@ class TokenBatchRequester:
     async def _process_batch_with_indices(self, batch_requests: List[Dict], 
                                         batch_indices: List[int], 
                                         token: str, 
-                                        results: List[Dict]) -> Dict:
+                                        results: List[Dict],
+                                        decoder: Callable[[bytes], Any]) -> Dict:
         """배치 처리 및 결과 저장"""
         try:
-            batch_results = await self._process_single_batch(batch_requests, token)
+            batch_results = await self._process_single_batch(batch_requests, token, decoder)
             retry_indices = []
             
             for idx, (index, result) in enumerate(zip(batch_indices, batch_results)):
@@ -233,7 +315,8 @@ class TokenBatchRequester:
             print(f"Traceback:\n{traceback.format_exc()}")
             return {'retry_indices': batch_indices}
 
-    async def _process_single_batch(self, batch: List[Dict], token: str) -> List[Dict]:
+    async def _process_single_batch(self, batch: List[Dict], token: str,
+                                    decoder: Callable[[bytes], Any]) -> List[Dict]:
         """단일 토큰으로 배치 처리"""
         headers = {
             'accept': 'application/json',
@@ -243,7 +326,7 @@ class TokenBatchRequester:
 
         tasks = []
         for request_data in batch:
-            task = self._make_single_request(headers, request_data)
+            task = self._make_single_request(headers, request_data, decoder)
             tasks.append(task)
 
         results = await asyncio.gather(*tasks, return_exceptions=True)
@@ -265,7 +348,14 @@ class TokenBatchRequester:
 
         return results
 
-    async def _make_single_request(self, headers: Dict, request_data: Dict) -> Dict:
+    async def _decode(self, body: bytes, decoder: Callable[[bytes], Any]) -> Any:
+        """작은 응답은 바로, 큰 응답은 스레드에서 디코딩"""
+        if len(body) >= DECODE_IN_THREAD_BYTES:
+            return await asyncio.to_thread(decoder, body)
+        return decoder(body)
+
+    async def _make_single_request(self, headers: Dict, request_data: Dict,
+                                   decoder: Callable[[bytes], Any]) -> Dict:
         """단일 요청 처리"""
         try:
             # timeout을 더 길게 설정
@@ -277,13 +367,14 @@ class TokenBatchRequester:
             ) as response:
                 if response.status == 200:
                     try:
-                        data = await response.json()
+                        data = await self._decode(await response.read(), decoder)
                         return {
                             'status': 200,
                             'data': data,
                             'headers': dict(response.headers)
                         }
-                    except BaseException as e:
+                    except Exception as e:
+                        # 스레드 디코딩 중 취소(CancelledError)는 여기서 삼키지 않고 그대로 올라감
                         print(f"Error parsing response: {str(e)}")
                         return {
                             'status': 'error',
@@ -307,7 +398,7 @@ class TokenBatchRequester:
             # 취소된 경우 다시 raise하여 상위에서 처리
             raise
 
-        except BaseException as e:
+        except Exception as e:
             print(f"Request error: {str(e)} ({type(e).__name__})")
             import traceback
             print(f"Traceback:\n{traceback.format_exc()}")
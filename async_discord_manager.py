@@ -0,0 +1,364 @@
+from typing import Dict, List, Optional, Tuple, Any, Callable
+import itertools
+import asyncio
+import heapq
+import json
+import time
+import aiohttp
+from async_api_client import TokenBatchRequester
+from discord_manager import format_alert_line, format_multiline_message, create_search_query
+
+SUPPRESS_NOTIFICATIONS = 1 << 12
+
+class DiscordWebhookClient:
+    """
+    aiohttp 세션 하나로 Discord 웹훅 요청을 보내는 클라이언트
+    - X-RateLimit-Remaining / X-RateLimit-Reset-After 헤더를 보고 웹훅별로 다음 요청 시각을 맞춤
+    - 429는 retry_after만큼 기다렸다가, 5xx/네트워크 오류는 지수 백오프로 재시도
+    """
+    MAX_RETRIES = 5
+
+    def __init__(self):
+        self.session = None
+        self.next_available = {}  # webhook url -> 다음 요청 가능 시각 (time.monotonic 기준)
+        self.global_next_available = 0.0
+
+    async def initialize(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15))
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def post(self, webhook_url: str, payload: Dict, wait: bool = True) -> Optional[Dict]:
+        """메시지 전송. wait=True면 생성된 메시지 정보(id 포함)를 반환"""
+        params = {"wait": "true"} if wait else None
+        return await self._request("POST", webhook_url, webhook_url, payload, params)
+
+    async def patch(self, webhook_url: str, message_id: str, payload: Dict) -> Optional[Dict]:
+        """이미 보낸 메시지 수정"""
+        return await self._request("PATCH", webhook_url, f"{webhook_url}/messages/{message_id}", payload)
+
+    async def _wait_for_rate_limit(self, webhook_url: str):
+        wait_until = max(self.next_available.get(webhook_url, 0.0), self.global_next_available)
+        wait_time = wait_until - time.monotonic()
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+
+    def _update_rate_limit(self, webhook_url: str, headers):
+        """응답 헤더로 다음 요청 가능 시각 갱신"""
+        try:
+            remaining = headers.get('X-RateLimit-Remaining')
+            reset_after = headers.get('X-RateLimit-Reset-After')
+            if remaining is not None and reset_after is not None and int(remaining) <= 0:
+                self.next_available[webhook_url] = time.monotonic() + float(reset_after)
+        except (ValueError, TypeError) as e:
+            print(f"Error parsing discord rate limit headers: {e}")
+
+    async def _request(self, method: str, webhook_url: str, url: str, payload: Dict,
+                       params: Optional[Dict] = None) -> Optional[Dict]:
+        await self.initialize()
+
+        for attempt in range(self.MAX_RETRIES):
+            await self._wait_for_rate_limit(webhook_url)
+            try:
+                async with self.session.request(method, url, json=payload, params=params) as response:
+                    self._update_rate_limit(webhook_url, response.headers)
+
+                    if response.status == 429:
+                        try:
+                            data = await response.json(content_type=None)
+                        except (aiohttp.ContentTypeError, ValueError):
+                            data = {}
+                        retry_after = float(data.get('retry_after') or response.headers.get('Retry-After', 1))
+                        if data.get('global'):
+                            self.global_next_available = time.monotonic() + retry_after
+                        else:
+                            self.next_available[webhook_url] = time.monotonic() + retry_after
+                        continue
+
+                    if response.status >= 500:
+                        print(f"Discord webhook error {response.status}, retrying ({attempt + 1}/{self.MAX_RETRIES})")
+                        await asyncio.sleep(2 ** attempt)
+                        continue
+
+                    if response.status >= 400:
+                        print(f"Discord webhook request failed with status {response.status}: {await response.text()}")
+                        return None
+
+                    if response.status == 204:
+                        return {}
+                    return await response.json(content_type=None)
+
+            except asyncio.CancelledError:
+                raise
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Discord webhook request error: {e} ({type(e).__name__}), retrying ({attempt + 1}/{self.MAX_RETRIES})")
+                await asyncio.sleep(2 ** attempt)
+
+        print(f"Discord webhook request dropped after {self.MAX_RETRIES} attempts: {method} {url}")
+        return None
+
+class AsyncAlertDelivery:
+    """
+    꿀매물 알림을 스캔 루프 밖에서 전달하는 서비스
+    - notify()는 큐에 넣기만 하므로 웹훅이 느려도 스캔이 멈추지 않음
+    - 짧은 시간에 몰린 알림은 한 번에 묶어서 전송 (요약 채널은 여러 줄, 추적 채널은 embed 여러 개)
+    - 추적 채널 메시지가 올라가면 on_posted(item, evaluation, message_id, embed_index)를 호출
+    """
+    MAX_EMBEDS = 10             # Discord 메시지당 embed 최대 개수
+    MAX_CONTENT_LENGTH = 2000   # Discord content 최대 길이
+    COALESCE_SECONDS = 0.5      # 첫 알림 이후 이 시간 동안 들어온 알림을 함께 묶음
+
+    def __init__(self, alert_url: Optional[str], tracking_url: Optional[str],
+                 client: Optional[DiscordWebhookClient] = None,
+                 on_posted: Optional[Callable[[Dict, Dict, str, int], None]] = None):
+        self.alert_url = alert_url
+        self.tracking_url = tracking_url
+        self.client = client or DiscordWebhookClient()
+        self.on_posted = on_posted
+        self.queue = None
+        self.embeds = {}  # message_id -> 해당 메시지의 embed description 목록
+        self._worker = None
+
+    async def start(self):
+        await self.client.initialize()
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        await self.client.close()
+
+    def notify(self, item: Dict, evaluation: Dict):
+        """알림 예약 (블로킹 없음)"""
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        self.queue.put_nowait((item, evaluation))
+
+    async def post_status(self, content: str):
+        """모니터 시작/종료 같은 상태 메시지 (알림음 없이)"""
+        if self.tracking_url:
+            await self.client.post(self.tracking_url, {"content": content, "flags": SUPPRESS_NOTIFICATIONS}, wait=False)
+
+    async def update_embed(self, message_id: str, index: int, description: str):
+        """묶음 메시지 안의 embed 하나만 수정 (나머지 embed는 그대로 유지)"""
+        descriptions = self.embeds.get(message_id)
+        if descriptions is None or index >= len(descriptions):
+            return
+        descriptions[index] = description
+        await self.client.patch(self.tracking_url, message_id, {"embeds": [{"description": d} for d in descriptions]})
+
+    def release_message(self, message_id: str):
+        """더 이상 수정할 일이 없는 메시지의 상태 정리"""
+        self.embeds.pop(message_id, None)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.COALESCE_SECONDS
+            while len(batch) < self.MAX_EMBEDS:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._deliver(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error delivering discord alerts: {e}")
+
+    async def _deliver(self, batch: List[Tuple[Dict, Dict]]):
+        # 1. 요약 채널: 한 줄짜리 알림들을 길이 제한 안에서 묶어서 전송
+        lines = [format_alert_line(item, evaluation) for item, evaluation in batch]
+        for line in lines:
+            print(line)
+        if self.alert_url:
+            for content in self._chunk_lines(lines):
+                await self.client.post(self.alert_url, {"content": content}, wait=False)
+
+        # 2. 추적 채널: 알림 하나당 embed 하나로 묶어서 전송
+        if not self.tracking_url:
+            return
+        descriptions = [format_multiline_message(item, evaluation) for item, evaluation in batch]
+        response = await self.client.post(self.tracking_url, {"embeds": [{"description": d} for d in descriptions]})
+        if not response or "id" not in response:
+            return
+
+        message_id = response["id"]
+        self.embeds[message_id] = descriptions
+        if self.on_posted:
+            for index, (item, evaluation) in enumerate(batch):
+                self.on_posted(item, evaluation, message_id, index)
+
+    def _chunk_lines(self, lines: List[str]) -> List[str]:
+        chunks = []
+        current = ""
+        for line in lines:
+            line = line[:self.MAX_CONTENT_LENGTH]
+            if current and len(current) + 1 + len(line) > self.MAX_CONTENT_LENGTH:
+                chunks.append(current)
+                current = line
+            else:
+                current = f"{current}\n{line}" if current else line
+        if current:
+            chunks.append(current)
+        return chunks
+
+class TrackedAlert:
+    """추적 중인 알림 하나 (재확인 스케줄 정보 포함)"""
+    def __init__(self, item: Dict, evaluation: Dict, message_id: str, index: int,
+                 search_query: Dict, query_key: str, interval: float):
+        self.item = item
+        self.evaluation = evaluation
+        self.message_id = message_id
+        self.index = index
+        self.search_query = search_query
+        self.query_key = query_key
+        self.interval = interval
+        self.registered_time = time.monotonic()
+
+class AsyncAlertTracker:
+    """
+    추적 채널에 올라간 매물이 아직 남아 있는지 확인하고, 팔렸으면 취소선으로 수정
+    - 힙에 (다음 확인 시각, 알림)을 넣어두고 시각이 된 것만 확인. 남아 있으면 간격을 늘려감 (백오프)
+    - 같은 검색 조건의 알림은 요청 한 번으로 함께 확인
+    - 요청은 공유 토큰 풀(TokenBatchRequester)을 통해 보냄
+    """
+    TRACKING_SECONDS = 600      # 10분동안 tracking
+    INITIAL_INTERVAL = 5.0      # 첫 확인까지 대기 시간
+    MAX_INTERVAL = 60.0         # 확인 간격 상한
+    BACKOFF = 1.5               # 남아 있을 때마다 간격을 이만큼 늘림
+    BATCH_LOOKAHEAD = 3.0       # 같은 검색 조건이면 이 시간 안에 예정된 확인도 당겨서 함께 처리
+
+    def __init__(self, delivery: AsyncAlertDelivery, requester: TokenBatchRequester):
+        self.delivery = delivery
+        self.requester = requester
+        self.heap = []  # (next_check, seq, TrackedAlert)
+        self.pending = {}  # message_id -> 아직 추적 중인 embed 수
+        self._seq = itertools.count()
+        self._wakeup = None
+
+    def track(self, item: Dict, evaluation: Dict, message_id: str, index: int):
+        try:
+            search_query = create_search_query(item, evaluation)
+        except Exception as e:
+            print(f"Error creating search query for tracked item: {e}")
+            return
+
+        query_key = json.dumps(search_query, sort_keys=True, ensure_ascii=False)
+        alert = TrackedAlert(item, evaluation, message_id, index, search_query, query_key, self.INITIAL_INTERVAL)
+        self._schedule(alert, time.monotonic() + self.INITIAL_INTERVAL)
+        self.pending[message_id] = self.pending.get(message_id, 0) + 1
+
+    def _schedule(self, alert: TrackedAlert, next_check: float):
+        heapq.heappush(self.heap, (next_check, next(self._seq), alert))
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        while True:
+            if not self.heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            wait_time = self.heap[0][0] - time.monotonic()
+            if wait_time > 0:
+                # 더 이른 알림이 들어오면 바로 깨어나도록 이벤트와 함께 대기
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait_time)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._check_due_alerts()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error checking tracked alerts: {e}")
+
+    def _pop_due_groups(self) -> Dict[str, List[TrackedAlert]]:
+        """확인 시각이 된 알림을 검색 조건별로 묶어서 꺼냄"""
+        now = time.monotonic()
+        groups = {}
+        while self.heap and self.heap[0][0] <= now:
+            _, _, alert = heapq.heappop(self.heap)
+            groups.setdefault(alert.query_key, []).append(alert)
+
+        # 같은 조건으로 곧 확인할 예정이던 알림도 함께 처리
+        if groups and self.heap:
+            remaining = []
+            for entry in self.heap:
+                next_check, _, alert = entry
+                if alert.query_key in groups and next_check <= now + self.BATCH_LOOKAHEAD:
+                    groups[alert.query_key].append(alert)
+                else:
+                    remaining.append(entry)
+            if len(remaining) != len(self.heap):
+                heapq.heapify(remaining)
+                self.heap = remaining
+        return groups
+
+    async def _check_due_alerts(self):
+        groups = self._pop_due_groups()
+        if not groups:
+            return
+
+        query_keys = list(groups.keys())
+        responses = await self.requester.process_requests([groups[key][0].search_query for key in query_keys])
+
+        for query_key, response in zip(query_keys, responses):
+            for alert in groups[query_key]:
+                # 응답을 못 받았으면 남아 있는 것으로 보고 다시 예약
+                is_exist = True if response is None else self._is_still_listed(response, alert.evaluation)
+                await self._handle_result(alert, is_exist)
+
+    def _is_still_listed(self, response: Dict, evaluation: Dict) -> bool:
+        """같은 조건의 최저가 매물이 알림 당시 가격 이하로 아직 있는지"""
+        if response.get("TotalCount", 0) > 0 and response.get("Items"):
+            current_price = response["Items"][0]["AuctionInfo"]["BuyPrice"]
+            if current_price is not None and current_price <= evaluation['current_price']:
+                return True
+        return False
+
+    async def _handle_result(self, alert: TrackedAlert, is_exist: bool):
+        description = self.delivery.embeds.get(alert.message_id, [None] * (alert.index + 1))[alert.index]
+        if is_exist:
+            if time.monotonic() - alert.registered_time > self.TRACKING_SECONDS:
+                if description:
+                    await self.delivery.update_embed(alert.message_id, alert.index, description.replace("만료", "[추적 종료됨] 만료"))
+                self._finish(alert.message_id)
+            else:
+                alert.interval = min(alert.interval * self.BACKOFF, self.MAX_INTERVAL)
+                self._schedule(alert, time.monotonic() + alert.interval)
+        else:
+            if description:
+                await self.delivery.update_embed(alert.message_id, alert.index, f"~~{description}~~")
+            self._finish(alert.message_id)
+
+    def _finish(self, message_id: str):
+        self.pending[message_id] -= 1
+        if self.pending[message_id] <= 0:
+            del self.pending[message_id]
+            self.delivery.release_message(message_id)
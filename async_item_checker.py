@@ -4,21 +4,24 @@ from datetime import datetime, timedelta
 from async_api_client import TokenBatchRequester
 from database import DatabaseManager
 from market_price_cache import MarketPriceCache
-from discord_manager import send_discord_message, init_discord_manager
-import multiprocessing as mp
+from async_discord_manager import AsyncAlertDelivery, AsyncAlertTracker
 from utils import *
 from config import config
 import os
 from item_evaluator import ItemEvaluator
+from listing import decode_auction_page
+from functools import partial
 from dotenv import load_dotenv
 
 
 class AsyncMarketScanner:
-    def __init__(self, evaluator, tokens: List[str], msg_queue: mp.Queue):
+    def __init__(self, evaluator, tokens: List[str], notifier: AsyncAlertDelivery,
+                 requester: Optional[TokenBatchRequester] = None, collection_planner=None):
+        """collection_planner: 수집기의 CollectionPlanner. 있으면 알림 매물을 구간 통계에 기록"""
         self.evaluator = evaluator
-        self.requester = TokenBatchRequester(tokens)
-        self.webhook = os.getenv("WEBHOOK1")
-        self.msg_queue = msg_queue
+        self.requester = requester or TokenBatchRequester(tokens)
+        self.notifier = notifier
+        self.collection_planner = collection_planner
         
         # 마지막 체크 시간 초기화
         self.last_expireDate_3day = None
@@ -74,21 +77,22 @@ class AsyncMarketScanner:
                         for p in range(start_page, start_page + BATCH_SIZE)
                     ]
                     
-                    # 배치 처리
-                    responses = await self.requester.process_requests(batch_requests)
+                    # 배치 처리 (응답은 매물 레코드로 바로 디코딩, 알림용 원본 dict도 함께 유지)
+                    responses = await self.requester.process_requests(
+                        batch_requests, decoder=partial(decode_auction_page, keep_items=True))
                     
-                    if not responses or all(not r or not r.get("Items") for r in responses):
+                    if not responses or all(not r or not r.listings for r in responses):
                         break
 
                     # 페이지별로 처리
                     for page_offset, response in enumerate(responses):
-                        if not response or not response.get("Items"):
+                        if not response or not response.listings:
                             continue
                             
                         current_page = start_page + page_offset
                         
-                        for item in response["Items"]:
-                            end_time = datetime.fromisoformat(item["AuctionInfo"]["EndDate"])
+                        for item_index, listing in enumerate(response.listings):
+                            end_time = listing.end_time
                             
                             if days == 1 and end_time >= current_expireDate: # 아직 1일차 매물이 아님(3일차가 1일차 근처로 내려온 거임)
                                 continue
@@ -109,10 +113,16 @@ class AsyncMarketScanner:
                                 return
                             
                             count += 1
-                            evaluation = self.evaluator.evaluate_item(item)
+                            evaluation = self.evaluator.evaluate_listing(listing, record_misses=True)
                             if evaluation and evaluation["is_notable"]:
-                                send_discord_message(self.webhook, item, evaluation)
-                                self.msg_queue.put((item, evaluation))
+                                # 알림 문구/추적 검색은 원본 dict를 쓰므로 옵션 이름을 약어로 맞춰서 넘김
+                                item = response.item_dict(item_index)
+                                if not listing.is_bracelet:
+                                    fix_dup_options(item)
+                                # 전송은 알림 서비스가 따로 처리하므로 스캔은 바로 계속 진행
+                                self.notifier.notify(item, evaluation)
+                                if self.collection_planner is not None:
+                                    self.collection_planner.record_notable(listing)
 
                     # 다음 배치로 이동
                     start_page += BATCH_SIZE
@@ -145,10 +155,16 @@ class AsyncMarketScanner:
         }
 
 class AsyncMarketMonitor:
-    def __init__(self, db_manager: DatabaseManager, msg_queue: mp.Queue, tokens: List[str], debug: bool = False):
-        price_cache = MarketPriceCache(db_manager, debug=debug)
-        self.evaluator = ItemEvaluator(price_cache, debug=debug)
-        self.scanner = AsyncMarketScanner(self.evaluator, tokens, msg_queue)
+    def __init__(self, db_manager: DatabaseManager, notifier: AsyncAlertDelivery, tokens: List[str] = None, debug: bool = False,
+                 evaluator: Optional[ItemEvaluator] = None, requester: Optional[TokenBatchRequester] = None,
+                 collection_planner=None):
+        """evaluator/requester/collection_planner를 넘기면 오케스트레이터 등에서 만든 것을 공유해서 사용"""
+        if evaluator is None:
+            price_cache = MarketPriceCache(db_manager, debug=debug)
+            evaluator = ItemEvaluator(price_cache, debug=debug)
+        self.evaluator = evaluator
+        self.scanner = AsyncMarketScanner(self.evaluator, tokens, notifier, requester=requester,
+                                          collection_planner=collection_planner)
 
     async def run(self):
         """비동기 모니터링 실행"""
@@ -166,17 +182,27 @@ class AsyncMarketMonitor:
                 await asyncio.sleep(5)
 
 async def main():
+    delivery = AsyncAlertDelivery(os.getenv("WEBHOOK1"), os.getenv("WEBHOOK2"))
+    tracker_task = None
     try:
         db_manager = DatabaseManager()    
-        msg_queue = mp.Queue()
-        
-        monitor = AsyncMarketMonitor(db_manager, msg_queue, tokens=config.monitor_tokens, debug=False)
-        terminator = init_discord_manager(msg_queue)
+        monitor = AsyncMarketMonitor(db_manager, delivery, tokens=config.monitor_tokens, debug=False)
+
+        # 추적 재확인도 스캐너와 같은 토큰 풀 사용
+        tracker = AsyncAlertTracker(delivery, monitor.scanner.requester)
+        delivery.on_posted = tracker.track
+
+        await delivery.start()
+        await delivery.post_status("경매장 모니터 시작")
+        tracker_task = asyncio.create_task(tracker.run())
 
         await monitor.run()
 
     finally:
-        terminator()
+        if tracker_task:
+            tracker_task.cancel()
+        await delivery.post_status("경매장 모니터 종료")
+        await delivery.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
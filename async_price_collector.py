@@ -1,414 +1,397 @@
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any, Callable, Awaitable
 from datetime import datetime, timedelta
 import asyncio
+import time
 from async_api_client import TokenBatchRequester
 from market_price_cache import MarketPriceCache
 from itertools import combinations, product
 from database import *
 from utils import *
 from config import config
-
-def _create_acc_hash_key(item_data: dict) -> tuple:
-    """악세서리 아이템의 해시 키 생성"""
-    # 기본 속성으로 키 구성
-    base_key = (
-        item_data['grade'],
-        item_data['name'],
-        item_data['part'],
-        item_data['level'],
-        item_data['quality'],
-        item_data['price'],
-        item_data['trade_count']
-    )
-    
-    # 옵션들을 정렬하여 튜플로 변환
-    options_key = tuple(sorted(
-        (opt[0], opt[1]) for opt in item_data['options']
-    ))
-    
-    return base_key + (options_key,)
-
-def _create_bracelet_hash_key(item_data: dict) -> tuple:
-    """팔찌 아이템의 해시 키 생성"""
-    # 기본 속성으로 키 구성
-    base_key = (
-        item_data['grade'],
-        item_data['name'],
-        item_data['price'],
-        item_data['trade_count'],
-        item_data['fixed_option_count'],
-        item_data['extra_option_count']
-    )
-    
-    # 각 옵션 타입별로 정렬된 튜플 생성
-    combat_stats = tuple(sorted(
-        (stat['stat_type'], stat['value'])
-        for stat in item_data['combat_stats']
-    ))
-    
-    base_stats = tuple(sorted(
-        (stat['stat_type'], stat['value'])
-        for stat in item_data['base_stats']
-    ))
-    
-    special_effects = tuple(sorted(
-        (effect['effect_type'], effect['value'])
-        for effect in item_data['special_effects']
-    ))
-    
-    return base_key + (combat_stats, base_stats, special_effects)
+from listing import AccessoryListing, BraceletListing, AuctionPage, decode_auction_page, option_name
+from price_rollup import update_accessory_rollups, update_bracelet_rollups, add_bracelet_flat_records
+from collection_planner import CollectionPlanner, KeyedPriceFloor, MAX_PAGES, MIN_QUALITY, bracelet_floor_key
+from collections import defaultdict
+
+# 사이클 요청 예산 = 토큰 수 x 분당 한도 x 이 시간(분). 전체 수집 후 남은 예산으로 캐시 미스 키를 추가 검색
+CYCLE_BUDGET_MINUTES = 60
+MAX_MISS_REQUESTS = 500   # 미스 검색에 쓰는 요청 상한 (사이클 끝이 너무 늘어지지 않게)
+MISS_PAGES = 2            # 미스 키마다 가격 낮은 순으로 볼 페이지 수 (캐시는 최저가 쪽만 씀)
+
+# 연속 수집: 사이클(COLLECTION_INTERVAL_MINUTES) 동안 요청을 고르게 나눠 보내고, 저장은 SAVE_CHUNK_PAGES 페이지마다
+COLLECTION_INTERVAL_MINUTES = 120   # 구간마다 한 사이클에 한 번 갱신 -> 모든 구간 데이터가 최대 이 시간만큼 오래됨
+PACE_FILL = 0.9                     # 예산을 사이클의 이 비율 안에 다 쓰도록 속도를 정함 (지연 여유)
+PACE_BATCH_SIZE = 20                # 한 번에 보내는 요청 수 (이만큼씩 시간 간격을 둠)
+SAVE_CHUNK_PAGES = 100
+CACHE_REFRESH_MINUTES = 30          # 새로 저장한 매물이 있으면 이 간격으로 캐시 재빌드
+
+# 최저가 기준 페이징: 구간마다 FLOOR_STEP_PAGES씩 보고, 구간에서 본 모든 캐시 키의 가격 계산 값이 정해졌으면 중단
+# (collection_planner.KeyedPriceFloor)
+# 끊은 뒤에야 처음 나오는 키(최저가가 앞 키들 상한보다 비싼 키)는 그 옵션을 지정한 세부 프리셋에서만 나오므로
+# -> FULL_SWEEP_EVERY_CYCLES 사이클마다 한 번은 계획한 페이지를 다 봄 (24시간 창에 전체 수집이 두 번 들어감)
+FLOOR_STEP_PAGES = 5
+FULL_SWEEP_EVERY_CYCLES = 6
+
+def _keep_accessory(listing) -> bool:
+    """저장할 악세 매물인지 (즉시 구매가, 품질 MIN_QUALITY 이상)"""
+    return not listing.is_bracelet and bool(listing.price) and (listing.quality or 0) >= MIN_QUALITY
+
+def _keep_bracelet(listing) -> bool:
+    """저장할 팔찌 매물인지 (즉시 구매가, 팔찌는 품질 체크 필요 없음)"""
+    return listing.is_bracelet and bool(listing.price)
 
 class AsyncPriceCollector:
-    def __init__(self, db_manager: DatabaseManager, tokens: List[str]):
+    def __init__(self, db_manager: DatabaseManager, tokens: List[str] = None,
+                 requester: Optional[TokenBatchRequester] = None,
+                 on_cycle_complete: Optional[Callable[[], Awaitable[None]]] = None,
+                 miss_tracker=None):
+        """
+        requester: 다른 작업(스캐너 등)과 공유할 요청기. 없으면 tokens로 새로 만듦
+        on_cycle_complete: 캐시 갱신 코루틴 함수 (사이클 중 CACHE_REFRESH_MINUTES마다, 사이클 끝에 호출)
+                           없으면 이 프로세스에서 직접 캐시를 갱신
+        miss_tracker: 평가기와 공유하는 PriceMissTracker. 있으면 전체 수집 후 남은 예산으로 미스 키를 검색
+        """
         self.db = db_manager
-        self.requester = TokenBatchRequester(tokens)
+        self.requester = requester or TokenBatchRequester(tokens)
+        self.on_cycle_complete = on_cycle_complete
+        self.miss_tracker = miss_tracker
         self.current_cycle_id = None
+        self.requests_used = 0   # 이번 사이클에 보낸 검색 요청 수
+        self.skipped_pages = 0   # 이번 사이클에 최저가 기준으로 건너뛴 계획 페이지 수
+        self.cycles_completed = 0
+        self.requests_per_second = None   # 연속 수집 속도 (None이면 속도 제한 없이 한 번에 보냄)
+        self._next_batch_time = 0.0
+        # 이번 사이클(search_cycle_id)에 저장한 매물 -> 청크 저장, 미스 키 검색이 같은 매물을 다시 저장하지 않음
+        # (같은 매물이 두 번 들어가면 캐시 표본과 사이클 집계에 두 번 잡힘)
+        self._seen_items = set()
+        self._last_cache_refresh = time.monotonic()
+        self._pending_refresh = False     # 마지막 캐시 갱신 후 새로 저장한 매물이 있는지
+        self._refresh_task: Optional[asyncio.Task] = None
         self.ITEMS_PER_PAGE = 10
         
         # 프리셋 생성기 초기화
         self.preset_generator = SearchPresetGenerator()
+        # 구간 통계로 사이클마다 검색할 프리셋/페이지 수를 정함 (스캐너 알림 매물도 record_notable로 받음)
+        self.planner = CollectionPlanner(db_manager, self.preset_generator)
 
     async def run(self):
-        """메인 실행 함수"""
+        """
+        연속 수집: COLLECTION_INTERVAL_MINUTES마다 사이클 하나, 사이클 안에서는 요청을 일정 속도로 나눠 보냄
+        (짝수 시각에 한꺼번에 몰아서 보내면 그동안 스캐너와 토큰을 다투고 나머지 시간엔 토큰이 놀았음)
+        """
         while True:
+            start_time = datetime.now()
             try:
-                # 다음 실행 시간까지 대기
-                next_run = self._get_next_run_time()
-                wait_seconds = (next_run - datetime.now()).total_seconds()
-                if wait_seconds > 0:
-                    print(f"다음 실행 시간: {next_run.strftime('%Y-%m-%d %H:%M:%S')}")
-                    print(f"대기 중... ({int(wait_seconds)}초)")
-                    await asyncio.sleep(wait_seconds)
-
-                # 가격 수집 실행
-                start_time = datetime.now()
                 print(f"Starting price collection at {start_time}")
-                
-                await self.collect_prices()
-                
-                end_time = datetime.now()
-                duration = end_time - start_time
-                print(f"Completed price collection at {end_time}")
-                print(f"Duration: {duration}")
-                
+                await self.collect_prices(paced=True)
+                print(f"Completed price collection at {datetime.now()}")
+                print(f"Duration: {datetime.now() - start_time}")
             except Exception as e:
                 print(f"Error in collection cycle: {e}")
-                await asyncio.sleep(60)
 
-    async def collect_prices(self):
-        """비동기 가격 수집"""
+            # 사이클이 일찍 끝났으면 다음 사이클 시작 시각까지 대기
+            next_run = start_time + timedelta(minutes=COLLECTION_INTERVAL_MINUTES)
+            wait_seconds = (next_run - datetime.now()).total_seconds()
+            if wait_seconds > 0:
+                print(f"다음 사이클 시작: {next_run.strftime('%Y-%m-%d %H:%M:%S')}")
+                await asyncio.sleep(wait_seconds)
+
+    async def collect_prices(self, paced: bool = False, full_sweep: Optional[bool] = None):
+        """
+        비동기 가격 수집
+        paced: 예산을 사이클 시간에 고르게 나눠 보내고, 수집 중에도 CACHE_REFRESH_MINUTES마다 캐시 갱신
+        full_sweep: 최저가 기준 조기 종료 없이 계획한 페이지를 다 봄. None이면 FULL_SWEEP_EVERY_CYCLES 사이클마다 한 번
+        """
         try:
-            self.current_cycle_id = datetime.now().strftime("%Y%m%d_%H%M")
+            started_at = datetime.now()
+            cycle_id = started_at.strftime("%Y%m%d_%H%M")
+            if cycle_id != self.current_cycle_id:
+                # 같은 분에 다시 수집하면 같은 사이클 id로 저장되므로 그때는 이전 기록을 유지
+                self._seen_items = set()
+            self.current_cycle_id = cycle_id
+            if full_sweep is None:
+                full_sweep = self.cycles_completed % FULL_SWEEP_EVERY_CYCLES == 0
+            self.requests_used = 0
+            self.skipped_pages = 0
+            self._next_batch_time = time.monotonic()
+            self.requests_per_second = None
+            if paced:
+                self.requests_per_second = self.cycle_request_budget() / (COLLECTION_INTERVAL_MINUTES * 60 * PACE_FILL)
             total_collected = 0
 
-            # 악세서리 프리셋 준비
-            parts = ["목걸이", "귀걸이", "반지"]
-            grades = ["고대", "유물"]
-            
-            for grade in grades:
-                # 1. 악세서리 수집
-                for part in parts:
-                    presets = self.preset_generator.generate_presets_acc(part)
-                    collected = await self._collect_accessory_data(grade, part, presets)
-                    total_collected += collected
-
-                # 2. 팔찌 수집
-                presets = self.preset_generator.generate_presets_bracelet(grade)
-                collected = await self._collect_bracelet_data(grade, presets)
-                total_collected += collected
-
-            print(f"Total collected items: {total_collected}")
-            
-            if total_collected > 0:
-                # 캐시 업데이트
-                cache = MarketPriceCache(self.db)
-                cache.update_cache()
-                print(f"Cache updated at {datetime.now()}")
+            # 1. 수집 계획대로 악세/팔찌 검색 (미스 검색 몫은 남겨둠)
+            budget = self.cycle_request_budget()
+            if self.miss_tracker is not None:
+                budget -= MAX_MISS_REQUESTS
+            total_collected += await self.collect_planned(budget, floor_stop=not full_sweep)
+
+            # 2. 남은 예산으로 자주 미스된 키 검색
+            if self.miss_tracker is not None:
+                leftover = min(MAX_MISS_REQUESTS, self.cycle_request_budget() - self.requests_used)
+                total_collected += await self.collect_missed_keys(leftover)
+                self.miss_tracker.decay()
+
+            print(f"Total collected items: {total_collected} ({self.requests_used} requests, "
+                  f"{'full sweep' if full_sweep else f'{self.skipped_pages} pages skipped by price floor'})")
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self._save_cycle_record, started_at, full_sweep, total_collected)
+            self.cycles_completed += 1
+
+            if self._refresh_task is not None:
+                await self._refresh_task
+            if self._pending_refresh:
+                await self._refresh_cache()
                 
         except Exception as e:
             print(f"Error in price collection: {e}")
 
-    async def collect_total_counts(self, search_presets: List[Dict]) -> Dict[str, int]:
-        """각 프리셋의 첫 페이지를 검색하여 전체 페이지 수 확인"""
-        preset_counts = {}
-        
-        # 첫 페이지 요청 준비
-        initial_requests = []
-        for preset in search_presets:
-            search_data = preset.copy()
-            search_data['PageNo'] = 1
-            initial_requests.append({
-                'preset_key': self._get_preset_key(preset),
-                'search_data': search_data
-            })
-
-        # 배치 처리로 첫 페이지 검색
-        results = await self.requester.process_requests([req['search_data'] for req in initial_requests])
-
-        # 결과에서 전체 페이지 수 계산
-        for i, result in enumerate(results):
-            if result and not isinstance(result, Exception):
-                preset_key = initial_requests[i]['preset_key']
-                total_count = result.get('TotalCount', 0)
-                total_pages = min(1000, (total_count + self.ITEMS_PER_PAGE - 1) // self.ITEMS_PER_PAGE)
-                preset_counts[preset_key] = total_pages
-                print(f"Preset {preset_key}: {total_count} items ({total_pages} pages)")
-
-        return preset_counts
-
-    async def _collect_accessory_data(self, grade: str, part: str, presets: List[Dict]) -> int:
-        """특정 등급/부위의 악세서리 데이터 수집"""
-        total_collected = 0
-
-        # 1. 각 프리셋의 전체 페이지 수 확인
-        search_requests = []
-        for preset in presets:
-            search_data = self.preset_generator.create_search_data_acc(preset, grade, part)
-            search_requests.append(search_data)
-
-        total_pages = await self.collect_total_counts(search_requests)
-
-        # 2. 모든 페이지 요청 생성
-        all_requests = []
-        for preset_idx, preset in enumerate(presets):
-            preset_key = self._get_preset_key(search_requests[preset_idx])
-            if preset_key in total_pages:
-                for page in range(1, total_pages[preset_key] + 1):
-                    search_data = self.preset_generator.create_search_data_acc(preset, grade, part, page)
-                    all_requests.append(search_data)
-
-        # 3. 모든 요청 처리
-        results = await self.requester.process_requests(all_requests)
-
-        # 4. 결과 일괄 처리
+    def _save_cycle_record(self, started_at: datetime, full_sweep: bool, collected: int):
+        """사이클 요청 수 기록 (floor_paging_report.py가 전체 수집 사이클과 비교)"""
+        with self.db.get_write_session() as session:
+            session.merge(CollectionCycle(
+                search_cycle_id=self.current_cycle_id, started_at=started_at, full_sweep=full_sweep,
+                requests=self.requests_used, skipped_pages=self.skipped_pages, collected=collected))
+
+    def cycle_request_budget(self) -> int:
+        """수집 사이클 하나에 쓸 수 있는 요청 수 (나머지 시간의 토큰은 스캐너 몫)"""
+        return len(self.requester.tokens) * self.requester.MAX_REQUESTS_PER_MINUTE * CYCLE_BUDGET_MINUTES
+
+    async def _fetch_pages(self, requests: List[Dict]) -> List[Optional[AuctionPage]]:
+        """
+        검색 요청 일괄 처리 (응답은 바로 매물 레코드 페이지로 디코딩, 사용한 요청 수 누적)
+        연속 수집 중이면 PACE_BATCH_SIZE개씩 requests_per_second 속도에 맞춰 보냄
+        """
+        self.requests_used += len(requests)
+        if self.requests_per_second is None:
+            return await self.requester.process_requests(requests, decoder=decode_auction_page)
+
+        results = []
+        for start in range(0, len(requests), PACE_BATCH_SIZE):
+            batch = requests[start:start + PACE_BATCH_SIZE]
+            wait_seconds = self._next_batch_time - time.monotonic()
+            if wait_seconds > 0:
+                await asyncio.sleep(wait_seconds)
+            # 예정 시각 기준으로 다음 배치를 잡아서 캐시 저장 등으로 늦어진 만큼은 따라잡음
+            self._next_batch_time += len(batch) / self.requests_per_second
+            results.extend(await self.requester.process_requests(batch, decoder=decode_auction_page))
+        return results
+
+    async def _save_pages(self, kind: str, grade: str, part: Optional[str], results,
+                          prices: Optional[Dict[str, List[int]]] = None) -> int:
+        """
+        검색 결과 페이지 저장 (results: [(검색 대상, 페이지)]). 반환값: 저장한 매물 수
+        이번 사이클에 이미 저장한 매물은 제외, prices가 있으면 구간별 가격을 모음
+        """
         all_processed_items = []
-        for result in results:
-            if result and not isinstance(result, Exception):
-                processed_items = self.process_acc_response(result, grade, part)
-                if processed_items:
-                    all_processed_items.extend(processed_items)
-
-        # 5. 일괄 저장
-        if all_processed_items:
+        for target, page in results:
+            if not page or isinstance(page, Exception):
+                continue
+            if kind == "bracelet":
+                processed_items = self.process_bracelet_response(page, grade) or []
+            else:
+                processed_items = self.process_acc_response(page, grade, part) or []
+            if prices is not None:
+                prices[target.key].extend(item.price for item in processed_items)
+            for item in processed_items:
+                item_key = item.dedup_key()
+                if item_key not in self._seen_items:
+                    self._seen_items.add(item_key)
+                    all_processed_items.append(item)
+
+        if not all_processed_items:
+            return 0
+        if kind == "bracelet":
+            print(f"Saving {len(all_processed_items)} {grade} bracelets...")
+            unique_count = await self.save_bracelet_items(all_processed_items, self.current_cycle_id)
+        else:
             print(f"Saving {len(all_processed_items)} {grade} {part} items...")
             unique_count = await self.save_acc_items(all_processed_items, self.current_cycle_id)
-            total_collected = len(all_processed_items) - unique_count
-            print(f"Saved {total_collected} unique items after removing {unique_count} duplicates")
-
-        return total_collected
+        collected = len(all_processed_items) - unique_count
+        print(f"Saved {collected} unique items after removing {unique_count} duplicates")
+
+        self._pending_refresh = True
+        self._maybe_refresh_cache()
+        return collected
+
+    def _maybe_refresh_cache(self):
+        """연속 수집 중 새 매물이 있고 CACHE_REFRESH_MINUTES가 지났으면 캐시 갱신을 백그라운드로 시작"""
+        if self.requests_per_second is None or not self._pending_refresh:
+            return
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        if time.monotonic() - self._last_cache_refresh < CACHE_REFRESH_MINUTES * 60:
+            return
+        self._refresh_task = asyncio.create_task(self._refresh_cache())
+
+    def _search_data(self, target, page_no: int) -> Dict:
+        """검색 대상(수집 구간 / 미스 키: kind, grade, part, preset)의 검색 데이터"""
+        if target.kind == "bracelet":
+            return self.preset_generator.create_search_data_bracelet(target.preset, target.grade, page_no)
+        return self.preset_generator.create_search_data_acc(target.preset, target.grade, target.part, page_no)
+
+    @staticmethod
+    def _floor_reached(floor: KeyedPriceFloor, segment, page) -> bool:
+        """
+        받은 페이지를 구간의 키별 최저가에 반영하고 더 볼 필요가 없는지 (실패한 요청/즉시 구매가 없는 페이지는 판단 안 함)
+        키별 값에는 저장하는 매물(process_acc_response / process_bracelet_response 조건)만 반영
+        """
+        if not page or isinstance(page, Exception):
+            return False
+        if not page.listings:
+            return True
+        prices = [listing.price for listing in page.listings if listing.price]
+        if not prices:
+            return False
+        if segment.kind == "bracelet":
+            for listing in page.listings:
+                if _keep_bracelet(listing):
+                    floor.add_bracelet(bracelet_floor_key(listing), listing.price)
+        else:
+            for listing in page.listings:
+                if _keep_accessory(listing):
+                    options = listing.named_options()
+                    floor.add_accessory(segment.grade, segment.part, listing.level, listing.price, options,
+                                        {name for name, _ in options})
+        return floor.passed(max(prices))
+
+    async def collect_planned(self, budget: int, floor_stop: bool = False) -> int:
+        """
+        수집 계획대로 검색: 계획한 구간마다 첫 페이지 -> 실제 매물 수로 나머지 예산 재배분 -> 등급/부위 묶음별로 검색/저장
+        floor_stop: 구간마다 FLOOR_STEP_PAGES씩 보고 가격이 최저가 기준을 넘으면 남은 계획 페이지는 건너뜀
+        반환값: 저장한 매물 수
+        """
+        segments = self.planner.plan(budget)
+        first_pages = await self._fetch_pages([self._search_data(segment, 1) for segment in segments])
+        total_counts = {}
+        for segment, page in zip(segments, first_pages):
+            if page and not isinstance(page, Exception):
+                total_counts[segment.key] = page.total_count
+                segment.total_pages = min(MAX_PAGES, (page.total_count + self.ITEMS_PER_PAGE - 1) // self.ITEMS_PER_PAGE)
+            else:
+                segment.total_pages = None
+        self.planner.allocate_pages(segments, budget - len(segments), start_page=2)
+        print(f"Collection plan: {len(segments)} presets, {sum(segment.pages for segment in segments)} requests "
+              f"(budget {budget})")
+
+        planned_pages = sum(segment.pages for segment in segments)
+        fetched_pages = len(segments)
+        floors = {segment: KeyedPriceFloor() for segment in segments}
+        stopped = set()
+        if floor_stop:
+            stopped = {segment for segment, page in zip(segments, first_pages)
+                       if self._floor_reached(floors[segment], segment, page)}
+
+        groups = defaultdict(list)   # (kind, grade, part) -> [(구간, 첫 페이지)], 수집 순서 유지
+        for segment, page in zip(segments, first_pages):
+            groups[(segment.kind, segment.grade, segment.part)].append((segment, page))
 
-    async def _collect_bracelet_data(self, grade: str, presets: List[Dict]) -> int:
-        """특정 등급의 팔찌 데이터 수집"""
         total_collected = 0
+        prices = defaultdict(list)
+        step = FLOOR_STEP_PAGES if floor_stop else MAX_PAGES
+        for (kind, grade, part), group in groups.items():
+            total_collected += await self._save_pages(kind, grade, part, group, prices)
+            next_pages = {segment: 2 for segment, _ in group if segment.pages >= 2 and segment not in stopped}
+            # 최저가 기준이면 구간마다 step 페이지씩 여러 번, 아니면 한 번에 모든 페이지
+            while next_pages:
+                targets = [(segment, page_no) for segment, first in next_pages.items()
+                           for page_no in range(first, min(first + step, segment.pages + 1))]
+                fetched_pages += len(targets)
+                # SAVE_CHUNK_PAGES 페이지마다 저장 (연속 수집 중에도 새 매물이 바로 DB/캐시에 들어감)
+                for start in range(0, len(targets), SAVE_CHUNK_PAGES):
+                    chunk = targets[start:start + SAVE_CHUNK_PAGES]
+                    pages = await self._fetch_pages([self._search_data(segment, page_no) for segment, page_no in chunk])
+                    results = [(segment, page) for (segment, _), page in zip(chunk, pages)]
+                    total_collected += await self._save_pages(kind, grade, part, results, prices)
+                    if floor_stop:
+                        for segment, page in results:   # 구간별로 페이지 순서대로 들어 있음
+                            if segment not in stopped and self._floor_reached(floors[segment], segment, page):
+                                stopped.add(segment)
+                next_pages = {segment: first + step for segment, first in next_pages.items()
+                              if first + step <= segment.pages and segment not in stopped}
+
+        self.skipped_pages = planned_pages - fetched_pages
+        if floor_stop:
+            print(f"Price floor paging: {fetched_pages}/{planned_pages} planned pages, "
+                  f"{len(stopped)}/{len(segments)} presets stopped early")
 
-        # 1. 각 프리셋의 전체 페이지 수 확인
-        search_requests = []
-        for preset in presets:
-            search_data = self.preset_generator.create_search_data_bracelet(preset, grade)
-            search_requests.append(search_data)
-
-        total_pages = await self.collect_total_counts(search_requests)
-
-        # 2. 모든 페이지 요청 생성
-        all_requests = []
-        for preset_idx, preset in enumerate(presets):
-            preset_key = self._get_preset_key(search_requests[preset_idx])
-            if preset_key in total_pages:
-                for page in range(1, total_pages[preset_key] + 1):
-                    search_data = self.preset_generator.create_search_data_bracelet(preset, grade, page)
-                    all_requests.append(search_data)
-
-        # 3. 모든 요청 처리
-        results = await self.requester.process_requests(all_requests)
-
-        # 4. 결과 일괄 처리
-        all_processed_items = []
-        for result in results:
-            if result and not isinstance(result, Exception):
-                processed_items = self.process_bracelet_response(result, grade)
-                if processed_items:
-                    all_processed_items.extend(processed_items)
-
-        # 5. 일괄 저장
-        if all_processed_items:
-            print(f"Saving {len(all_processed_items)} {grade} bracelets...")
-            unique_count = await self.save_bracelet_items(all_processed_items, self.current_cycle_id)
-            total_collected = len(all_processed_items) - unique_count
-            print(f"Saved {total_collected} unique items after removing {unique_count} duplicates")
-
+        loop = asyncio.get_event_loop()
+        # 가격 변동은 끝까지 본 전체 수집 사이클에서만 갱신
+        await loop.run_in_executor(None, self.planner.update_stats, segments, prices, total_counts,
+                                   not floor_stop)
         return total_collected
 
-    def _get_preset_key(self, preset: Dict) -> str:
-        """프리셋의 고유 키 생성"""
-        if 'CategoryCode' in preset:
-            if preset['CategoryCode'] == 200040:  # 팔찌
-                # 팔찌는 ItemGrade와 EtcOptions에서 고정/부여 슬롯 정보 추출
-                fixed_slots = None
-                extra_slots = None
-                for opt in preset['EtcOptions']:
-                    if opt['FirstOption'] == 4:  # 팔찌 옵션 수량
-                        if opt['SecondOption'] == 1:  # 고정 효과 수량
-                            fixed_slots = opt['MinValue']
-                        elif opt['SecondOption'] == 2:  # 부여 효과 수량
-                            extra_slots = opt['MinValue']
-                
-                return f"bracelet_{preset['ItemGrade']}_fixed{fixed_slots}_extra{extra_slots}"
-            
-            else:  # 악세서리
-                # 악세서리는 등급, 이름, 연마 레벨, 품질 포함
-                level = preset.get('ItemUpgradeLevel', 0)
-                quality = preset.get('ItemGradeQuality', 0)
-                # 옵션 정보도 포함 (있는 경우)
-                options = []
-                for opt in preset.get('EtcOptions', []):
-                    if opt.get('FirstOption') == 7:  # 연마 효과
-                        options.append(f"{opt['SecondOption']}_{opt['MinValue']}")
-                
-                options_str = '_'.join(sorted(options)) if options else 'no_options'
-                return f"{preset['ItemGrade']}_{preset['ItemName']}_lv{level}_q{quality}_{options_str}"
-        
-        return str(hash(str(preset)))
-
-    def _get_next_run_time(self) -> datetime:
-        """다음 실행 시간 계산 (짝수 시간)"""
-        now = datetime.now()
-        if now.hour >= 22:  # 22시 이후면 다음날 0시
-            next_run = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
-        else:
-            next_hour = now.hour + (2 - now.hour % 2)  # 다음 짝수 시간
-            next_run = now.replace(hour=next_hour, minute=0, second=0, microsecond=0)
-            
-        if next_run <= now:
-            next_run += timedelta(hours=2)
-        return next_run
-
-    def process_acc_response(self, response, grade, part):
-        """API 응답 처리 및 DB 저장"""
-        data = response
-        if not data["Items"]:
-            return None
-
-        # 유효한 아이템 필터링
-        valid_items = [
-            item for item in data["Items"]
-            if item["AuctionInfo"]["BuyPrice"] and item["GradeQuality"] >= 67
-        ]
-        if not valid_items:
-            return None
-
-        processed_items = []
+    async def collect_missed_keys(self, budget: int) -> int:
+        """
+        캐시 미스가 잦은 키를 채우는 검색 (키마다 첫 페이지, 매물이 더 있으면 MISS_PAGES까지)
+        반환값: 저장한 매물 수
+        """
+        misses = self.miss_tracker.pop_top(budget // MISS_PAGES)
+        if not misses:
+            return 0
+
+        requests = [self._search_data(miss, 1) for miss in misses]
+        targets = list(misses)
+        first_pages = await self._fetch_pages(requests)
+        requests = []
+        for miss, page in zip(misses, first_pages):
+            if page and not isinstance(page, Exception):
+                total_pages = (page.total_count + self.ITEMS_PER_PAGE - 1) // self.ITEMS_PER_PAGE
+                for page_no in range(2, min(MISS_PAGES, total_pages) + 1):
+                    requests.append(self._search_data(miss, page_no))
+                    targets.append(miss)
+        pages = first_pages + await self._fetch_pages(requests)
+
+        # 전체 수집에서 이미 저장한 매물은 _save_pages가 _seen_items로 걸러냄
+        groups = defaultdict(list)
+        for miss, page in zip(targets, pages):
+            groups[(miss.kind, miss.grade, miss.part)].append((miss, page))
+        collected = 0
+        for (kind, grade, part), group in groups.items():
+            collected += await self._save_pages(kind, grade, part, group)
+        print(f"Missed-key collection: {len(misses)} keys (top: {misses[0].label} x{misses[0].count:g}), "
+              f"{len(pages)} requests, saved {collected} items")
+        return collected
+
+    async def _refresh_cache(self):
+        """새로 저장한 매물로 캐시 업데이트"""
+        self._last_cache_refresh = time.monotonic()
+        self._pending_refresh = False
+        if self.on_cycle_complete:
+            await self.on_cycle_complete()
+            return
+
+        cache = MarketPriceCache(self.db)
+        await asyncio.to_thread(cache.update_cache)
+        print(f"Cache updated at {datetime.now()}")
+
+    def process_acc_response(self, page: AuctionPage, grade, part) -> Optional[List[AccessoryListing]]:
+        """디코딩된 페이지에서 저장할 매물만 추림"""
         current_time = datetime.now()
-
-        for item in valid_items:
-            processed_item = {
-                'timestamp': current_time,
-                'grade': grade,
-                'name': item["Name"],
-                'part': part,
-                'level': len(item["Options"]) - 1,
-                'quality': item["GradeQuality"],
-                'trade_count': item["AuctionInfo"]["TradeAllowCount"],
-                'price': item["AuctionInfo"]["BuyPrice"],
-                'end_time': datetime.strptime(
-                    item["AuctionInfo"]["EndDate"].split('.')[0],
-                    "%Y-%m-%dT%H:%M:%S"
-                ),
-                'options': [],
-                'raw_options': []
-            }
-
-            # 옵션 처리
-            fix_dup_options(item)
-            for option in item["Options"]:
-                if option["OptionName"] not in ["깨달음", "도약"]:
-                    opt_value = option["Value"]
-                    # raw option 저장
-                    processed_item['raw_options'].append({
-                        'option_name': option["OptionName"],
-                        'option_value': opt_value,
-                        'is_percentage': option.get("IsValuePercentage", False)
-                    })
-                    # 가공된 option 저장
-                    opt_grade = number_to_scale.get(
-                        option["OptionName"], {}).get(opt_value, 1)
-                    processed_item['options'].append(
-                        (option["OptionName"], opt_grade))
-
-            processed_items.append(processed_item)
-
-        return processed_items
-
-    def process_bracelet_response(self, response, grade):
-        """팔찌 API 응답 처리"""
-        data = response
-        if not data["Items"]:
-            return None
-
-        # 유효한 아이템 필터링 (팔찌는 품질 체크 필요 없음)
-        valid_items = [
-            item for item in data["Items"]
-            if item["AuctionInfo"]["BuyPrice"]
-        ]
-        if not valid_items:
-            return None
-
         processed_items = []
+        for listing in page.listings:
+            # 유효한 아이템 필터링
+            if not _keep_accessory(listing):
+                continue
+            # 검색 조건의 등급/부위를 그대로 사용
+            listing.grade = grade
+            listing.part = part
+            listing.timestamp = current_time
+            processed_items.append(listing)
+
+        return processed_items or None
+
+    def process_bracelet_response(self, page: AuctionPage, grade) -> Optional[List[BraceletListing]]:
+        """디코딩된 팔찌 페이지에서 저장할 매물만 추림 (팔찌는 품질 체크 필요 없음)"""
         current_time = datetime.now()
+        processed_items = []
+        for listing in page.listings:
+            if not _keep_bracelet(listing):
+                continue
+            listing.grade = grade
+            listing.timestamp = current_time
+            processed_items.append(listing)
 
-        for item in valid_items:
-            # 기본 정보 처리
-            processed_item = {
-                'timestamp': current_time,
-                'grade': grade,
-                'name': item["Name"],
-                'trade_count': item["AuctionInfo"]["TradeAllowCount"],
-                'price': item["AuctionInfo"]["BuyPrice"],
-                'end_time': datetime.strptime(
-                    item["AuctionInfo"]["EndDate"].split('.')[0],
-                    "%Y-%m-%dT%H:%M:%S"
-                ),
-                'combat_stats': [],
-                'base_stats': [],
-                'special_effects': [],
-                'fixed_option_count': 0,  # 기본값 설정
-                'extra_option_count': 0   # 기본값 설정
-            }
-
-            # 옵션 처리
-            for option in item["Options"]:
-                option_type = option["Type"]
-                option_name = option["OptionName"]
-                value = option["Value"]
-
-                # 고정 효과 수량은 전체 옵션 개수에서 도약 값과 부여 효과 수량, 즉 2를 뺀 값
-                processed_item['fixed_option_count'] = len(item["Options"]) - 2
-                if option_type == "ARK_PASSIVE":    # 도약 포인트는 필요 없음
-                    continue
-                # 부여 효과 수량 체크
-                if option_type == "BRACELET_RANDOM_SLOT":
-                    processed_item['extra_option_count'] = value
-                # 전투특성 처리
-                elif option_type == "STAT" and option_name in ["특화", "치명", "신속"]:
-                    processed_item['combat_stats'].append({
-                        'stat_type': option_name,
-                        'value': value
-                    })
-                # 기본스탯 처리
-                elif option_type == "STAT" and option_name in ["힘", "민첩", "지능"]:
-                    processed_item['base_stats'].append({
-                        'stat_type': option_name,
-                        'value': value
-                    })
-                # 특수효과 처리(제인숙, 체력 등등 그 외 모든 건 다 여기에 들어감)
-                else:
-                    processed_item['special_effects'].append({
-                        'effect_type': option_name,
-                        'value': value
-                    })
-
-            processed_items.append(processed_item)
-
-        return processed_items
+        return processed_items or None
 
     async def save_acc_items(self, items, search_cycle_id):
         """기존 save_acc_items 메서드를 비동기 컨텍스트에서 실행"""
@@ -420,14 +403,14 @@ class AsyncPriceCollector:
         loop = asyncio.get_event_loop()
         return await loop.run_in_executor(None, self._sync_save_bracelet_items, items, search_cycle_id)
 
-    def _sync_save_acc_items(self, items: List[dict], search_cycle_id: str) -> int:
+    def _sync_save_acc_items(self, items: List[AccessoryListing], search_cycle_id: str) -> int:
         """개선된 악세서리 아이템 저장"""
         # 1. 메모리 내 중복 제거
         unique_items = {}
         for item in items:
-            item_key = _create_acc_hash_key(item)
+            item_key = item.dedup_key()
             # 같은 키의 아이템 중 가장 최근 것만 유지
-            if item_key not in unique_items or item['timestamp'] > unique_items[item_key]['timestamp']:
+            if item_key not in unique_items or item.timestamp > unique_items[item_key].timestamp:
                 unique_items[item_key] = item
         
         # 2. DB에 일괄 저장
@@ -438,23 +421,22 @@ class AsyncPriceCollector:
             ).count()
             
             # 새 아이템들만 저장
-            for item_data in unique_items.values():
+            for item in unique_items.values():
                 record = PriceRecord(
-                    timestamp=item_data['timestamp'],
+                    timestamp=item.timestamp,
                     search_cycle_id=search_cycle_id,
-                    grade=item_data['grade'],
-                    name=item_data['name'],
-                    part=item_data['part'],
-                    level=item_data['level'],
-                    quality=item_data['quality'],
-                    trade_count=item_data['trade_count'],
-                    price=item_data['price'],
-                    end_time=item_data['end_time'],
-                    damage_increment=item_data.get('damage_increment')
+                    grade=item.grade,
+                    name=item.name,
+                    part=item.part,
+                    level=item.level,
+                    quality=item.quality,
+                    trade_count=item.trade_count,
+                    price=item.price,
+                    end_time=item.end_time.replace(microsecond=0),
                 )
                 
                 # 옵션 추가
-                for opt_name, opt_grade in item_data['options']:
+                for opt_name, opt_grade in item.scaled_options():
                     option = ItemOption(
                         option_name=opt_name,
                         option_grade=opt_grade
@@ -462,29 +444,32 @@ class AsyncPriceCollector:
                     record.options.append(option)
                 
                 # 원본 옵션 추가
-                for raw_opt in item_data['raw_options']:
+                for opt_id, opt_value, is_percentage in item.options:
                     raw_option = RawItemOption(
-                        option_name=raw_opt['option_name'],
-                        option_value=raw_opt['option_value'],
-                        is_percentage=raw_opt['is_percentage']
+                        option_name=option_name(opt_id),
+                        option_value=opt_value,
+                        is_percentage=is_percentage
                     )
                     record.raw_options.append(raw_option)
                 
                 session.add(record)
             
             session.flush()
+
+            # 대시보드 추이용 사이클 집계 갱신
+            update_accessory_rollups(session, unique_items.values(), search_cycle_id)
             
             # 중복 제거된 수 반환
             return len(items) - len(unique_items)
 
-    def _sync_save_bracelet_items(self, items: List[dict], search_cycle_id: str) -> int:
+    def _sync_save_bracelet_items(self, items: List[BraceletListing], search_cycle_id: str) -> int:
         """개선된 팔찌 아이템 저장"""
         # 1. 메모리 내 중복 제거
         unique_items = {}
         for item in items:
-            item_key = _create_bracelet_hash_key(item)
+            item_key = item.dedup_key()
             # 같은 키의 아이템 중 가장 최근 것만 유지
-            if item_key not in unique_items or item['timestamp'] > unique_items[item_key]['timestamp']:
+            if item_key not in unique_items or item.timestamp > unique_items[item_key].timestamp:
                 unique_items[item_key] = item
         
         # 2. DB에 일괄 저장
@@ -495,46 +480,54 @@ class AsyncPriceCollector:
             ).count()
             
             # 새 아이템들만 저장
-            for item_data in unique_items.values():
+            saved = []
+            for item in unique_items.values():
                 record = BraceletPriceRecord(
-                    timestamp=item_data['timestamp'],
+                    timestamp=item.timestamp,
                     search_cycle_id=search_cycle_id,
-                    grade=item_data['grade'],
-                    name=item_data['name'],
-                    trade_count=item_data['trade_count'],
-                    price=item_data['price'],
-                    end_time=item_data['end_time'],
-                    fixed_option_count=item_data['fixed_option_count'],
-                    extra_option_count=item_data['extra_option_count']
+                    grade=item.grade,
+                    name=item.name,
+                    trade_count=item.trade_count,
+                    price=item.price,
+                    end_time=item.end_time.replace(microsecond=0),
+                    fixed_option_count=item.fixed_option_count,
+                    extra_option_count=item.extra_option_count
                 )
                 
                 # 전투특성 추가
-                for stat in item_data['combat_stats']:
+                for stat_type, value in item.combat_stats:
                     combat_stat = BraceletCombatStat(
-                        stat_type=stat['stat_type'],
-                        value=stat['value']
+                        stat_type=stat_type,
+                        value=value
                     )
                     record.combat_stats.append(combat_stat)
                 
                 # 기본스탯 추가
-                for stat in item_data['base_stats']:
+                for stat_type, value in item.base_stats:
                     base_stat = BraceletBaseStat(
-                        stat_type=stat['stat_type'],
-                        value=stat['value']
+                        stat_type=stat_type,
+                        value=value
                     )
                     record.base_stats.append(base_stat)
                 
                 # 특수효과 추가
-                for effect in item_data['special_effects']:
+                for effect_type, value in item.special_effects:
                     special_effect = BraceletSpecialEffect(
-                        effect_type=effect['effect_type'],
-                        value=effect['value']
+                        effect_type=effect_type,
+                        value=value
                     )
                     record.special_effects.append(special_effect)
                 
                 session.add(record)
+                saved.append((record, item))
             
             session.flush()
+
+            # 조회용 비정규화 행 (flush 후라 record.id 사용 가능)
+            add_bracelet_flat_records(session, saved)
+
+            # 대시보드 추이용 사이클 집계 갱신
+            update_bracelet_rollups(session, unique_items.values(), search_cycle_id)
             
             # 중복 제거된 수 반환
             return len(items) - len(unique_items)
@@ -625,6 +618,13 @@ class SearchPresetGenerator:
             ]
         }
 
+        # 세부 프리셋용 전용 옵션 묶음 (수집 계획기가 예산 안에서 골라서 검색)
+        self.exclusive_option_groups = {
+            "목걸이": [("추피", "적주피"), ("아덴게이지", "낙인력")],
+            "귀걸이": [("공퍼", "무공퍼")],
+            "반지": [("치적", "치피"), ("아공강", "아피강")],
+        }
+
         # # 부가 옵션도 수정
         # self.sub_options = {
         #     "목걸이": {
@@ -784,6 +784,43 @@ class SearchPresetGenerator:
 
         return presets
 
+    def generate_fine_presets_acc(self, part: str) -> List[Dict]:
+        """전용 옵션 1~2개를 지정한 세부 프리셋 (연마 단계보다 옵션이 많은 조합은 제외)"""
+        option_sets = []
+        for group in self.exclusive_option_groups[part]:
+            for name in group:
+                option_sets.extend([(name, scale)] for scale in [1, 2, 3])
+            for scales in product([1, 2, 3], repeat=2):
+                option_sets.append(list(zip(group, scales)))
+
+        presets = []
+        for level, quality in product(self.enhancement_levels, self.qualities):
+            for options in option_sets:
+                if 0 < len(options) <= level:
+                    presets.append({'enhancement_level': level, 'quality': quality, 'options': options})
+        return presets
+
+    def generate_fine_presets_bracelet(self, grade: str) -> List[Dict]:
+        """고정 효과 2개 팔찌를 전특 조합별로 나눈 세부 프리셋 (수치는 제한 없음)"""
+        slot_bonus = 1 if grade == "고대" else 0
+        combat_stats = ["특화", "치명", "신속"]
+        base_stats = ["힘", "민첩", "지능"]
+
+        fixed_sets = [[("전투 특성", first, None), ("전투 특성", second, None)]
+                      for first, second in combinations(combat_stats, 2)]
+        fixed_sets += [[("전투 특성", combat_stat, None), ("팔찌 기본 효과", base_stat, None)]
+                       for combat_stat, base_stat in product(combat_stats, base_stats)]
+        fixed_sets += [[("전투 특성", combat_stat, None), ("팔찌 특수 효과", "공격 및 이동 속도 증가", None)]
+                       for combat_stat in combat_stats]
+
+        presets = []
+        for fixed_options in fixed_sets:
+            for extra_slots in [1, 2]:
+                options = [("팔찌 옵션 수량", "고정 효과 수량", 2),
+                           ("팔찌 옵션 수량", "부여 효과 수량", extra_slots + slot_bonus)] + fixed_options
+                presets.append({'options': options})
+        return presets
+
     def create_search_data_acc(self, preset: Dict, grade: str, part: str, page_no: int = 1) -> Dict:
         """생성된 프리셋으로 검색 데이터 생성"""
         level = preset['enhancement_level']
@@ -868,13 +905,14 @@ class SearchPresetGenerator:
             "SortCondition": "ASC"
         }
 
-        # 옵션 추가
+        # 옵션 추가 (값 하나면 그 값만, (최소, 최대)면 범위, None이면 값 제한 없음)
         for opt_first_name, opt_second_name, opt_value in options:
+            min_value, max_value = opt_value if isinstance(opt_value, tuple) else (opt_value, opt_value)
             data["EtcOptions"].append({
                 "FirstOption": option_dict_bracelet_first[opt_first_name],
                 "SecondOption": option_dict_bracelet_second[opt_second_name],
-                "MinValue": opt_value,
-                "MaxValue": opt_value,
+                "MinValue": min_value,
+                "MaxValue": max_value,
             })
 
         return data
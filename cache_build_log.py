@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+"""
+캐시 빌드 진단 로그 (JSON lines)
+- 레벨(debug < info < warning) 미만 기록은 만들지 않음
+  -> 필드 계산이 비싼 곳은 호출하는 쪽에서 enabled()/wants_debug로 먼저 확인
+- focus_key를 주면 그 키(악세 그룹 키 / 팔찌 패턴 키)만 debug까지 기록 (한 키만 자세히 볼 때)
+- 기록은 메모리에 모았다가 빌드가 끝나면 한 번에 파일로 씀 (워커 프로세스 기록은 부모가 작업 순서대로 합침)
+- 빌드마다 파일 하나, LOG_DIR에는 최근 KEEP_LOG_FILES개만 남김 (30분마다 재빌드하면 약 하루치)
+- 조회: python cache_build_log.py price_log/price_calculation_*.jsonl --key "고대:목걸이:3:base"
+"""
+
+LOG_LEVELS = {"debug": 10, "info": 20, "warning": 30, "off": 100}
+DEFAULT_LOG_LEVEL = "info"
+LOG_DIR = "price_log"
+KEEP_LOG_FILES = 48
+
+class CacheBuildLogger:
+    def __init__(self, level: str = DEFAULT_LOG_LEVEL, focus_key: Optional[str] = None):
+        self.level_name = level
+        self.level = LOG_LEVELS[level]
+        self.focus_key = focus_key
+        # debug 기록이 하나라도 남을 수 있는지 (키별 debug 필드를 만들기 전에 확인)
+        self.wants_debug = self.level <= LOG_LEVELS["debug"] or focus_key is not None
+        self.records: List[Dict[str, Any]] = []
+
+    def enabled(self, level: str, key: Optional[str] = None) -> bool:
+        if LOG_LEVELS[level] >= self.level:
+            return True
+        return key is not None and key == self.focus_key
+
+    def log(self, level: str, event: str, key: Optional[str] = None, **fields):
+        if not self.enabled(level, key):
+            return
+        record = {"level": level, "event": event}
+        if key is not None:
+            record["key"] = key
+        record.update(fields)
+        self.records.append(record)
+
+    def debug(self, event: str, key: Optional[str] = None, **fields):
+        self.log("debug", event, key, **fields)
+
+    def info(self, event: str, key: Optional[str] = None, **fields):
+        self.log("info", event, key, **fields)
+
+    def warning(self, event: str, key: Optional[str] = None, **fields):
+        self.log("warning", event, key, **fields)
+
+    def child(self) -> "CacheBuildLogger":
+        """같은 설정의 빈 로거 (워커 작업마다 하나씩, 기록은 extend로 합침)"""
+        return CacheBuildLogger(self.level_name, self.focus_key)
+
+    def extend(self, records: Iterable[Dict[str, Any]]):
+        self.records.extend(records)
+
+    def write(self, path: Optional[str] = None) -> Optional[str]:
+        """모은 기록을 JSON lines로 저장 (기본 경로면 오래된 빌드 로그 정리). 반환값: 파일 경로 (기록이 없으면 None)"""
+        if not self.records:
+            return None
+        rotate = path is None
+        path = path or os.path.join(LOG_DIR, f"price_calculation_{datetime.now():%Y%m%d_%H%M%S}.jsonl")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            for record in self.records:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=json_default))
+                f.write("\n")
+        if rotate:
+            prune_build_logs()
+        return path
+
+def prune_build_logs(log_dir: str = LOG_DIR, keep: Optional[int] = None):
+    """price_calculation_*.jsonl 중 최근 keep개(기본 KEEP_LOG_FILES)만 남김 (파일 이름의 시각 순)"""
+    keep = keep or KEEP_LOG_FILES
+    names = sorted(name for name in os.listdir(log_dir)
+                   if name.startswith("price_calculation_") and name.endswith(".jsonl"))
+    for name in names[:-keep]:
+        os.remove(os.path.join(log_dir, name))
+
+def json_default(value):
+    """json.dumps default: numpy 스칼라는 파이썬 값으로, 나머지(datetime 등)는 문자열로"""
+    if hasattr(value, "item"):  # numpy 스칼라
+        return value.item()
+    return str(value)
+
+def read_build_log(path: str, key: Optional[str] = None, event: Optional[str] = None,
+                   window: Optional[str] = None) -> List[Dict[str, Any]]:
+    """저장된 기록 중 조건에 맞는 것만 읽음"""
+    result = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if key is not None and record.get("key") != key:
+                continue
+            if event is not None and record.get("event") != event:
+                continue
+            if window is not None and record.get("window") != window:
+                continue
+            result.append(record)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="캐시 빌드 로그 조회")
+    parser.add_argument("path", help="price_log/price_calculation_*.jsonl")
+    parser.add_argument("--key", help="악세 그룹 키 또는 팔찌 패턴 키")
+    parser.add_argument("--event", help="group_price, group_skipped, bracelet_window ...")
+    parser.add_argument("--window", help="2h / 6h / 24h / 7d")
+    args = parser.parse_args()
+
+    for record in read_build_log(args.path, args.key, args.event, args.window):
+        print(json.dumps(record, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
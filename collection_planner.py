@@ -0,0 +1,360 @@
+import argparse
+import heapq
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from database import *
+from listing import AccessoryListing, BraceletListing
+from price_rollup import bracelet_pattern_key
+from market_price_cache import EXCLUSIVE_OPTIONS, COMMON_OPTIONS, ROLE_COMMON_OPTIONS, accessory_group_keys
+
+"""
+수집 검색 계획 (사이클 요청 예산 안에서 어떤 프리셋을 몇 페이지까지 볼지)
+- 후보 구간: 기본 프리셋(옵션 없는 악세 연마 단계별, 팔찌 고정/부여 수량별)
+  + 세부 프리셋(전용 옵션을 지정한 악세, 전특 조합을 지정한 팔찌) - SearchPresetGenerator가 생성
+- 구간별 이전 사이클 통계(collection_segment_stats): 매물 수, 가격 변동(로그 가격 표준편차), 스캐너 알림 매물 수
+- 페이지 하나의 가치 = 구간 가중치 x PAGE_DECAY^(페이지-1), 가치 높은 페이지부터 예산만큼 고름
+  * 가중치 = 기본 가중치 x (1 + 가격 변동) x (1 + NOTABLE_WEIGHT x 알림 매물 수)
+  * 구간마다 뒤 페이지일수록 가치가 줄기만 해서 높은 것부터 고르는 게 예산 대비 최적
+- 계획은 두 번: 이전 매물 수로 구간을 고르고(모르는 구간은 1페이지로 가정), 첫 페이지의 실제 매물 수로 나머지 페이지를 다시 배분
+- 최저가 기준 페이징(KeyedPriceFloor): 가격 낮은 순 결과라 구간에서 본 모든 캐시 키의 가격 계산에 쓰일 값이
+  페이지 마지막 가격 전에 다 정해졌으면 뒤 페이지는 캐시 결과를 바꾸지 않으므로 그 구간은 더 보지 않음
+  * 캐시 계산은 키별이라 구간(프리셋) 하나에 싼 키와 비싼 키가 섞여 있으면 가장 늦게 정해지는 키 기준으로 끊음
+  * 악세 키(AccessoryKeyFloor): market_price_cache._calculate_group_prices의 상한(공통 옵션 없는 매물의 두 번째 최저가 x 5),
+    _calculate_common_option_values의 기본 가격과 값별 표본(5개)
+  * 팔찌 키: 두 번째 최저가 (캐시 패턴 키보다 잘게 나눈 키라 캐시 키 기준으로도 안전)
+  * 정해지려면 매물이 더 필요한 키(매물 하나뿐인 키, 공통 옵션 값 표본 5개 미만)가 있으면 끊지 않음
+  * 아직 한 번도 못 본 키/공통 옵션 값은 기다리지 않음 -> 끊은 뒤에 처음 나오는 것은 세부 프리셋과 주기적인 전체 수집이 채움
+"""
+
+MAX_PAGES = 1000            # 검색 API가 주는 최대 페이지
+ITEMS_PER_PAGE = 10
+PAGE_DECAY = 0.99           # 가격 낮은 순이라 뒤 페이지일수록 캐시에 덜 쓰임
+BASE_WEIGHT = 1.0           # 기본 프리셋: 모든 캐시 키의 표본이 여기서 나옴
+FINE_WEIGHT = 0.5           # 세부 프리셋: 특정 옵션 조합의 표본만 보강
+NOTABLE_WEIGHT = 0.5        # 사이클당 알림 매물 1개가 가중치에 더하는 비율
+STATS_ALPHA = 0.3           # 통계 EMA 비율
+FLOOR_MULTIPLIER = 5.0      # 캐시 가격 계산의 상한 배수(MAX_PRICE_MULTIPLIER)와 같음
+MIN_QUALITY = 67            # 이 품질 미만 악세는 저장하지 않음 (캐시 표본에도 없음)
+# 캐시 악세 그룹 계산의 표본 기준 (market_price_cache와 같음)
+GROUP_MIN_SAMPLES = 3       # 상한 이내 표본이 이보다 적으면 가격 없음
+COMMON_MIN_ITEMS = 3        # 필터된 매물이 이보다 적으면 공통 옵션 가치 없음
+COMMON_VALUE_SAMPLES = 5    # 공통 옵션 값별 매물이 이만큼 있어야 가치 계산
+
+def segment_key(kind: str, grade: str, part: Optional[str], preset: Dict[str, Any]) -> str:
+    """구간 식별자 (acc|고대|목걸이|lv2|추피1,적주피2 / bracelet|고대|고정2,부여3,치명,특화)"""
+    if kind == "accessory":
+        options = ",".join(f"{name}{scale}" for name, scale in preset['options']) or "base"
+        return f"acc|{grade}|{part}|lv{preset['enhancement_level']}|{options}"
+    options = []
+    for _, name, value in preset['options']:
+        short = name.replace(" 효과 수량", "")
+        options.append(short if value is None else f"{short}{value}")
+    return f"bracelet|{grade}|{','.join(options)}"
+
+def _value_matches(value, condition) -> bool:
+    """검색 조건 값(하나 / (최소, 최대) / None)에 맞는지"""
+    if condition is None:
+        return True
+    if isinstance(condition, tuple):
+        low, high = condition
+        return (low is None or value >= low) and (high is None or value <= high)
+    return value == condition
+
+def bracelet_floor_key(listing: BraceletListing) -> tuple:
+    """팔찌 매물의 키 (고정/부여 수량 + 패턴). 캐시 패턴 키보다 잘게 나눠서 키별로 끊으면 캐시 키 기준으로도 안전"""
+    return (listing.fixed_option_count, listing.extra_option_count) + bracelet_pattern_key(listing)
+
+class PriceFloor:
+    """키 하나의 최저가/두 번째 최저가"""
+    __slots__ = ("lowest", "second")
+
+    def __init__(self):
+        self.lowest = None
+        self.second = None
+
+    def add(self, price: int):
+        if self.lowest is None or price < self.lowest:
+            self.lowest, self.second = price, self.lowest
+        elif self.second is None or price < self.second:
+            self.second = price
+
+    def passed(self, price: int) -> bool:
+        """이 가격 이상인 매물이 전부 상한(두 번째 최저가 x FLOOR_MULTIPLIER) 밖인지"""
+        return self.second is not None and price > self.second * FLOOR_MULTIPLIER
+
+class AccessoryKeyFloor:
+    """
+    악세 캐시 키 하나(역할별 그룹)의 가격 계산에 쓰이는 값을 가격 낮은 순으로 반영 (market_price_cache와 같은 기준)
+    - 그룹 가격: 공통 옵션 없는 매물(base_items, 없으면 filtered_items)의 두 번째 최저가 x FLOOR_MULTIPLIER 이내 표본
+    - 공통 옵션 가치: 다른 전용 옵션이 없는 매물(filtered_items) 중 공통 옵션 없는 매물의 두 번째 최저가, 값별 매물 수/두 번째 최저가
+    """
+    __slots__ = ("key", "role", "part", "base", "base_prices", "filtered", "filtered_prices", "filtered_base",
+                 "common_counts")
+
+    def __init__(self, key: str, role: str, part: str):
+        self.key = key
+        self.role = role
+        self.part = part
+        self.base = PriceFloor()
+        self.base_prices: List[int] = []
+        self.filtered = PriceFloor()
+        self.filtered_prices: List[int] = []
+        self.filtered_base = PriceFloor()
+        self.common_counts: Dict[Tuple[str, float], int] = defaultdict(int)
+
+    def add(self, price: int, options: Sequence[Tuple[str, float]], option_names: Iterable[str]):
+        """매물 하나 반영 (options: (옵션 이름, 값), option_names: 다른 전용 옵션 제외에 쓰는 옵션 이름)"""
+        without_common = not any(name in ROLE_COMMON_OPTIONS[self.role] for name, _ in options)
+        if without_common:
+            self.base.add(price)
+            self.base_prices.append(price)
+
+        for group_role in ("dealer", "support"):
+            for exc_opt in EXCLUSIVE_OPTIONS[self.part][group_role]:
+                if exc_opt not in self.key and exc_opt in option_names:
+                    return
+        self.filtered.add(price)
+        self.filtered_prices.append(price)
+        if without_common:
+            self.filtered_base.add(price)
+        for name in ROLE_COMMON_OPTIONS[self.role]:
+            for value in COMMON_OPTIONS.get(name, ()):
+                if any(option == name and abs(option_value - value) < 0.1 for option, option_value in options):
+                    self.common_counts[(name, value)] += 1
+
+    def passed(self, price: int) -> bool:
+        """이 가격 이상인 매물이 더 나와도 이 키의 캐시 결과가 그대로인지"""
+        # 공통 옵션 없는 매물을 아직 못 봤으면 캐시처럼 filtered_items로 상한을 정함 (처음 보는 키처럼 기다리지 않음)
+        target, target_prices = (self.base, self.base_prices) if self.base_prices else \
+            (self.filtered, self.filtered_prices)
+        if not target_prices:
+            return True
+        if not target.passed(price):
+            return False
+        cap = target.second * FLOOR_MULTIPLIER
+        if sum(1 for target_price in target_prices if target_price <= cap) < GROUP_MIN_SAMPLES:
+            return True   # 가격을 안 내는 키라 공통 옵션 가치도 안 쓰임
+        if not self.filtered_prices:
+            return True   # 공통 옵션 계산에 들어갈 매물을 아직 못 봄
+        if len(self.filtered_prices) < COMMON_MIN_ITEMS:
+            return False
+        if self.filtered_base.lowest is not None and self.filtered_base.second is None:
+            return False  # 공통 옵션 기본 가격(두 번째 최저가)이 아직 안 정해짐
+        return all(count >= COMMON_VALUE_SAMPLES for count in self.common_counts.values())
+
+class KeyedPriceFloor:
+    """구간(가격 낮은 순 검색 결과) 안 캐시 키별 최저가 (악세: AccessoryKeyFloor, 팔찌: PriceFloor)"""
+    __slots__ = ("floors",)
+
+    def __init__(self):
+        self.floors: Dict[tuple, Any] = {}
+
+    def add_accessory(self, grade: str, part: str, level: int, price: int,
+                      options: Sequence[Tuple[str, float]], option_names: Iterable[str]):
+        """악세 매물 하나를 딜러용/서포터용 그룹 키에 반영 (options: (옵션 이름, 값))"""
+        option_names = set(option_names)
+        for role, key in zip(("dealer", "support"), accessory_group_keys(grade, part, level, options)):
+            floor = self.floors.get((role, key))
+            if floor is None:
+                floor = self.floors[(role, key)] = AccessoryKeyFloor(key, role, part)
+            floor.add(price, options, option_names)
+
+    def add_bracelet(self, key: tuple, price: int):
+        floor = self.floors.get(key)
+        if floor is None:
+            floor = self.floors[key] = PriceFloor()
+        floor.add(price)
+
+    def passed(self, last_price: int) -> bool:
+        """페이지 마지막 가격(필터로 빠진 매물 포함) 이후로는 지금까지 본 어느 키의 캐시 결과도 안 바뀌는지"""
+        return bool(self.floors) and all(floor.passed(last_price) for floor in self.floors.values())
+
+class Segment:
+    """검색 프리셋 하나 (kind: accessory / bracelet)"""
+    __slots__ = ("kind", "grade", "part", "preset", "key", "weight", "total_pages", "pages", "stats")
+
+    def __init__(self, kind: str, grade: str, part: Optional[str], preset: Dict[str, Any], base: bool):
+        self.kind = kind
+        self.grade = grade
+        self.part = part
+        self.preset = preset
+        self.key = segment_key(kind, grade, part, preset)
+        self.weight = BASE_WEIGHT if base else FINE_WEIGHT
+        self.total_pages = None   # 알려진 전체 페이지 수 (모르면 None)
+        self.pages = 0            # 이번 사이클에 볼 페이지 수
+        self.stats = None
+
+    def matches(self, listing) -> bool:
+        """이 프리셋 검색 결과에 나오는 매물인지"""
+        if listing.grade != self.grade:
+            return False
+        if self.kind == "accessory":
+            if isinstance(listing, BraceletListing) or listing.part != self.part:
+                return False
+            if listing.level != self.preset['enhancement_level'] or (listing.quality or 0) < self.preset['quality']:
+                return False
+            scales = set(listing.scaled_options())
+            return all(option in scales for option in self.preset['options'])
+
+        if not isinstance(listing, BraceletListing):
+            return False
+        for first, second, condition in self.preset['options']:
+            if first == "팔찌 옵션 수량":
+                value = listing.fixed_option_count if second == "고정 효과 수량" else listing.extra_option_count
+                if not _value_matches(value, condition):
+                    return False
+                continue
+            stats = {"전투 특성": listing.combat_stats, "팔찌 기본 효과": listing.base_stats,
+                     "팔찌 특수 효과": listing.special_effects}[first]
+            if not any(name == second and _value_matches(value, condition) for name, value in stats):
+                return False
+        return True
+
+class CollectionPlanner:
+    def __init__(self, db_manager: DatabaseManager, preset_generator):
+        """preset_generator: async_price_collector.SearchPresetGenerator"""
+        self.db = db_manager
+        self.segments = self._build_segments(preset_generator)
+        self._groups: Dict[tuple, List[Segment]] = defaultdict(list)   # (kind, grade, part) -> 구간
+        for segment in self.segments:
+            self._groups[(segment.kind, segment.grade, segment.part)].append(segment)
+        self._lock = threading.Lock()
+        self._notables: Dict[str, int] = defaultdict(int)   # 이번 사이클 알림 매물 수 (구간별)
+
+    @staticmethod
+    def _build_segments(generator) -> List[Segment]:
+        """수집 순서(등급 -> 부위 -> 팔찌)대로 후보 구간 생성"""
+        segments = []
+        for grade in ["고대", "유물"]:
+            for part in ["목걸이", "귀걸이", "반지"]:
+                segments += [Segment("accessory", grade, part, preset, True)
+                             for preset in generator.generate_presets_acc(part)]
+                segments += [Segment("accessory", grade, part, preset, False)
+                             for preset in generator.generate_fine_presets_acc(part)]
+            segments += [Segment("bracelet", grade, None, preset, True)
+                         for preset in generator.generate_presets_bracelet(grade)]
+            segments += [Segment("bracelet", grade, None, preset, False)
+                         for preset in generator.generate_fine_presets_bracelet(grade)]
+        return segments
+
+    def _load_stats(self):
+        with self.db.get_read_session() as session:
+            stats = {row.segment_key: {"listing_count": row.listing_count, "price_spread": row.price_spread,
+                                       "notable_count": row.notable_count, "cycles": row.cycles}
+                     for row in session.query(CollectionSegmentStat).all()}
+        for segment in self.segments:
+            segment.stats = stats.get(segment.key)
+            segment.total_pages = None
+            segment.pages = 0
+            if segment.stats is not None:
+                segment.total_pages = min(MAX_PAGES, -(-segment.stats["listing_count"] // ITEMS_PER_PAGE))
+
+    @staticmethod
+    def page_weight(segment: Segment) -> float:
+        """구간 첫 페이지의 가치"""
+        if segment.stats is None:
+            return segment.weight
+        return (segment.weight * (1 + segment.stats["price_spread"])
+                * (1 + NOTABLE_WEIGHT * segment.stats["notable_count"]))
+
+    @classmethod
+    def allocate_pages(cls, segments: List[Segment], budget: int, start_page: int = 1):
+        """
+        가치 높은 페이지부터 budget개를 골라 segment.pages에 기록 (start_page 이전 페이지는 이미 본 것으로 둠)
+        total_pages를 모르는 구간은 1페이지로 가정
+        """
+        heap = []
+        for index, segment in enumerate(segments):
+            segment.pages = start_page - 1
+            if segment.pages < (segment.total_pages or 1):
+                weight = cls.page_weight(segment)
+                heap.append((-weight * PAGE_DECAY ** segment.pages, index))
+        heapq.heapify(heap)
+
+        while budget > 0 and heap:
+            _, index = heapq.heappop(heap)
+            segment = segments[index]
+            segment.pages += 1
+            budget -= 1
+            if segment.pages < (segment.total_pages or 1):
+                heapq.heappush(heap, (-cls.page_weight(segment) * PAGE_DECAY ** segment.pages, index))
+
+    def plan(self, budget: int) -> List[Segment]:
+        """이번 사이클에 검색할 구간 (이전 통계 기준 페이지 수가 pages에 들어감, 수집 순서 유지)"""
+        self._load_stats()
+        self.allocate_pages(self.segments, budget)
+        return [segment for segment in self.segments if segment.pages > 0]
+
+    def record_notable(self, listing):
+        """스캐너가 알림을 보낸 매물을 그 매물이 나오는 구간들에 기록 (같은 종류/등급/부위 구간만 확인)"""
+        if isinstance(listing, BraceletListing):
+            group = ("bracelet", listing.grade, None)
+        else:
+            group = ("accessory", listing.grade, listing.part)
+        keys = [segment.key for segment in self._groups.get(group, ()) if segment.matches(listing)]
+        with self._lock:
+            for key in keys:
+                self._notables[key] += 1
+
+    def update_stats(self, segments: Iterable[Segment], prices: Dict[str, List[int]],
+                     total_counts: Dict[str, int], update_spread: bool = True):
+        """
+        수집이 끝난 구간의 통계 갱신 (prices: 구간별 저장한 매물 가격, total_counts: 첫 페이지의 전체 매물 수)
+        update_spread: 가격 변동 갱신 여부 - 최저가 기준으로 일찍 끊은 사이클은 싼 매물만 남아 변동이 작게 잡히므로
+        전체 수집 사이클에서만 갱신 (처음 보는 구간도 0으로 두고 다음 전체 수집부터 반영)
+        알림 매물 수는 이번 사이클 기록을 반영하고 비움
+        """
+        with self._lock:
+            notables, self._notables = self._notables, defaultdict(int)
+
+        now = datetime.now()
+        with self.db.get_write_session() as session:
+            existing = {row.segment_key: row for row in session.query(CollectionSegmentStat).all()}
+            for segment in segments:
+                if segment.key not in total_counts:
+                    continue
+                segment_prices = prices.get(segment.key) or []
+                spread = 0.0
+                if update_spread and len(segment_prices) >= 2:
+                    spread = float(np.std(np.log(segment_prices)))
+                notable = float(notables.get(segment.key, 0))
+                row = existing.get(segment.key)
+                if row is None:
+                    session.add(CollectionSegmentStat(
+                        segment_key=segment.key, listing_count=total_counts[segment.key],
+                        price_spread=spread, notable_count=notable, cycles=1, updated_at=now))
+                    continue
+                row.listing_count = total_counts[segment.key]
+                if update_spread:
+                    row.price_spread += STATS_ALPHA * (spread - row.price_spread)
+                row.notable_count += STATS_ALPHA * (notable - row.notable_count)
+                row.cycles += 1
+                row.updated_at = now
+
+def summarize_plan(segments: List[Segment]) -> List[str]:
+    """계획을 출력용 줄 목록으로 (가치 높은 순)"""
+    lines = []
+    for segment in sorted(segments, key=lambda segment: -CollectionPlanner.page_weight(segment)):
+        known = "?" if segment.total_pages is None else segment.total_pages
+        lines.append(f"{segment.key}: {segment.pages}/{known} pages, weight {CollectionPlanner.page_weight(segment):.2f}")
+    return lines
+
+def main():
+    from async_price_collector import SearchPresetGenerator
+
+    parser = argparse.ArgumentParser(description="수집 검색 계획 확인 (저장된 구간 통계 기준)")
+    parser.add_argument("--budget", type=int, default=6000, help="사이클 요청 예산")
+    args = parser.parse_args()
+
+    planner = CollectionPlanner(DatabaseManager(), SearchPresetGenerator())
+    planned = planner.plan(args.budget)
+    print(f"{len(planned)}/{len(planner.segments)} segments, "
+          f"{sum(segment.pages for segment in planned)} requests (budget {args.budget})")
+    for line in summarize_plan(planned):
+        print(line)
+
+if __name__ == "__main__":
+    main()
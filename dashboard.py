@@ -1,24 +1,231 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
+import threading
 from database import DatabaseManager
 from datetime import datetime, timedelta
-from sqlalchemy import text
+from sqlalchemy import text, bindparam, DateTime
 
 
 # streamlit run dashboard.py
-def load_accessory_data(session, time_range="1d"):
-    # 시간 범위에 따른 쿼리 조건 설정
+def get_time_limit(time_range):
+    """시간 범위에 따른 쿼리 조건 설정"""
     if time_range == "1d":
-        time_limit = datetime.now() - timedelta(days=1)
+        return datetime.now() - timedelta(days=1)
     elif time_range == "1w":
-        time_limit = datetime.now() - timedelta(weeks=1)
+        return datetime.now() - timedelta(weeks=1)
     elif time_range == "1m":
-        time_limit = datetime.now() - timedelta(days=30)
+        return datetime.now() - timedelta(days=30)
     else:  # all
-        time_limit = datetime(2000, 1, 1)
+        return datetime(2000, 1, 1)
+
+
+def read_since(session, query, since):
+    """timestamp >= :since 조건의 파라미터 쿼리 실행"""
+    stmt = text(query).bindparams(bindparam("since", type_=DateTime))
+    return pd.read_sql(stmt, session.bind, params={"since": since})
+
+
+# -----------------------------
+# 사이클 기준 캐시 (새 사이클만 이어 붙임)
+# -----------------------------
+
+@st.cache_resource
+def get_frame_store():
+    """서버 프로세스 전체에서 공유하는 (로더, 범위) -> 캐시 프레임 저장소"""
+    return {"lock": threading.Lock(), "entries": {}}
+
+
+def latest_cycle_version(session, table):
+    """(최신 search_cycle_id, 그 사이클의 행 수) - 수집 중인 사이클에 행이 늘어나도 바뀜"""
+    row = session.execute(text(f"""
+        SELECT search_cycle_id, COUNT(*) FROM {table}
+        WHERE search_cycle_id = (SELECT MAX(search_cycle_id) FROM {table})
+    """)).one()
+    return tuple(row)
+
+
+def count_rows_before(session, table, before):
+    """before 이전 행 수 - 수집은 지금 시각으로만 넣으므로 줄었으면 보존 작업(price_retention.py)이 지운 것"""
+    stmt = text(f"SELECT COUNT(*) FROM {table} WHERE timestamp < :before").bindparams(
+        bindparam("before", type_=DateTime))
+    return session.execute(stmt, {"before": pd.Timestamp(before).to_pydatetime()}).scalar()
+
+
+def load_cached(session, name, query_since, version_table, time_range, pruned_table=None):
+    """
+    (범위, 최신 사이클) 기준으로 캐시된 프레임 반환
+    - 최신 사이클이 그대로면 DB를 읽지 않음
+    - 바뀌었으면 캐시의 마지막 사이클 시작 시각부터만 다시 읽어서 이어 붙임 (진행 중이던 사이클은 교체)
+    - pruned_table: 보존 작업이 오래된 행을 지우는 원본 테이블. 그 이전 행 수가 줄었으면 처음부터 다시 읽음
+    """
+    store = get_frame_store()
+    time_limit = get_time_limit(time_range)
+    version = latest_cycle_version(session, version_table)
+
+    with store["lock"]:
+        entry = store["entries"].get((name, time_range))
+        if entry is None:
+            frame = query_since(session, time_limit)
+        elif entry["version"] != version and entry["rows_before"] is not None and \
+                count_rows_before(session, pruned_table, entry["resume_from"]) < entry["rows_before"]:
+            frame = query_since(session, time_limit)
+        elif entry["version"] != version:
+            since = entry["resume_from"] or time_limit
+            new_rows = query_since(session, since)
+            cached = entry["frame"]
+            frame = pd.concat([cached[cached["timestamp"] < since], new_rows], ignore_index=True)
+        else:
+            frame = entry["frame"]
+        reloaded = entry is None or entry["version"] != version
+
+        # 범위는 지금 기준 상대 시간이라 오래된 앞부분은 잘라냄
+        frame = frame[frame["timestamp"] >= time_limit]
+
+        latest_rows = frame[frame["search_cycle_id"] == frame["search_cycle_id"].max()] if not frame.empty else frame
+        resume_from = latest_rows["timestamp"].min() if not latest_rows.empty else None
+        if not reloaded and resume_from == entry["resume_from"]:
+            rows_before = entry["rows_before"]  # 다시 읽은 게 없으면 지난번 행 수 그대로 (삭제 감지용)
+        elif pruned_table and resume_from is not None:
+            rows_before = count_rows_before(session, pruned_table, resume_from)
+        else:
+            rows_before = None
+        store["entries"][(name, time_range)] = {
+            "version": version,
+            "frame": frame,
+            "resume_from": resume_from,
+            "rows_before": rows_before,
+        }
+        return frame
+
+
+def _query_accessory_rollup(session, since):
+    df = read_since(session, """
+    SELECT search_cycle_id, timestamp, grade, part, level, options,
+           min_price, second_price, listing_count, price_sum, min_name, min_quality
+    FROM accessory_price_rollups
+    WHERE timestamp >= :since
+    """, since)
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    df["options"] = df["options"].replace("", None)  # 원본 쿼리처럼 옵션 없음은 NULL
+    return df
+
+
+def load_accessory_rollup(session, time_range="1d"):
+    """추이 차트용 사이클별 집계 (price_rollup.py가 수집 시 갱신)"""
+    return load_cached(session, "accessory_rollup", _query_accessory_rollup, "price_records", time_range)
+
+
+def _query_bracelet_rollup(session, since):
+    df = read_since(session, """
+    SELECT search_cycle_id, timestamp, grade, fixed_option_count, extra_option_count,
+           combat_stats, base_stats, special_effects,
+           min_price, second_price, listing_count, price_sum, min_base_stats, min_special_effects
+    FROM bracelet_price_rollups
+    WHERE timestamp >= :since
+    """, since)
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    return df
+
+
+def load_bracelet_rollup(session, time_range="1d"):
+    """팔찌 추이 차트용 사이클별 패턴 집계"""
+    return load_cached(session, "bracelet_rollup", _query_bracelet_rollup, "bracelet_price_records", time_range)
+
+
+def rollup_trend(rollup_df):
+    """필터된 집계 행에서 사이클별 최저가 행 + 두 번째 최저가"""
+    min_price_df = rollup_df.loc[rollup_df.groupby("search_cycle_id")["min_price"].idxmin()]
+    min_price_df = min_price_df.rename(columns={"min_price": "price"})
+
+    # 사이클 안의 (최저가, 두 번째 최저가) 전체에서 두 번째로 작은 값
+    prices = pd.concat([
+        rollup_df[["search_cycle_id", "min_price"]].rename(columns={"min_price": "p"}),
+        rollup_df[["search_cycle_id", "second_price"]].rename(columns={"second_price": "p"}),
+    ]).dropna().sort_values("p")
+    prices["rank"] = prices.groupby("search_cycle_id").cumcount()
+    second = prices[prices["rank"] == 1].set_index("search_cycle_id")["p"]
+    min_price_df["second_price"] = min_price_df["search_cycle_id"].map(second)
+    return min_price_df.sort_values("timestamp")
+
+
+DEFAULT_CHART_WIDTH = 1200  # px, 차트 한 픽셀 열에 점 하나 정도면 충분
+
+
+def downsample_min_max(df, y_col, target_points):
+    """
+    x(시간) 순서의 행을 같은 개수씩 target_points // 2 구간으로 나누고 구간마다 최저/최고 행만 남김
+    - 최저가 행은 항상 남으므로 싼 매물이 찍힌 지점이 사라지지 않음
+    - 행 전체를 남기므로 hover 정보도 그대로 유지
+    """
+    n = len(df)
+    if target_points < 2 or n <= target_points:
+        return df
+
+    bucket_count = target_points // 2
+    edges = np.linspace(0, n, bucket_count + 1).astype(np.int64)
+    buckets = np.repeat(np.arange(bucket_count), np.diff(edges))
+    y = df[y_col].to_numpy(dtype=np.float64)
+
+    # 구간 안에서 y 오름차순 정렬 -> 구간의 첫 행이 최저, 마지막 행이 최고
+    order = np.lexsort((y, buckets))
+    sorted_buckets = buckets[order]
+    starts = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    keep = np.unique(np.concatenate([order[starts], order[ends]]))
+    return df.iloc[keep]
+
+
+def filter_by_options(df, includes, excludes):
+    """옵션 문자열("옵션 등급,옵션 등급") 기준 포함/제외 필터"""
+    grade_map = {"하옵": "1", "중옵": "2", "상옵": "3"}
+    for selected_option, selected_grade in includes:
+        if selected_grade == "없음":
+            df = df[
+                df["options"].apply(
+                    lambda x: (
+                        any(
+                            selected_option in opt.strip()
+                            for opt in x.split(",")
+                        )
+                        if pd.notna(x)
+                        else False
+                    )
+                )
+            ]
+        else:
+            option_pattern = f"{selected_option} {grade_map[selected_grade]}"
+            df = df[
+                df["options"].apply(
+                    lambda x: (
+                        option_pattern in [opt.strip() for opt in x.split(",")]
+                        if pd.notna(x)
+                        else False
+                    )
+                )
+            ]
 
-    query = f"""
+    # 선택된 제외 옵션 적용 - 정확한 옵션명 매칭
+    if excludes:
+        df = df[
+            ~df["options"].apply(
+                lambda x: (
+                    any(
+                        exclude_opt == opt.split()[0]
+                        for exclude_opt in excludes
+                        for opt in x.split(",")
+                    )
+                    if pd.notna(x)
+                    else False
+                )
+            )
+        ]
+    return df
+
+
+def _query_accessory_data(session, since):
+    df = read_since(session, """
     SELECT 
         pr.timestamp,
         pr.search_cycle_id,
@@ -33,78 +240,72 @@ def load_accessory_data(session, time_range="1d"):
         GROUP_CONCAT(io.option_name || ' ' || io.option_grade) as options
     FROM price_records pr
     LEFT JOIN item_options io ON pr.id = io.price_record_id
-    WHERE pr.timestamp > '{time_limit}'
+    WHERE pr.timestamp >= :since
     GROUP BY pr.id
-    """
-    df = pd.read_sql(query, session.bind)
+    """, since)
     df["timestamp"] = pd.to_datetime(df["timestamp"])
     df["end_time"] = pd.to_datetime(df["end_time"])  # end_time도 datetime으로 변환
     return df
 
 
-def load_bracelet_data(session, time_range="1d"):
-    """팔찌 데이터 로드"""
-    # 시간 범위에 따른 쿼리 조건 설정
-    if time_range == "1d":
-        time_limit = datetime.now() - timedelta(days=1)
-    elif time_range == "1w":
-        time_limit = datetime.now() - timedelta(weeks=1)
-    elif time_range == "1m":
-        time_limit = datetime.now() - timedelta(days=30)
-    else:  # all
-        time_limit = datetime(2000, 1, 1)
+def load_accessory_data(session, time_range="1d"):
+    return load_cached(session, "accessory_data", _query_accessory_data, "price_records", time_range,
+                       pruned_table="price_records")
 
-    query = f"""
-    SELECT 
-        b.timestamp,
-        b.search_cycle_id,
-        b.grade,
-        b.name,
-        b.price,
-        b.fixed_option_count,
-        b.extra_option_count,
-        GROUP_CONCAT(DISTINCT 
-            CASE WHEN cs.stat_type IS NOT NULL 
-            THEN cs.stat_type || ' ' || cs.value 
-            END
-        ) as combat_stats,
-        GROUP_CONCAT(DISTINCT 
-            CASE WHEN bs.stat_type IS NOT NULL 
-            THEN bs.stat_type || ' ' || bs.value 
-            END
-        ) as base_stats,
-        GROUP_CONCAT(DISTINCT 
-            CASE WHEN se.effect_type IS NOT NULL 
-            THEN se.effect_type || COALESCE(' ' || se.value, '')
-            END
-        ) as special_effects
-    FROM bracelet_price_records b
-    LEFT JOIN bracelet_combat_stats cs ON b.id = cs.bracelet_id
-    LEFT JOIN bracelet_base_stats bs ON b.id = bs.bracelet_id
-    LEFT JOIN bracelet_special_effects se ON b.id = se.bracelet_id
-    WHERE b.timestamp > '{time_limit}'
-    GROUP BY b.id, b.timestamp, b.grade, b.name, b.price, b.fixed_option_count, b.extra_option_count, b.search_cycle_id
-    ORDER BY b.timestamp DESC
-    """
 
-    df = pd.read_sql(query, session.bind)
+def _query_bracelet_data(session, since):
+    # bracelet_flat_records는 팔찌 1개 = 1행이라 JOIN/GROUP_CONCAT 없이 문자열만 이어 붙임
+    df = read_since(session, """
+    SELECT 
+        f.timestamp,
+        f.search_cycle_id,
+        f.grade,
+        f.name,
+        f.price,
+        f.fixed_option_count,
+        f.extra_option_count,
+        NULLIF(
+            COALESCE(f.combat_stat_1 || ' ' || f.combat_value_1, '')
+            || COALESCE(',' || f.combat_stat_2 || ' ' || f.combat_value_2, ''),
+        '') as combat_stats,
+        f.base_stat || ' ' || f.base_value as base_stats,
+        NULLIF(
+            COALESCE(f.special_effect_1 || COALESCE(' ' || f.special_value_1, ''), '')
+            || COALESCE(',' || f.special_effect_2 || COALESCE(' ' || f.special_value_2, ''), '')
+            || COALESCE(',' || f.special_effect_3 || COALESCE(' ' || f.special_value_3, ''), ''),
+        '') as special_effects
+    FROM bracelet_flat_records f
+    WHERE f.timestamp >= :since
+    ORDER BY f.timestamp DESC
+    """, since)
     df["timestamp"] = pd.to_datetime(df["timestamp"])
     return df
 
 
+def load_bracelet_data(session, time_range="1d"):
+    """팔찌 데이터 로드"""
+    return load_cached(session, "bracelet_data", _query_bracelet_data, "bracelet_price_records", time_range,
+                       pruned_table="bracelet_flat_records")
+
+
 def run_dashboard():
     st.title("T4 악세서리 경매장 분석")
 
     # 현재 선택된 탭 추적을 위한 radio 버튼
     current_tab = st.sidebar.radio("분석 대상 선택", ["악세서리", "팔찌"])
 
+    # 긴 기간 차트는 이 너비에 맞춰 점 개수를 줄여서 그림
+    chart_width = st.sidebar.number_input(
+        "차트 너비(px)", min_value=300, max_value=4000, value=DEFAULT_CHART_WIDTH, step=100
+    )
+
     if current_tab == "악세서리":
-        display_accessory_dashboard()
+        display_accessory_dashboard(chart_width)
     else:
-        display_bracelet_dashboard()
+        display_bracelet_dashboard(chart_width)
 
 
-def display_accessory_dashboard():
+def display_accessory_dashboard(chart_width=DEFAULT_CHART_WIDTH):
     st.header("악세서리 경매장 분석")
     db = DatabaseManager()
 
@@ -121,15 +322,17 @@ def display_accessory_dashboard():
     )
 
     with db.get_read_session() as session:
-        df = load_accessory_data(session, time_range)
+        # 추이는 사이클별 집계에서, 최근 매물 목록은 최근 1일 원본에서 읽음
+        rollup_df = load_accessory_rollup(session, time_range)
+        df = load_accessory_data(session, "1d")
 
-        if df.empty:
+        if rollup_df.empty and df.empty:
             st.warning("선택한 기간에 데이터가 없습니다.")
             return
 
         # 기본 필터
-        grades = df["grade"].unique().tolist()
-        parts = df["part"].unique().tolist()
+        grades = sorted(set(rollup_df["grade"]) | set(df["grade"]))
+        parts = sorted(set(rollup_df["part"]) | set(df["part"]))
         trade_counts = sorted(df["trade_count"].unique().tolist())
 
         col1, col2 = st.sidebar.columns(2)
@@ -142,7 +345,7 @@ def display_accessory_dashboard():
         )
 
         # 연마 단계 필터 추가
-        levels = sorted(df["level"].unique().tolist())
+        levels = sorted(set(rollup_df["level"]) | set(df["level"]))
         selected_levels = st.sidebar.multiselect(
             "연마 단계", options=levels, default=levels
         )
@@ -174,53 +377,20 @@ def display_accessory_dashboard():
             "깡무공",
         ]
         grade_options = ["없음", "하옵", "중옵", "상옵"]
-        grade_map = {"하옵": "1", "중옵": "2", "상옵": "3"}
-
-        # 1. 기본 필터 먼저 적용
-        filtered_df = df[
-            df["grade"].isin(selected_grade)
-            & df["part"].isin(selected_part)
-            & df["level"].isin(selected_levels)
-            & df["quality"].between(quality_range[0], quality_range[1])
-            & df["trade_count"].isin(selected_trade_count)
-        ]
 
-        # 2. 포함할 옵션 필터 적용
+        # 포함할 옵션 선택
         st.sidebar.subheader("포함할 옵션")
+        includes = []
         for i in range(3):
             col1, col2 = st.sidebar.columns(2)
             selected_option = col1.selectbox(
                 f"포함할 옵션 {i+1}", available_options, key=f"include_opt_{i}"
             )
-            selected_grade = col2.selectbox(
+            selected_option_grade = col2.selectbox(
                 "등급", grade_options, key=f"include_grade_{i}"
             )
-
             if selected_option != "없음":
-                if selected_grade == "없음":
-                    filtered_df = filtered_df[
-                        filtered_df["options"].apply(
-                            lambda x: (
-                                any(
-                                    selected_option in opt.strip()
-                                    for opt in x.split(",")
-                                )
-                                if pd.notna(x)
-                                else False
-                            )
-                        )
-                    ]
-                else:
-                    option_pattern = f"{selected_option} {grade_map[selected_grade]}"
-                    filtered_df = filtered_df[
-                        filtered_df["options"].apply(
-                            lambda x: (
-                                option_pattern in [opt.strip() for opt in x.split(",")]
-                                if pd.notna(x)
-                                else False
-                            )
-                        )
-                    ]
+                includes.append((selected_option, selected_option_grade))
 
         # 제외할 옵션 필터를 멀티셀렉트로 변경
         st.sidebar.subheader("제외할 옵션")
@@ -232,69 +402,95 @@ def display_accessory_dashboard():
             "제외할 옵션 선택", options=exclude_options, default=[]
         )
 
-        # 선택된 제외 옵션 적용 - 정확한 옵션명 매칭을 위해 수정
-        if selected_excludes:
-            filtered_df = filtered_df[
-                ~filtered_df["options"].apply(
-                    lambda x: (
-                        any(
-                            exclude_opt == opt.split()[0]
-                            for exclude_opt in selected_excludes
-                            for opt in x.split(",")
-                        )
-                        if pd.notna(x)
-                        else False
-                    )
-                )
+        def apply_filters(frame, with_listing_filters=True):
+            frame = frame[
+                frame["grade"].isin(selected_grade)
+                & frame["part"].isin(selected_part)
+                & frame["level"].isin(selected_levels)
             ]
+            if with_listing_filters:
+                frame = frame[
+                    frame["quality"].between(quality_range[0], quality_range[1])
+                    & frame["trade_count"].isin(selected_trade_count)
+                ]
+            return filter_by_options(frame, includes, selected_excludes)
+
+        filtered_df = apply_filters(df)
 
         # 차트 및 통계
         st.header("📊 경매장 분석")
 
         # 최저가 추이
         st.subheader("선택한 옵션 조합의 최저가 추이")
-        if not filtered_df.empty:
-            # search_cycle_id로 그룹화하여 각 사이클당 최저가 항목 선택
-            min_price_indices = filtered_df.groupby("search_cycle_id")["price"].idxmin()
-            min_price_df = filtered_df.loc[
-                min_price_indices,
-                ["timestamp", "price", "quality", "name", "grade", "options"],
-            ]
 
-            if not min_price_df.empty:
-                # 악세서리용 hover template
-                fig = px.line(
-                    min_price_df,
-                    x="timestamp",
-                    y="price",
-                    title="최저가 추이",
-                    custom_data=[
-                        "quality",
-                        "name",
-                        "grade",
-                        "options",
-                    ],  # 악세서리 데이터
-                )
+        # 집계에는 품질/거래 횟수가 없으므로, 그 필터를 좁힌 경우에만 원본 전체 기간을 읽음
+        use_rollup = quality_range == (67, 100) and set(selected_trade_count) == set(trade_counts)
+        if use_rollup:
+            filtered_rollup = apply_filters(rollup_df, with_listing_filters=False)
+            min_price_df = (
+                rollup_trend(filtered_rollup).rename(columns={"min_quality": "quality", "min_name": "name"})
+                if not filtered_rollup.empty
+                else filtered_rollup
+            )
+        else:
+            range_df = apply_filters(load_accessory_data(session, time_range))
+            min_price_df = range_df
+            if not range_df.empty:
+                # search_cycle_id로 그룹화하여 각 사이클당 최저가 항목 선택
+                min_price_indices = range_df.groupby("search_cycle_id")["price"].idxmin()
+                min_price_df = range_df.loc[
+                    min_price_indices,
+                    ["timestamp", "price", "quality", "name", "grade", "options"],
+                ].sort_values("timestamp")
+
+        if not min_price_df.empty:
+            total_points = len(min_price_df)
+            min_price_df = downsample_min_max(min_price_df, "price", chart_width)
+
+            # 악세서리용 hover template
+            fig = px.line(
+                min_price_df,
+                x="timestamp",
+                y="price",
+                title="최저가 추이",
+                custom_data=[
+                    "quality",
+                    "name",
+                    "grade",
+                    "options",
+                ],  # 악세서리 데이터
+            )
 
-                fig.update_layout(
-                    xaxis_title="시간",
-                    yaxis_title="가격",
-                    yaxis_tickformat=",",
+            fig.update_layout(
+                xaxis_title="시간",
+                yaxis_title="가격",
+                yaxis_tickformat=",",
+            )
+
+            fig.update_traces(
+                hovertemplate="<br>".join(
+                    [
+                        "시간: %{x}",
+                        "가격: %{y:,}골드",
+                        "품질: %{customdata[0]}",
+                        "이름: %{customdata[1]}",
+                        "등급: %{customdata[2]}",
+                        "옵션: %{customdata[3]}",
+                    ]
                 )
+            )
 
-                fig.update_traces(
-                    hovertemplate="<br>".join(
-                        [
-                            "시간: %{x}",
-                            "가격: %{y:,}골드",
-                            "품질: %{customdata[0]}",
-                            "이름: %{customdata[1]}",
-                            "등급: %{customdata[2]}",
-                            "옵션: %{customdata[3]}",
-                        ]
-                    )
+            if use_rollup:
+                fig.add_scatter(
+                    x=min_price_df["timestamp"],
+                    y=min_price_df["second_price"],
+                    mode="lines",
+                    name="두 번째 최저가",
+                    line={"dash": "dot"},
                 )
-                st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(fig, use_container_width=True)
+            if len(min_price_df) < total_points:
+                st.caption(f"구간별 최저/최고만 표시: {len(min_price_df):,} / {total_points:,} 포인트")
         else:
             st.info("선택한 조건에 맞는 데이터가 없습니다.")
 
@@ -335,7 +531,7 @@ def display_accessory_dashboard():
             st.text(display_text)
 
 
-def display_bracelet_dashboard():
+def display_bracelet_dashboard(chart_width=DEFAULT_CHART_WIDTH):
     """팔찌 대시보드 표시"""
     st.header("팔찌 경매장 분석")
     db = DatabaseManager()
@@ -354,30 +550,28 @@ def display_bracelet_dashboard():
     )
 
     with db.get_read_session() as session:
-        df = load_bracelet_data(session, time_range)
+        # 추이/통계는 사이클별 패턴 집계에서, 최근 거래 목록은 최근 1일 원본에서 읽음
+        rollup_df = load_bracelet_rollup(session, time_range)
+        df = load_bracelet_data(session, "1d")
 
-        if df.empty:
+        if rollup_df.empty and df.empty:
             st.warning("선택한 기간에 데이터가 없습니다.")
             return
 
-        # timestamp 컬럼을 datetime으로 변환
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-
         st.sidebar.header("팔찌 필터")
         # 1. 기본 필터 (등급, 고정 효과)
         col1, col2 = st.sidebar.columns(2)
-        selected_grade = col1.multiselect(
-            "등급", df["grade"].unique(), default=df["grade"].unique()
-        )
+        grades = sorted(set(rollup_df["grade"]) | set(df["grade"]))
+        selected_grade = col1.multiselect("등급", grades, default=grades)
 
         # 고정 효과 개수 필터
-        fixed_counts = sorted(df["fixed_option_count"].unique())
+        fixed_counts = sorted(set(rollup_df["fixed_option_count"]) | set(df["fixed_option_count"]))
         selected_fixed_count = col2.multiselect(
             "고정 효과 개수", fixed_counts, default=fixed_counts
         )
 
         # 2. 부여 효과 개수 필터
-        extra_counts = sorted(df["extra_option_count"].unique())
+        extra_counts = sorted(set(rollup_df["extra_option_count"]) | set(df["extra_option_count"]))
         selected_extra_count = st.sidebar.multiselect(
             "부여 효과 개수", extra_counts, default=extra_counts
         )
@@ -408,6 +602,7 @@ def display_bracelet_dashboard():
             "기본 스탯 선택", ["없음"] + base_stats
         )
 
+        base_stat_range = (6400, 12800)
         if selected_base_stat != "없음":
             base_stat_range = st.sidebar.slider(
                 f"{selected_base_stat} 수치",
@@ -416,38 +611,47 @@ def display_bracelet_dashboard():
                 value=(6400, 12800),
             )
 
-        # 필터 적용
-        filtered_df = df[
-            (df["grade"].isin(selected_grade))
-            & (df["fixed_option_count"].isin(selected_fixed_count))
-            & (df["extra_option_count"].isin(selected_extra_count))
-        ]
-
-        # 전투특성 필터 적용
-        for stat, (min_val, max_val) in combat_stat_filters.items():
-            filtered_df = filtered_df[
-                filtered_df["combat_stats"].apply(
-                    lambda x: any(
-                        stat in cs and min_val <= float(cs.split()[-1]) <= max_val
-                        for cs in str(x).split(",")
-                        if stat in cs
-                    )
-                )
+        def apply_filters(frame, base_stat_values=True):
+            frame = frame[
+                (frame["grade"].isin(selected_grade))
+                & (frame["fixed_option_count"].isin(selected_fixed_count))
+                & (frame["extra_option_count"].isin(selected_extra_count))
             ]
 
-        # 기본 스탯 필터 적용
-        if selected_base_stat != "없음":
-            min_val, max_val = base_stat_range
-            filtered_df = filtered_df[
-                filtered_df["base_stats"].apply(
-                    lambda x: any(
-                        selected_base_stat in bs
-                        and min_val <= float(bs.split()[-1]) <= max_val
-                        for bs in str(x).split(",")
-                        if selected_base_stat in bs
+            # 전투특성 필터 적용
+            for stat, (min_val, max_val) in combat_stat_filters.items():
+                frame = frame[
+                    frame["combat_stats"].apply(
+                        lambda x: any(
+                            stat in cs and min_val <= float(cs.split()[-1]) <= max_val
+                            for cs in str(x).split(",")
+                            if stat in cs
+                        )
                     )
-                )
-            ]
+                ]
+
+            # 기본 스탯 필터 적용 (집계에는 종류만 있음)
+            if selected_base_stat != "없음":
+                if base_stat_values:
+                    min_val, max_val = base_stat_range
+                    frame = frame[
+                        frame["base_stats"].apply(
+                            lambda x: any(
+                                selected_base_stat in bs
+                                and min_val <= float(bs.split()[-1]) <= max_val
+                                for bs in str(x).split(",")
+                                if selected_base_stat in bs
+                            )
+                        )
+                    ]
+                else:
+                    frame = frame[frame["base_stats"].str.contains(selected_base_stat, na=False)]
+            return frame
+
+        filtered_df = apply_filters(df)
+
+        # 기본 스탯 수치 범위를 좁힌 경우에만 원본 전체 기간을 읽음
+        use_rollup = base_stat_range == (6400, 12800)
 
         # 메인 대시보드
         st.header("📊 경매장 분석")
@@ -455,12 +659,31 @@ def display_bracelet_dashboard():
         # 최저가 추이 차트
         st.subheader("선택한 옵션 조합의 최저가 추이")
 
+        if use_rollup:
+            filtered_rollup = apply_filters(rollup_df, base_stat_values=False)
+            trend_df = filtered_rollup
+            if not filtered_rollup.empty:
+                trend_df = rollup_trend(
+                    filtered_rollup.drop(columns=["base_stats", "special_effects"])
+                ).rename(columns={"min_base_stats": "base_stats", "min_special_effects": "special_effects"})
+                trend_df = trend_df.replace({"base_stats": {"": None}, "special_effects": {"": None}})
+            price_min = filtered_rollup["min_price"].min() if not filtered_rollup.empty else None
+            listing_count = int(filtered_rollup["listing_count"].sum())
+            price_mean = filtered_rollup["price_sum"].sum() / listing_count if listing_count else None
+        else:
+            range_df = apply_filters(load_bracelet_data(session, time_range))
+            trend_df = range_df
+            if not range_df.empty:
+                # search_cycle_id로 그룹화하여 각 사이클당 최저가 항목 선택
+                min_price_indices = range_df.groupby("search_cycle_id")["price"].idxmin()
+                trend_df = range_df.loc[min_price_indices].sort_values("timestamp")
+            price_min = range_df["price"].min() if not range_df.empty else None
+            price_mean = range_df["price"].mean() if not range_df.empty else None
+            listing_count = len(range_df)
+
         # 최저가 추이 차트
-        if not filtered_df.empty:
-            # search_cycle_id로 그룹화하여 각 사이클당 최저가 항목 선택
-            min_price_indices = filtered_df.groupby("search_cycle_id")["price"].idxmin()
-            min_price_df = filtered_df.loc[
-                min_price_indices,
+        if not trend_df.empty:
+            min_price_df = trend_df[
                 [
                     "timestamp",
                     "price",
@@ -469,68 +692,81 @@ def display_bracelet_dashboard():
                     "combat_stats",
                     "base_stats",
                     "special_effects",
-                ],
+                ]
+                + (["second_price"] if use_rollup else [])
             ]
+            total_points = len(min_price_df)
+            min_price_df = downsample_min_max(min_price_df, "price", chart_width)
+
+            fig = px.line(
+                min_price_df,
+                x="timestamp",
+                y="price",
+                title="최저가 추이",
+                custom_data=[
+                    "fixed_option_count",
+                    "extra_option_count",
+                    "combat_stats",
+                    "base_stats",
+                    "special_effects",
+                ],
+            )
 
-            if not min_price_df.empty:
-                fig = px.line(
-                    min_price_df,
-                    x="timestamp",
-                    y="price",
-                    title="최저가 추이",
-                    custom_data=[
-                        "fixed_option_count",
-                        "extra_option_count",
-                        "combat_stats",
-                        "base_stats",
-                        "special_effects",
-                    ],
-                )
+            fig.update_layout(
+                xaxis_title="시간",
+                yaxis_title="가격",
+                yaxis_tickformat=",",
+            )
 
-                fig.update_layout(
-                    xaxis_title="시간",
-                    yaxis_title="가격",
-                    yaxis_tickformat=",",
+            # custom hover template
+            def custom_hover_template(data):
+                base_template = (
+                    "시간: %{x}<br>"
+                    + "가격: %{y:,}골드<br>"
+                    + "고정효과: %{customdata[0]}개<br>"
+                    + "부여효과: %{customdata[1]}개<br>"
+                    + "전투특성: %{customdata[2]}"
                 )
 
-                # custom hover template
-                def custom_hover_template(data):
-                    base_template = (
-                        "시간: %{x}<br>"
-                        + "가격: %{y:,}골드<br>"
-                        + "고정효과: %{customdata[0]}개<br>"
-                        + "부여효과: %{customdata[1]}개<br>"
-                        + "전투특성: %{customdata[2]}"
-                    )
+                # 기본스탯이 있는 경우에만 추가
+                if pd.notna(data["base_stats"]):
+                    base_template += f"<br>기본스탯: {data['base_stats']}"
 
-                    # 기본스탯이 있는 경우에만 추가
-                    if pd.notna(data["base_stats"]):
-                        base_template += f"<br>기본스탯: {data['base_stats']}"
+                # 특수효과가 있는 경우에만 추가
+                if pd.notna(data["special_effects"]):
+                    base_template += f"<br>특수효과: {data['special_effects']}"
 
-                    # 특수효과가 있는 경우에만 추가
-                    if pd.notna(data["special_effects"]):
-                        base_template += f"<br>특수효과: {data['special_effects']}"
+                return base_template + "<extra></extra>"
 
-                    return base_template + "<extra></extra>"
+            fig.update_traces(
+                hovertemplate=custom_hover_template(min_price_df.iloc[0])
+            )
 
-                fig.update_traces(
-                    hovertemplate=custom_hover_template(min_price_df.iloc[0])
+            if use_rollup:
+                fig.add_scatter(
+                    x=min_price_df["timestamp"],
+                    y=min_price_df["second_price"],
+                    mode="lines",
+                    name="두 번째 최저가",
+                    line={"dash": "dot"},
                 )
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.info("선택한 조건에 맞는 데이터가 없습니다.")
+            st.plotly_chart(fig, use_container_width=True)
+            if len(min_price_df) < total_points:
+                st.caption(f"구간별 최저/최고만 표시: {len(min_price_df):,} / {total_points:,} 포인트")
+        else:
+            st.info("선택한 조건에 맞는 데이터가 없습니다.")
 
         # 기본 통계
         col1, col2, col3 = st.columns(3)
         col1.metric(
             "현재 최저가",
-            f"{int(filtered_df['price'].min()):,}" if not filtered_df.empty else "-",
+            f"{int(price_min):,}" if price_min is not None else "-",
         )
         col2.metric(
             "평균 가격",
-            f"{int(filtered_df['price'].mean()):,}" if not filtered_df.empty else "-",
+            f"{int(price_mean):,}" if price_mean is not None else "-",
         )
-        col3.metric("데이터 수", f"{len(filtered_df):,}")
+        col3.metric("데이터 수", f"{listing_count:,}")
 
         # 최근 거래 데이터 표시
         st.subheader("최근 거래 데이터")
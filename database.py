@@ -125,6 +125,126 @@ class BraceletSpecialEffect(Base):
         Index('idx_effect_value', 'effect_type', 'value'),
     )
 
+class BraceletFlatRecord(Base):
+    """팔찌 매물 한 건 = 한 행 (스탯/효과를 고정 컬럼으로 펼친 비정규화 테이블, 수집 시 같이 기록)"""
+    __tablename__ = 'bracelet_flat_records'
+
+    id = Column(Integer, primary_key=True)
+    bracelet_id = Column(Integer, ForeignKey('bracelet_price_records.id'), unique=True)
+    timestamp = Column(DateTime, nullable=False)
+    search_cycle_id = Column(String, nullable=False, index=True)
+    grade = Column(String, nullable=False)
+    name = Column(String, nullable=False)
+    trade_count = Column(Integer, nullable=False)
+    price = Column(Integer, nullable=False)
+    end_time = Column(DateTime, nullable=False)
+    fixed_option_count = Column(Integer, nullable=False)
+    extra_option_count = Column(Integer, nullable=False)
+
+    # 전투특성 최대 2개, 기본스탯 1개, 특수효과 최대 3개 (고정 효과 개수 이내)
+    combat_stat_1 = Column(String, nullable=True)
+    combat_value_1 = Column(Integer, nullable=True)
+    combat_stat_2 = Column(String, nullable=True)
+    combat_value_2 = Column(Integer, nullable=True)
+    base_stat = Column(String, nullable=True)
+    base_value = Column(Integer, nullable=True)
+    special_effect_1 = Column(String, nullable=True)
+    special_value_1 = Column(Float, nullable=True)
+    special_effect_2 = Column(String, nullable=True)
+    special_value_2 = Column(Float, nullable=True)
+    special_effect_3 = Column(String, nullable=True)
+    special_value_3 = Column(Float, nullable=True)
+
+    __table_args__ = (
+        Index('idx_bracelet_flat_search', 'timestamp', 'grade'),
+    )
+
+class AccessoryPriceRollup(Base):
+    """사이클 x (등급, 부위, 연마 단계, 옵션 조합)별 최저가/두 번째 최저가/매물 수 (수집 시 갱신)"""
+    __tablename__ = 'accessory_price_rollups'
+
+    id = Column(Integer, primary_key=True)
+    search_cycle_id = Column(String, nullable=False)
+    timestamp = Column(DateTime, nullable=False, index=True)  # 사이클 안에서 가장 이른 수집 시각
+    grade = Column(String, nullable=False)
+    part = Column(String, nullable=False)
+    level = Column(Integer, nullable=False)
+    options = Column(String, nullable=False)  # "옵션 등급"을 정렬해서 ','로 연결 (대시보드 형식과 동일)
+    min_price = Column(Integer, nullable=False)
+    second_price = Column(Integer, nullable=True)
+    listing_count = Column(Integer, nullable=False)
+    price_sum = Column(Integer, nullable=False)
+    min_name = Column(String, nullable=True)
+    min_quality = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index('idx_acc_rollup_key', 'search_cycle_id', 'grade', 'part', 'level', 'options', unique=True),
+    )
+
+class BraceletPriceRollup(Base):
+    """사이클 x 팔찌 패턴(등급, 고정/부여 개수, 전투특성, 기본스탯/특수효과 종류)별 최저가 (수집 시 갱신)"""
+    __tablename__ = 'bracelet_price_rollups'
+
+    id = Column(Integer, primary_key=True)
+    search_cycle_id = Column(String, nullable=False)
+    timestamp = Column(DateTime, nullable=False, index=True)
+    grade = Column(String, nullable=False)
+    fixed_option_count = Column(Integer, nullable=False)
+    extra_option_count = Column(Integer, nullable=False)
+    combat_stats = Column(String, nullable=False)   # "특화 100,치명 60" 처럼 값까지 포함
+    base_stats = Column(String, nullable=False)     # 종류만 ("힘")
+    special_effects = Column(String, nullable=False)  # 종류만
+    min_price = Column(Integer, nullable=False)
+    second_price = Column(Integer, nullable=True)
+    listing_count = Column(Integer, nullable=False)
+    price_sum = Column(Integer, nullable=False)
+    min_base_stats = Column(String, nullable=True)       # 최저가 매물의 값 포함 문자열 (툴팁용)
+    min_special_effects = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index('idx_bracelet_rollup_key', 'search_cycle_id', 'grade', 'fixed_option_count', 'extra_option_count',
+              'combat_stats', 'base_stats', 'special_effects', unique=True),
+    )
+
+class PriceExplanation(Base):
+    """캐시 키별 가격 계산 중간값 (캐시 빌드마다 저장, 최근 몇 번의 빌드만 보존 - price_explanation.py)"""
+    __tablename__ = 'price_explanations'
+
+    id = Column(Integer, primary_key=True)
+    build_time = Column(DateTime, nullable=False, index=True)  # 캐시 파일의 last_update와 같은 값
+    window = Column(String, nullable=False)     # 2h / 6h / 24h / 7d
+    kind = Column(String, nullable=False)       # dealer / support / bracelet
+    cache_key = Column(String, nullable=False)  # 악세 그룹 키 또는 팔찌 패턴 키 (고대|전특2|치명+특화|80+90|부여2)
+    price = Column(Integer, nullable=True)      # 캐시에 들어간 가격 (표본이 부족해서 빠진 키는 None)
+    sample_count = Column(Integer, nullable=False)
+    details = Column(String, nullable=False)    # JSON: 두 번째 최저가, 표본 id/가격, 계수, 공통 옵션 가치와 표본 수
+
+    __table_args__ = (
+        Index('idx_explanation_lookup', 'kind', 'cache_key', 'window', 'build_time'),
+    )
+
+class CollectionSegmentStat(Base):
+    """수집 검색 구간(프리셋)별 이전 사이클 통계 - 수집 계획에 사용 (collection_planner.py)"""
+    __tablename__ = 'collection_segment_stats'
+
+    segment_key = Column(String, primary_key=True)  # acc|고대|목걸이|lv2|추피1,적주피2 / bracelet|고대|고정2,부여3,치명,특화
+    listing_count = Column(Integer, nullable=False)  # 마지막으로 본 전체 매물 수
+    price_spread = Column(Float, nullable=False)     # 로그 가격 표준편차 (EMA)
+    notable_count = Column(Float, nullable=False)    # 사이클당 스캐너 알림 매물 수 (EMA)
+    cycles = Column(Integer, nullable=False)         # 통계를 갱신한 사이클 수
+    updated_at = Column(DateTime, nullable=False)
+
+class CollectionCycle(Base):
+    """수집 사이클별 요청 수 (최저가 기준 페이징과 전체 깊이 수집 비교용 - floor_paging_report.py)"""
+    __tablename__ = 'collection_cycles'
+
+    search_cycle_id = Column(String, primary_key=True)
+    started_at = Column(DateTime, nullable=False)
+    full_sweep = Column(Boolean, nullable=False)   # 최저가 기준 조기 종료 없이 계획한 페이지를 다 본 사이클
+    requests = Column(Integer, nullable=False)
+    skipped_pages = Column(Integer, nullable=False)  # 계획했지만 최저가 기준으로 건너뛴 페이지 수
+    collected = Column(Integer, nullable=False)
+
 class DatabaseManager:
     _instance = None
     _lock = threading.Lock()
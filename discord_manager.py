@@ -7,7 +7,7 @@ import os
 import utils, price_collector
 
 
-RESET = "\\u001b[0m"
+RESET = "\u001b[0m"
 
 def init_discord_manager(accept_queue):
     url = os.getenv("WEBHOOK2")
@@ -27,7 +27,7 @@ def init_discord_manager(accept_queue):
     return terminate
     
 def accessory_option(opt):
-    colorList = ["\\u001b[2;30m", "\\u001b[2;34m", "\\u001b[2;35m", "\\u001b[2;33m"]
+    colorList = ["\u001b[2;30m", "\u001b[2;34m", "\u001b[2;35m", "\u001b[2;33m"]
     scaleList = " 하중상"
     try:
         scale = utils.number_to_scale[opt["OptionName"]][opt["Value"]]
@@ -42,58 +42,59 @@ def bracelet_option_color(opt, grade):
         if grade == "고대":
             value -= 1
         if value == 2:
-            return "\\u001b[2;33m"
+            return "\u001b[2;33m"
         else:
-            return "\\u001b[2;34m"
+            return "\u001b[2;34m"
 
     elif name == "공격 및 이동 속도 증가": # 3~5 / 4~6
         if grade == "고대":
             value -= 1
         if value == 5:
-            return "\\u001b[2;33m"
+            return "\u001b[2;33m"
         elif value == 4:
-            return "\\u001b[2;35m"
+            return "\u001b[2;35m"
         else:
-            return "\\u001b[2;34m"
+            return "\u001b[2;34m"
 
     elif name in ["특화", "신속", "치명"]: # 61~100 / 81~120
         if grade == "고대":
             value -= 20
         if value == 100:
-            return "\\u001b[2;33m"
+            return "\u001b[2;33m"
         elif value > 80:
-            return "\\u001b[2;35m"
+            return "\u001b[2;35m"
         elif value > 62: # 62 was green
-            return "\\u001b[2;34m"
+            return "\u001b[2;34m"
         else: # 40 초과
-            return "\\u001b[2;32m"
+            return "\u001b[2;32m"
 
     elif name in ["힘", "민첩", "지능"]: # 6400~12800 / 9600~16000
         if grade == "고대":
             value -= 3200
         if value == 12800:
-            return "\\u001b[2;33m"
+            return "\u001b[2;33m"
         elif value > 10666:
-            return "\\u001b[2;35m"
+            return "\u001b[2;35m"
         elif value >= 8533: # 8512 was green
-            return "\\u001b[2;34m"
+            return "\u001b[2;34m"
         else: # 6400 이상
-            return "\\u001b[2;32m"
+            return "\u001b[2;32m"
     
     else: # 제/인/숙/체력/기타 특옵
-        return "\\u001b[2;30m"
+        return "\u001b[2;30m"
 
 def quality_color(quality):
     if quality == 100:
-        return "\\u001b[2;33m"
+        return "\u001b[2;33m"
     elif quality >= 90:
-        return "\\u001b[2;35m"
+        return "\u001b[2;35m"
     elif quality >= 70:
-        return "\\u001b[2;34m"
+        return "\u001b[2;34m"
     else:
-        return "\\u001b[2;32m"
+        return "\u001b[2;32m"
 
-def send_discord_message(url, item, evaluation):
+def format_alert_line(item, evaluation):
+    """알림 채널에 보낼 한 줄 요약 문자열"""
     options_str = ' '.join([f"{opt['OptionName']}{opt['Value']}" for opt in item["Options"] 
                         if opt["OptionName"] not in ["깨달음", "도약"]])
     
@@ -115,17 +116,20 @@ def send_discord_message(url, item, evaluation):
             f"고정 {evaluation['fixed_option_count']} 부여 {int(evaluation['extra_option_count'])} | "
             f"만료 {end_date} | "
             f"{options_str}")
+    return return_str
 
+def send_discord_message(url, item, evaluation):
+    return_str = format_alert_line(item, evaluation)
     print(return_str)
     post_message(url, return_str, wait=False)
 
 def format_multiline_message(item, evaluation):
-    toSend  = "```ansi\\n\\u001b[2;31m\\u001b[2;40m" if evaluation['grade'] == "유물" else "```ansi\\n\\u001b[2;37m\\u001b[2;40m"
-    toSend += f"{evaluation['grade']} {item['Name']}{RESET}\\n"
+    toSend  = "```ansi\n\u001b[2;31m\u001b[2;40m" if evaluation['grade'] == "유물" else "```ansi\n\u001b[2;37m\u001b[2;40m"
+    toSend += f"{evaluation['grade']} {item['Name']}{RESET}\n"
     
     if evaluation["type"] == "accessory": # 장신구
-        toSend += f"품질 {quality_color(evaluation['quality'])}{evaluation['quality']}{RESET} 거래 {item['AuctionInfo']['TradeAllowCount']}회\\n"
-        toSend += f"{evaluation['current_price']:,}골드 vs {evaluation['expected_price']:,}골드 ({evaluation['price_ratio']*100:.1f}%)\\n"
+        toSend += f"품질 {quality_color(evaluation['quality'])}{evaluation['quality']}{RESET} 거래 {item['AuctionInfo']['TradeAllowCount']}회\n"
+        toSend += f"{evaluation['current_price']:,}골드 vs {evaluation['expected_price']:,}골드 ({evaluation['price_ratio']*100:.1f}%)\n"
         options = []
         for opt in item["Options"]:
             if opt["OptionName"] == "깨달음":
@@ -135,7 +139,7 @@ def format_multiline_message(item, evaluation):
         toSend += " | ".join(options)
 
     else:  # 팔찌
-        toSend += f"{evaluation['current_price']:,}골드 vs {evaluation['expected_price']:,}골드 ({evaluation['price_ratio']*100:.1f}%)\\n"
+        toSend += f"{evaluation['current_price']:,}골드 vs {evaluation['expected_price']:,}골드 ({evaluation['price_ratio']*100:.1f}%)\n"
         options = []
         for opt in item["Options"]:
             if opt["OptionName"] == "도약":
@@ -144,22 +148,20 @@ def format_multiline_message(item, evaluation):
             options.append(f"{color}{opt['OptionName']} {int(opt['Value'])}{RESET}")
         toSend += " | ".join(options)
     
-    toSend += f"\\n만료 {item['AuctionInfo']['EndDate']}\\n```"
+    toSend += f"\n만료 {item['AuctionInfo']['EndDate']}\n```"
     return toSend
 
 def post_message(url, content, flags=0, wait=True):
-    headers = {"Content-Type": "application/json"}
-    data = f"""{{"content": "{content}", "flags": {flags}}}"""
+    data = {"content": content, "flags": flags}
     host = url + "?wait=true" if wait else url
     
-    response = requests.post(host, headers=headers, data=data)
+    response = requests.post(host, json=data)
     if wait: return json.loads(response.text)["id"]
 
 def patch_message(url, message_id, content):
-    headers = {"Content-Type": "application/json"}
-    data = f"""{{"content": "{content}"}}"""
+    data = {"content": content}
     
-    requests.patch(url + f"/messages/{message_id}", headers=headers, data=data)
+    requests.patch(url + f"/messages/{message_id}", json=data)
 
 def create_search_query(item, evaluation):
     spg = price_collector.SearchPresetGenerator()
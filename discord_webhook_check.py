@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import itertools
+import sys
+import time
+from typing import Dict, List, Tuple
+from aiohttp import web
+from async_discord_manager import DiscordWebhookClient, AsyncAlertDelivery
+
+"""
+가짜 Discord 웹훅 서버로 DiscordWebhookClient / AsyncAlertDelivery 동작 확인 (python discord_webhook_check.py)
+- 429 + retry_after: 기다렸다가 다시 보냄
+- X-RateLimit-Remaining=0 + X-RateLimit-Reset-After: 다음 요청을 리셋 시각까지 미룸
+- 5xx: 백오프 후 재시도
+- 알림 12개: 추적 채널에 embed 10개 + 2개 메시지로 묶고, embed 하나만 수정해도 나머지는 유지
+실제 Discord로는 아무것도 보내지 않음 (127.0.0.1 임의 포트)
+"""
+
+RESET_SECONDS = 0.3   # 가짜 서버가 돌려주는 retry_after / Reset-After
+
+class FakeWebhookServer:
+    """웹훅 이름별로 미리 정한 응답을 순서대로 돌려주고 받은 요청을 기록 (정한 응답이 없으면 200)"""
+
+    def __init__(self):
+        self.responses = {}   # 웹훅 이름 -> [(status, json, headers)]
+        self.requests = []    # (웹훅 이름, method, 받은 시각, json)
+        self.message_ids = itertools.count(1)
+        self.runner = None
+        self.base_url = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_route("POST", "/webhooks/{name}", self._handle)
+        app.router.add_route("PATCH", "/webhooks/{name}/messages/{message_id}", self._handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        self.base_url = f"http://{host}:{port}/webhooks"
+
+    async def close(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+    def url(self, name: str) -> str:
+        return f"{self.base_url}/{name}"
+
+    def script(self, name: str, *responses: Tuple[int, Dict, Dict]):
+        self.responses.setdefault(name, []).extend(responses)
+
+    def received(self, name: str) -> List[Tuple[str, float, Dict]]:
+        return [(method, at, payload) for hook, method, at, payload in self.requests if hook == name]
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        name = request.match_info["name"]
+        self.requests.append((name, request.method, time.monotonic(), await request.json()))
+        queued = self.responses.get(name)
+        status, body, headers = queued.pop(0) if queued else (200, None, {})
+        if status == 200 and body is None:
+            body = {"id": request.match_info.get("message_id") or str(next(self.message_ids))}
+        return web.json_response(body or {}, status=status, headers=headers)
+
+def sample_alert(index: int) -> Tuple[Dict, Dict]:
+    item = {
+        "Name": f"테스트 목걸이 {index}",
+        "Options": [{"OptionName": "깡공", "Value": 390.0, "IsValuePercentage": False}],
+        "AuctionInfo": {"EndDate": "2025-01-01T00:00:00", "TradeAllowCount": 2},
+    }
+    evaluation = {
+        "type": "accessory", "grade": "고대", "current_price": 10000 + index, "expected_price": 20000,
+        "price_ratio": 0.5, "quality": 90, "level": 1,
+    }
+    return item, evaluation
+
+async def check_retry_after(server: FakeWebhookServer) -> List[str]:
+    server.script("retry_after", (429, {"message": "You are being rate limited.", "retry_after": RESET_SECONDS,
+                                        "global": False}, {}))
+    client = DiscordWebhookClient()
+    try:
+        response = await client.post(server.url("retry_after"), {"content": "429"})
+    finally:
+        await client.close()
+    received = server.received("retry_after")
+    errors = []
+    if len(received) != 2:
+        errors.append(f"요청 {len(received)}번 (2번 기대)")
+    elif received[1][1] - received[0][1] < RESET_SECONDS:
+        errors.append(f"retry_after 전에 다시 보냄 ({received[1][1] - received[0][1]:.2f}s)")
+    if not response or "id" not in response:
+        errors.append(f"재시도 후 응답 없음: {response}")
+    return errors
+
+async def check_bucket_reset(server: FakeWebhookServer) -> List[str]:
+    server.script("bucket", (200, None, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": str(RESET_SECONDS)}))
+    client = DiscordWebhookClient()
+    try:
+        await client.post(server.url("bucket"), {"content": "first"})
+        await client.post(server.url("bucket"), {"content": "second"})
+    finally:
+        await client.close()
+    received = server.received("bucket")
+    if len(received) != 2:
+        return [f"요청 {len(received)}번 (2번 기대)"]
+    if received[1][1] - received[0][1] < RESET_SECONDS:
+        return [f"Reset-After 전에 다음 요청 ({received[1][1] - received[0][1]:.2f}s)"]
+    return []
+
+async def check_server_error(server: FakeWebhookServer) -> List[str]:
+    server.script("server_error", (502, {"message": "Bad Gateway"}, {}), (503, {"message": "Unavailable"}, {}))
+    client = DiscordWebhookClient()
+    try:
+        response = await client.post(server.url("server_error"), {"content": "5xx"})
+    finally:
+        await client.close()
+    received = server.received("server_error")
+    errors = []
+    if len(received) != 3:
+        errors.append(f"요청 {len(received)}번 (3번 기대)")
+    if not response or "id" not in response:
+        errors.append(f"재시도 후 응답 없음: {response}")
+    return errors
+
+async def check_coalescing(server: FakeWebhookServer) -> List[str]:
+    posted = []
+    delivery = AsyncAlertDelivery(server.url("alerts"), server.url("tracking"),
+                                  on_posted=lambda item, evaluation, message_id, index: posted.append((message_id, index)))
+    await delivery.start()
+    try:
+        for index in range(12):
+            delivery.notify(*sample_alert(index))
+        for _ in range(100):
+            if len(posted) == 12:
+                break
+            await asyncio.sleep(0.05)
+        message_id, index = posted[0] if posted else (None, 0)
+        await delivery.update_embed(message_id, index, "수정됨")
+    finally:
+        await delivery.close()
+
+    errors = []
+    tracking = server.received("tracking")
+    embed_counts = [len(payload["embeds"]) for method, _, payload in tracking if method == "POST"]
+    if embed_counts != [10, 2]:
+        errors.append(f"추적 채널 embed 묶음 {embed_counts} ([10, 2] 기대)")
+    if [index for _, index in posted] != list(range(10)) + list(range(2)):
+        errors.append(f"on_posted embed 위치 {posted}")
+    patches = [payload for method, _, payload in tracking if method == "PATCH"]
+    if len(patches) != 1 or len(patches[0]["embeds"]) != 10 or patches[0]["embeds"][0]["description"] != "수정됨":
+        errors.append("embed 수정이 나머지 embed를 유지하지 않음")
+    alert_lines = sum(payload["content"].count("\n") + 1 for _, _, payload in server.received("alerts"))
+    if alert_lines != 12:
+        errors.append(f"요약 채널 줄 수 {alert_lines} (12 기대)")
+    return errors
+
+CHECKS = {
+    "retry_after": check_retry_after,
+    "bucket_reset": check_bucket_reset,
+    "server_error": check_server_error,
+    "coalescing": check_coalescing,
+}
+
+async def run_checks(names: List[str]) -> bool:
+    server = FakeWebhookServer()
+    await server.start()
+    passed = True
+    try:
+        for name in names:
+            errors = await CHECKS[name](server)
+            print(f"[{'OK' if not errors else 'FAIL'}] {name}" + "".join(f"\n  - {error}" for error in errors))
+            passed = passed and not errors
+    finally:
+        await server.close()
+    return passed
+
+def main():
+    parser = argparse.ArgumentParser(description="가짜 Discord 웹훅 서버로 웹훅 클라이언트/알림 묶음 확인")
+    parser.add_argument("checks", nargs="*", help=f"실행할 확인 {list(CHECKS)} (기본: 전부)")
+    args = parser.parse_args()
+    unknown = [name for name in args.checks if name not in CHECKS]
+    if unknown:
+        parser.error(f"알 수 없는 확인: {unknown}")
+    if not asyncio.run(run_checks(args.checks or list(CHECKS))):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
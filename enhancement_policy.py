@@ -0,0 +1,131 @@
+from enhancement_simulator import *
+from enhancement_sim_with_auction import EnhancementAnalyzer
+from database import DatabaseManager
+from dataclasses import dataclass
+from typing import Dict, List, Tuple, Optional
+from datetime import datetime
+
+"""
+연마 중간 상태마다 '지금 판매 vs 계속 연마'를 동적 계획법으로 결정
+- 상태: 지금까지 붙은 옵션 (outcome_key로 정렬한 튜플, 0~3개)
+- 판매 가치: 현재 시장 캐시 기준 예상 가격 (EnhancementAnalyzer.evaluate_outcome 메모 공유)
+- 연마 가치: -(다음 연마 비용) + 다음 상태 가치의 기대값 (옵션은 남은 것 중 균등, 등급은 GRADE_PROBABILITIES)
+- 연마 비용: ENHANCEMENT_COSTS의 골드 + 가루 개수 x 가루 1개 골드 환산값
+"""
+
+FRAGMENT_GOLD_VALUE = 0.0        # 가루 1개의 골드 환산값 (기본은 골드 비용만 반영)
+DEFAULT_QUALITIES = (70, 90, 100)  # 정책표를 미리 계산할 품질
+
+@dataclass
+class PolicyDecision:
+    action: str            # "sell" 또는 "enhance"
+    value: float           # 이 상태에서 최적으로 행동했을 때의 기대 골드
+    sell_value: float      # 지금 판매했을 때의 예상 가격
+    enhance_value: Optional[float]  # 한 번 더 연마했을 때의 기대 골드 (비용 차감, 3연마 완료면 None)
+
+class EnhancementPolicySolver:
+    def __init__(self, analyzer: EnhancementAnalyzer,
+                 fragment_gold: float = FRAGMENT_GOLD_VALUE,
+                 qualities: Tuple[int, ...] = DEFAULT_QUALITIES):
+        self.analyzer = analyzer
+        self.simulator = EnhancementSimulator()
+        self.fragment_gold = fragment_gold
+        self.qualities = tuple(sorted(qualities))
+
+        # (악세 종류, 등급, 품질) -> {상태: PolicyDecision}
+        self.table: Dict[Tuple[AccessoryType, Grade, int], Dict[Outcome, PolicyDecision]] = {}
+        self.table_version = None
+
+    def step_cost(self, grade: Grade, step: int) -> float:
+        """step번째(0부터) 연마 한 번의 골드 환산 비용"""
+        cost = self.simulator.ENHANCEMENT_COSTS[grade][step]
+        return cost.gold + cost.fragments * self.fragment_gold
+
+    def solve(self, acc_type: AccessoryType, grade: Grade, quality: int) -> Dict[Outcome, PolicyDecision]:
+        """모든 상태(0~3옵션)의 최적 행동을 뒤에서부터 계산"""
+        all_options = self.simulator.SPECIAL_OPTIONS[acc_type] + self.simulator.COMMON_OPTIONS
+        grade_items = list(self.simulator.GRADE_PROBABILITIES.items())
+        max_count = len(self.simulator.ENHANCEMENT_COSTS[grade])
+        policy: Dict[Outcome, PolicyDecision] = {}
+
+        def sell_value(state: Outcome) -> float:
+            evaluation = self.analyzer.evaluate_outcome(acc_type, grade, quality, state)
+            return float(evaluation['expected_price']) if evaluation else 0.0
+
+        def visit(state: Outcome) -> float:
+            if state in policy:
+                return policy[state].value
+
+            sell = sell_value(state)
+            step = len(state)
+            if step >= max_count:
+                policy[state] = PolicyDecision("sell", sell, sell, None)
+                return sell
+
+            used = {name for name, _ in state}
+            available = [opt for opt in all_options if opt not in used]
+            expected_next = 0.0
+            for name in available:
+                for option_grade, prob in grade_items:
+                    expected_next += prob * visit(outcome_key(list(state) + [(name, option_grade)]))
+            enhance = expected_next / len(available) - self.step_cost(grade, step)
+
+            if enhance > sell:
+                policy[state] = PolicyDecision("enhance", enhance, sell, enhance)
+            else:
+                policy[state] = PolicyDecision("sell", sell, sell, enhance)
+            return policy[state].value
+
+        visit(())
+        return policy
+
+    def refresh(self) -> int:
+        """현재 캐시 버전으로 모든 종류/등급/품질의 정책표를 다시 계산 (캐시 재빌드 후 호출)"""
+        start_time = datetime.now()
+        table = {}
+        for acc_type in AccessoryType:
+            for grade in Grade:
+                for quality in self.qualities:
+                    table[(acc_type, grade, quality)] = self.solve(acc_type, grade, quality)
+
+        self.table = table
+        self.table_version = self.analyzer.price_cache.last_update
+        state_count = sum(len(policy) for policy in table.values())
+        print(f"Enhancement policy refreshed: {state_count:,} states "
+              f"({(datetime.now() - start_time).total_seconds():.2f} seconds)")
+        return state_count
+
+    def lookup(self, acc_type: AccessoryType, grade: Grade, quality: int,
+               options: List[Tuple[str, OptionGrade]]) -> Optional[PolicyDecision]:
+        """현재 상태의 최적 행동 조회 (품질은 계산해 둔 품질 중 이하에서 가장 가까운 값)"""
+        if not self.table:
+            return None
+        lower = [q for q in self.qualities if q <= quality]
+        table_quality = lower[-1] if lower else self.qualities[0]
+        policy = self.table.get((acc_type, grade, table_quality))
+        if policy is None:
+            return None
+        return policy.get(outcome_key(options))
+
+def format_state(state: Outcome) -> str:
+    if not state:
+        return "(연마 전)"
+    return ", ".join(f"{name}({option_grade.value})" for name, option_grade in state)
+
+def main():
+    db_manager = DatabaseManager()
+    solver = EnhancementPolicySolver(EnhancementAnalyzer(db_manager))
+    solver.refresh()
+
+    for (acc_type, grade, quality), policy in solver.table.items():
+        root = policy[()]
+        print(f"\n=== {grade.value} {acc_type.value} (품질 {quality}) ===")
+        print(f"연마 전 최적 행동: {root.action} (기대 골드 {root.value:,.0f}, 판매 {root.sell_value:,.0f})")
+
+        # 1연마 상태 중 계속 연마가 이득인 상태만 출력
+        for state, decision in sorted(policy.items(), key=lambda kv: -kv[1].value):
+            if len(state) == 1 and decision.action == "enhance":
+                print(f"  {format_state(state)}: 계속 연마 (기대 {decision.enhance_value:,.0f} > 판매 {decision.sell_value:,.0f})")
+
+if __name__ == "__main__":
+    main()
@@ -1,85 +1,123 @@
 from enhancement_simulator import *
 from market_price_cache import MarketPriceCache
-from item_checker import ItemEvaluator
+from item_evaluator import ItemEvaluator
 from database import DatabaseManager
 from collections import defaultdict
-from typing import Dict, List, Tuple
+from typing import Dict, List, Tuple, Optional
 from datetime import datetime
-import sys, os
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+import sys, os, json, csv, argparse
 import numpy as np
 
+DEFAULT_TRIALS = 1_000_000  # 벡터화 시뮬레이션 기준 시도 횟수
+KEEP_BATCH_RESULTS = 5       # output_dir에 남기는 최근 배치 결과(JSON/CSV 한 세트) 수
+
 class EnhancementStrategyAnalyzer:
-    def __init__(self, db_manager: DatabaseManager, debug: bool = False):
-        self.analyzer = EnhancementAnalyzer(db_manager, debug)
+    def __init__(self, db_manager: DatabaseManager, debug: bool = False,
+                 evaluator: Optional[ItemEvaluator] = None):
+        self.analyzer = EnhancementAnalyzer(db_manager, debug, evaluator=evaluator)
         self.simulator = EnhancementSimulator()
 
     def analyze_single_enhancement_strategy(self, 
                                          acc_type: AccessoryType,
                                          grade: Grade,
                                          quality: int = 90,
-                                         trials: int = 10000) -> Dict:
-        """0->1 연마 전략 분석"""
-        print(f"\n=== {grade.value} {acc_type.value} 0->1 연마 분석 (시도 횟수: {trials:,}) ===")
+                                         trials: int = DEFAULT_TRIALS,
+                                         exact: bool = False) -> Dict:
+        """0->1 연마 전략 분석 (exact=True면 샘플링 없이 정확한 분포로 계산)"""
+        print(f"\n=== {grade.value} {acc_type.value} 0->1 연마 분석 ({self._method_str(trials, exact)}) ===")
         
-        results = self.simulator.run_simulation(
-            acc_type=acc_type,
-            grade=grade,
-            trials=trials,
-            enhancement_count=1
-        )
+        outcomes = self._get_outcomes(acc_type, grade, 1, None, trials, exact)
         
-        return self.analyzer._analyze_patterns(results, acc_type, grade, quality)
+        return self.analyzer._analyze_outcomes(outcomes, acc_type, grade, quality)
 
     def analyze_full_enhancement_strategy(self, 
                                        acc_type: AccessoryType,
                                        grade: Grade,
                                        quality: int = 90,
-                                       trials: int = 10000) -> Dict:
-        """0->3 연마 전략 분석"""
-        print(f"\n=== {grade.value} {acc_type.value} 0->3 연마 분석 (시도 횟수: {trials:,}) ===")
+                                       trials: int = DEFAULT_TRIALS,
+                                       exact: bool = False) -> Dict:
+        """0->3 연마 전략 분석 (exact=True면 샘플링 없이 정확한 분포로 계산)"""
+        print(f"\n=== {grade.value} {acc_type.value} 0->3 연마 분석 ({self._method_str(trials, exact)}) ===")
         
-        results = self.simulator.run_simulation(
-            acc_type=acc_type,
-            grade=grade,
-            trials=trials,
-            enhancement_count=3
-        )
+        outcomes = self._get_outcomes(acc_type, grade, 3, None, trials, exact)
         
-        return self.analyzer._analyze_patterns(results, acc_type, grade, quality)
+        return self.analyzer._analyze_outcomes(outcomes, acc_type, grade, quality)
 
     def analyze_partial_enhancement_strategy(self,
                                           acc_type: AccessoryType,
                                           grade: Grade,
                                           preset_options: List[Tuple[str, OptionGrade]],
                                           quality: int = 90,
-                                          trials: int = 10000) -> Dict:
-        """1->3 연마 전략 분석"""
-        print(f"\n=== {grade.value} {acc_type.value} 1->3 연마 분석 (프리셋: {preset_options}) ===")
+                                          trials: int = DEFAULT_TRIALS,
+                                          exact: bool = False) -> Dict:
+        """1->3 연마 전략 분석 (exact=True면 샘플링 없이 정확한 분포로 계산)"""
+        print(f"\n=== {grade.value} {acc_type.value} 1->3 연마 분석 (프리셋: {preset_options}, {self._method_str(trials, exact)}) ===")
 
-        preset_acc_options = [
-            (AccessoryOption(name, grade), EnhancementCost(0, 0))
-            for name, grade in preset_options
-        ]
+        outcomes = self._get_outcomes(acc_type, grade, 3, preset_options, trials, exact)
 
-        remaining_enhancements = 3 - len(preset_options)
-        results = []
-        
-        for _ in range(trials):
-            trial_result = self.simulator.simulate_enhancement_with_preset(
+        return self.analyzer._analyze_outcomes(outcomes, acc_type, grade, quality)
+
+    def _get_outcomes(self, acc_type: AccessoryType, grade: Grade, enhancement_count: int,
+                      preset_options: Optional[List[Tuple[str, OptionGrade]]], trials: int, exact: bool) -> Dict:
+        """결과별 가중치: exact면 정확한 확률, 아니면 벡터화 시뮬레이션 발생 횟수"""
+        if exact:
+            return self.simulator.enumerate_outcomes(
                 acc_type=acc_type,
                 grade=grade,
-                preset_options=preset_acc_options,
-                remaining_count=remaining_enhancements
+                enhancement_count=enhancement_count,
+                preset_options=preset_options
             )
-            results.append(preset_acc_options + trial_result)
+        return self.simulator.run_vectorized_simulation(
+            acc_type=acc_type,
+            grade=grade,
+            trials=trials,
+            enhancement_count=enhancement_count,
+            preset_options=preset_options
+        )
 
-        return self.analyzer._analyze_patterns(results, acc_type, grade, quality)
+    def _method_str(self, trials: int, exact: bool) -> str:
+        return "정확 계산" if exact else f"시도 횟수: {trials:,}"
     
 class EnhancementAnalyzer:
-    def __init__(self, db_manager: DatabaseManager, debug: bool = False):
+    def __init__(self, db_manager: DatabaseManager, debug: bool = False,
+                 evaluator: Optional[ItemEvaluator] = None):
         self.debug = debug
-        self.price_cache = MarketPriceCache(db_manager, debug=debug)
-        self.evaluator = ItemEvaluator(self.price_cache, debug=debug)
+        # 오케스트레이터처럼 이미 살아있는 평가기가 있으면 그 캐시를 그대로 사용
+        if evaluator is not None:
+            self.evaluator = evaluator
+            self.price_cache = evaluator.price_cache
+        else:
+            self.price_cache = MarketPriceCache(db_manager, debug=debug)
+            self.evaluator = ItemEvaluator(self.price_cache, debug=debug)
+
+        # (악세 종류, 등급, 품질, 정렬된 옵션) -> 평가 결과. 캐시 버전(last_update)이 바뀌면 비움
+        self._evaluation_memo: Dict[tuple, Optional[Dict]] = {}
+        self._memo_version = None
+        self.memo_hits = 0
+        self.memo_misses = 0
+
+    def evaluate_outcome(self, acc_type: AccessoryType, grade: Grade, quality: int,
+                         options: Outcome) -> Optional[Dict]:
+        """강화 결과 하나의 시장 평가 (같은 캐시 버전 안에서는 패턴당 한 번만 평가)"""
+        version = self.price_cache.last_update
+        if version != self._memo_version:
+            self._evaluation_memo.clear()
+            self._memo_version = version
+
+        key = (acc_type, grade, quality, outcome_key(options))
+        if key in self._evaluation_memo:
+            self.memo_hits += 1
+            return self._evaluation_memo[key]
+
+        self.memo_misses += 1
+        trial = [(AccessoryOption(name, option_grade), EnhancementCost(0, 0))
+                 for name, option_grade in key[3]]
+        market_item = self.convert_to_market_item(acc_type, grade, quality, trial)
+        evaluation = self.evaluator.evaluate_item(market_item)
+        self._evaluation_memo[key] = evaluation
+        return evaluation
 
     def _get_option_value(self, option_name: str, option_grade: OptionGrade) -> float:
         """옵션 등급에 따른 수치 반환"""
@@ -156,7 +194,7 @@ class EnhancementAnalyzer:
             for pattern, stats in sorted_patterns:
                 pattern_str = ' + '.join(f"{opt}({grade})" for opt, grade in pattern)
                 print(f"\n패턴: {pattern_str}")
-                print(f"발생 횟수: {stats['count']:,}")
+                print(f"발생 확률: {stats['probability']*100:.3f}%")
                 print(f"평균 가치: {stats['avg_value']:,.0f} 골드")
                 print(f"가치 범위: {stats['min_value']:,.0f} ~ {stats['max_value']:,.0f} 골드")
                 
@@ -188,7 +226,7 @@ class EnhancementAnalyzer:
             for pattern, stats in sorted_patterns:
                 pattern_str = ' + '.join(f"{opt}({grade})" for opt, grade in pattern)
                 print(f"\n패턴: {pattern_str}")
-                print(f"발생 횟수: {stats['count']:,}")
+                print(f"발생 확률: {stats['probability']*100:.3f}%")
                 print(f"평균 가치: {stats['avg_value']:,.0f} 골드")
                 print(f"가치 범위: {stats['min_value']:,.0f} ~ {stats['max_value']:,.0f} 골드")
                 
@@ -220,16 +258,31 @@ class EnhancementAnalyzer:
         
         if total_count > 0:
             avg_value = total_value / total_count
-            print(f"시뮬레이션 횟수: {total_count:,}")
-            print(f"평균 예상 가치: {avg_value:,.0f} 골드")
+            print(f"패턴 포함 비율: {sum(stats['probability'] for stats in results['dealer'].values()) + sum(stats['probability'] for stats in results['support'].values()):.1%}")
+            print(f"평균 예상 가치(특수 옵션 패턴): {avg_value:,.0f} 골드")
+
+        if 'summary' in results:
+            summary = results['summary']
+            print(f"전체 기대 가치: {summary['expected_value']:,.0f} 골드 (표준편차 {summary['std_dev']:,.0f})")
 
     def _analyze_patterns(self, results: List[List[Tuple[AccessoryOption, EnhancementCost]]], 
                          acc_type: AccessoryType,
                          grade: Grade,
                          quality: int) -> Dict:
-        """특수 옵션 위주로 패턴 분석"""
+        """시도 목록(run_simulation 결과)을 결과별 횟수로 묶어서 패턴 분석"""
+        outcomes = defaultdict(int)
+        for trial in results:
+            outcomes[outcome_key([(opt.name, opt.grade) for opt, _ in trial])] += 1
+        return self._analyze_outcomes(outcomes, acc_type, grade, quality)
+
+    def _analyze_outcomes(self, outcomes: Dict[Outcome, float],
+                          acc_type: AccessoryType,
+                          grade: Grade,
+                          quality: int) -> Dict:
+        """특수 옵션 위주로 패턴 분석 (결과별 가중치 사용, 평가는 evaluate_outcome 메모를 거침)"""
         dealer_stats = defaultdict(lambda: {
             'values': [],
+            'weights': [],
             'min_item': None,
             'max_item': None,
             'min_value': float('inf'),
@@ -237,13 +290,20 @@ class EnhancementAnalyzer:
         })
         support_stats = defaultdict(lambda: {
             'values': [],
+            'weights': [],
             'min_item': None,
             'max_item': None,
             'min_value': float('inf'),
             'max_value': -float('inf')
         })
+        total_weight = sum(outcomes.values())
+        all_values = []
+        all_weights = []
         
-        for trial in results:
+        for options, weight in outcomes.items():
+            trial = [(AccessoryOption(name, option_grade), EnhancementCost(0, 0))
+                     for name, option_grade in options]
+
             # 특수 옵션만 추출
             special_options = [
                 (opt.name, opt.grade.value)
@@ -251,9 +311,8 @@ class EnhancementAnalyzer:
                 if self._is_special_option(opt.name, acc_type)
             ]
             
-            # 시장 가격 평가 위한 아이템 생성
-            market_item = self.convert_to_market_item(acc_type, grade, quality, trial)
-            evaluation = self.evaluator.evaluate_item(market_item)
+            # 시장 가격 평가 (메모 공유)
+            evaluation = self.evaluate_outcome(acc_type, grade, quality, options)
             if not evaluation:
                 continue
                 
@@ -265,61 +324,66 @@ class EnhancementAnalyzer:
             
             pattern_key = tuple(sorted(special_options))
             expected_price = evaluation['expected_price']
+            all_values.append(expected_price)
+            all_weights.append(weight)
             
             # 딜러/서포터 구분하여 통계 저장
             if self._is_dealer_pattern(special_options, acc_type):
                 stats = dealer_stats[pattern_key]
-                stats['values'].append(expected_price)
-                
-                if expected_price < stats['min_value']:
-                    stats['min_value'] = expected_price
-                    stats['min_item'] = {
-                        'options': all_options,
-                        'details': evaluation
-                    }
-                
-                if expected_price > stats['max_value']:
-                    stats['max_value'] = expected_price
-                    stats['max_item'] = {
-                        'options': all_options,
-                        'details': evaluation
-                    }
-                    
             elif self._is_support_pattern(special_options, acc_type):
                 stats = support_stats[pattern_key]
-                stats['values'].append(expected_price)
-                
-                if expected_price < stats['min_value']:
-                    stats['min_value'] = expected_price
-                    stats['min_item'] = {
-                        'options': all_options,
-                        'details': evaluation
-                    }
-                
-                if expected_price > stats['max_value']:
-                    stats['max_value'] = expected_price
-                    stats['max_item'] = {
-                        'options': all_options,
-                        'details': evaluation
-                    }
+            else:
+                continue
+
+            stats['values'].append(expected_price)
+            stats['weights'].append(weight)
+            
+            if expected_price < stats['min_value']:
+                stats['min_value'] = expected_price
+                stats['min_item'] = {
+                    'options': all_options,
+                    'details': evaluation
+                }
+            
+            if expected_price > stats['max_value']:
+                stats['max_value'] = expected_price
+                stats['max_item'] = {
+                    'options': all_options,
+                    'details': evaluation
+                }
 
         return {
-            'dealer': self._calculate_pattern_stats(dealer_stats),
-            'support': self._calculate_pattern_stats(support_stats)
+            'dealer': self._calculate_pattern_stats(dealer_stats, total_weight),
+            'support': self._calculate_pattern_stats(support_stats, total_weight),
+            'summary': self._calculate_summary(all_values, all_weights)
         }
 
-    def _calculate_pattern_stats(self, pattern_stats: Dict[tuple, dict]) -> Dict[tuple, dict]:
-        """패턴별 통계 계산"""
+    def _calculate_summary(self, values: List[float], weights: List[float]) -> Dict:
+        """평가된 모든 결과의 기대값/분산 (가중치가 정확한 확률이면 정확한 값)"""
+        if not values:
+            return {'expected_value': 0.0, 'variance': 0.0, 'std_dev': 0.0}
+        values = np.array(values, dtype=np.float64)
+        weights = np.array(weights, dtype=np.float64)
+        expected_value = float(np.average(values, weights=weights))
+        variance = float(np.average((values - expected_value) ** 2, weights=weights))
+        return {'expected_value': expected_value, 'variance': variance, 'std_dev': float(np.sqrt(variance))}
+
+    def _calculate_pattern_stats(self, pattern_stats: Dict[tuple, dict], total_weight: float) -> Dict[tuple, dict]:
+        """패턴별 통계 계산 (가중 평균/표준편차)"""
         results = {}
         for pattern, stats in pattern_stats.items():
             if stats['values']:
-                values = stats['values']
+                values = np.array(stats['values'], dtype=np.float64)
+                weights = np.array(stats['weights'], dtype=np.float64)
+                avg_value = float(np.average(values, weights=weights))
+                count = weights.sum()
                 results[pattern] = {
-                    'count': len(values),
-                    'avg_value': sum(values) / len(values),
+                    'count': int(count) if float(count).is_integer() else float(count),
+                    'probability': float(count / total_weight) if total_weight else 0.0,
+                    'avg_value': avg_value,
                     'min_value': stats['min_value'],
                     'max_value': stats['max_value'],
-                    'std_dev': np.std(values) if len(values) > 1 else 0,
+                    'std_dev': float(np.sqrt(np.average((values - avg_value) ** 2, weights=weights))) if count > 1 else 0,
                     'min_item': stats['min_item'],
                     'max_item': stats['max_item']
                 }
@@ -355,49 +419,193 @@ class EnhancementAnalyzer:
                 ]
             }
 
+# 분석 케이스: [0->1, 0->3, 1->3] x (악세 종류, 등급, 프리셋, 설명)
+TEST_CASES = [
+    # 0->1 연마 분석 케이스
+    [(AccessoryType.NECKLACE, Grade.ANCIENT, None, "고대 목걸이 (0->1)"),
+     (AccessoryType.EARRING, Grade.ANCIENT, None, "고대 귀걸이 (0->1)"),
+     (AccessoryType.RING, Grade.ANCIENT, None, "고대 반지 (0->1)"),
+     (AccessoryType.NECKLACE, Grade.RELIC, None, "유물 목걸이 (0->1)"),
+     (AccessoryType.EARRING, Grade.RELIC, None, "유물 귀걸이 (0->1)"),
+     (AccessoryType.RING, Grade.RELIC, None, "유물 반지 (0->1)")],
+     
+    # 0->3 연마 분석 케이스
+    [(AccessoryType.NECKLACE, Grade.ANCIENT, None, "고대 목걸이 (0->3)"),
+     (AccessoryType.EARRING, Grade.ANCIENT, None, "고대 귀걸이 (0->3)"),
+     (AccessoryType.RING, Grade.ANCIENT, None, "고대 반지 (0->3)"),
+     (AccessoryType.NECKLACE, Grade.RELIC, None, "유물 목걸이 (0->3)"),
+     (AccessoryType.EARRING, Grade.RELIC, None, "유물 귀걸이 (0->3)"),
+     (AccessoryType.RING, Grade.RELIC, None, "유물 반지 (0->3)")],
+     
+    # 1->3 연마 분석 케이스 (프리셋 필요)
+    [(AccessoryType.NECKLACE, Grade.ANCIENT, [("추피", OptionGrade.LOW)], "고대 목걸이 (1->3)"),
+     (AccessoryType.EARRING, Grade.ANCIENT, [("공퍼", OptionGrade.LOW)], "고대 귀걸이 (1->3)"),
+     (AccessoryType.RING, Grade.ANCIENT, [("치적", OptionGrade.LOW)], "고대 반지 (1->3)"),
+     (AccessoryType.NECKLACE, Grade.RELIC, [("추피", OptionGrade.LOW)], "유물 목걸이 (1->3)"),
+     (AccessoryType.EARRING, Grade.RELIC, [("공퍼", OptionGrade.LOW)], "유물 귀걸이 (1->3)"),
+     (AccessoryType.RING, Grade.RELIC, [("치적", OptionGrade.LOW)], "유물 반지 (1->3)")]
+]
+ENHANCEMENT_TYPES = ["0to1", "0to3", "1to3"]
+
+def run_case(analyzer: EnhancementStrategyAnalyzer, category: int, acc_type: AccessoryType, grade: Grade,
+             preset: Optional[List[Tuple[str, OptionGrade]]], quality: int = 90,
+             trials: int = DEFAULT_TRIALS, exact: bool = True) -> Dict:
+    """케이스 분류(0: 0->1, 1: 0->3, 2: 1->3)에 맞는 분석 실행"""
+    if category == 0:
+        return analyzer.analyze_single_enhancement_strategy(
+            acc_type=acc_type, grade=grade, quality=quality, trials=trials, exact=exact)
+    if category == 1:
+        return analyzer.analyze_full_enhancement_strategy(
+            acc_type=acc_type, grade=grade, quality=quality, trials=trials, exact=exact)
+    return analyzer.analyze_partial_enhancement_strategy(
+        acc_type=acc_type, grade=grade, preset_options=preset, quality=quality, trials=trials, exact=exact)
+
+# -----------------------------
+# 배치 분석 (비대화형, 프로세스 풀)
+# -----------------------------
+
+_batch_analyzer: Optional[EnhancementStrategyAnalyzer] = None
+
+def _init_batch_worker(cache: Dict, last_update: Optional[datetime]):
+    """워커마다 한 번: 부모가 넘긴 캐시 스냅샷으로 평가기 구성 (DB/캐시 파일 접근 없음)"""
+    global _batch_analyzer
+    price_cache = MarketPriceCache.from_snapshot(cache, last_update)
+    evaluator = ItemEvaluator(price_cache, watch_cache_file=False)
+    _batch_analyzer = EnhancementStrategyAnalyzer(None, evaluator=evaluator)
+
+def _pattern_rows(patterns: Dict[tuple, dict]) -> List[Dict]:
+    return [
+        {
+            "pattern": " + ".join(f"{opt}({option_grade})" for opt, option_grade in pattern),
+            "probability": stats["probability"],
+            "avg_value": stats["avg_value"],
+            "min_value": stats["min_value"],
+            "max_value": stats["max_value"],
+            "std_dev": stats["std_dev"],
+        }
+        for pattern, stats in sorted(patterns.items(), key=lambda kv: kv[1]["avg_value"], reverse=True)
+    ]
+
+def _run_batch_case(category: int, item_idx: int, quality: int, trials: int, exact: bool) -> Dict:
+    """워커에서 케이스 하나 분석 후 JSON으로 옮길 수 있는 형태로 반환"""
+    acc_type, grade, preset, desc = TEST_CASES[category][item_idx]
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        original_stdout = sys.stdout
+        sys.stdout = devnull
+        try:
+            results = run_case(_batch_analyzer, category, acc_type, grade, preset, quality, trials, exact)
+        finally:
+            sys.stdout = original_stdout
+
+    return {
+        "case": desc,
+        "enhancement_type": ENHANCEMENT_TYPES[category],
+        "grade": grade.value,
+        "part": acc_type.value,
+        "preset": [f"{name}({option_grade.value})" for name, option_grade in preset or []],
+        "quality": quality,
+        "summary": results["summary"],
+        "dealer": _pattern_rows(results["dealer"]),
+        "support": _pattern_rows(results["support"]),
+    }
+
+def run_batch_analysis(price_cache: MarketPriceCache, quality: int = 90, trials: int = DEFAULT_TRIALS,
+                       exact: bool = True, max_workers: Optional[int] = None,
+                       output_dir: str = "enhancement_results") -> Tuple[str, str]:
+    """
+    모든 등급 x 부위 x 시작 상태 케이스를 프로세스 풀에서 분석하고 JSON/CSV 한 세트로 저장
+    - 캐시는 부모가 로드한 것 하나를 initializer로 워커에 한 번씩만 넘김
+    - 저장 후 최근 KEEP_BATCH_RESULTS개 세트만 남기고 이전 결과 삭제
+    - 반환값: (JSON 경로, CSV 경로)
+    """
+    start_time = datetime.now()
+    cases = [(category, item_idx) for category in range(len(TEST_CASES)) for item_idx in range(len(TEST_CASES[category]))]
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp.get_context("spawn"),
+                             initializer=_init_batch_worker,
+                             initargs=(price_cache.cache, price_cache.last_update)) as executor:
+        results = list(executor.map(_run_batch_case, *zip(*cases),
+                                    [quality] * len(cases), [trials] * len(cases), [exact] * len(cases)))
+
+    os.makedirs(output_dir, exist_ok=True)
+    timestamp = start_time.strftime("%Y%m%d_%H%M%S")
+    json_path = os.path.join(output_dir, f"enhancement_batch_{timestamp}.json")
+    csv_path = os.path.join(output_dir, f"enhancement_batch_{timestamp}.csv")
+
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "generated_at": start_time.isoformat(),
+            "cache_last_update": price_cache.last_update.isoformat() if price_cache.last_update else None,
+            "method": "exact" if exact else f"monte_carlo({trials})",
+            "quality": quality,
+            "cases": results,
+        }, f, ensure_ascii=False, indent=2)
+
+    # CSV: 케이스별 전체 기대값 한 줄 + 패턴별 한 줄
+    with open(csv_path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["case", "enhancement_type", "grade", "part", "preset", "quality", "role",
+                         "pattern", "probability", "avg_value", "min_value", "max_value", "std_dev"])
+        for result in results:
+            base = [result["case"], result["enhancement_type"], result["grade"], result["part"],
+                    " + ".join(result["preset"]), result["quality"]]
+            summary = result["summary"]
+            writer.writerow(base + ["all", "", 1.0, summary["expected_value"], "", "", summary["std_dev"]])
+            for role in ("dealer", "support"):
+                for row in result[role]:
+                    writer.writerow(base + [role, row["pattern"], row["probability"], row["avg_value"],
+                                            row["min_value"], row["max_value"], row["std_dev"]])
+
+    _prune_batch_results(output_dir)
+    print(f"Enhancement batch analysis saved: {json_path}, {csv_path} "
+          f"({len(results)} cases, {(datetime.now() - start_time).total_seconds():.2f} seconds)")
+    return json_path, csv_path
+
+def _prune_batch_results(output_dir: str, keep: int = KEEP_BATCH_RESULTS):
+    """enhancement_batch_{timestamp}.json/.csv 중 최근 keep개 세트만 남김 (이름의 timestamp 순)"""
+    stamps = sorted({os.path.splitext(name)[0] for name in os.listdir(output_dir)
+                     if name.startswith("enhancement_batch_") and name.endswith((".json", ".csv"))})
+    for stamp in stamps[:-keep]:
+        for extension in (".json", ".csv"):
+            path = os.path.join(output_dir, stamp + extension)
+            if os.path.exists(path):
+                os.remove(path)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="연마 전략 분석기")
+    parser.add_argument("--batch", action="store_true", help="메뉴 없이 모든 케이스를 분석해서 JSON/CSV로 저장")
+    parser.add_argument("--quality", type=int, default=90)
+    parser.add_argument("--sample", action="store_true", help="정확 계산 대신 벡터화 시뮬레이션 사용")
+    parser.add_argument("--trials", type=int, default=DEFAULT_TRIALS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output-dir", default="enhancement_results")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     db_manager = DatabaseManager()
+
+    if args.batch:
+        run_batch_analysis(MarketPriceCache(db_manager), quality=args.quality, trials=args.trials,
+                           exact=not args.sample, max_workers=args.workers, output_dir=args.output_dir)
+        return
+
     analyzer = EnhancementStrategyAnalyzer(db_manager, debug=False)
 
-    test_cases = [
-        # 0->1 연마 분석 케이스
-        [(AccessoryType.NECKLACE, Grade.ANCIENT, None, "고대 목걸이 (0->1)"),
-         (AccessoryType.EARRING, Grade.ANCIENT, None, "고대 귀걸이 (0->1)"),
-         (AccessoryType.RING, Grade.ANCIENT, None, "고대 반지 (0->1)"),
-         (AccessoryType.NECKLACE, Grade.RELIC, None, "유물 목걸이 (0->1)"),
-         (AccessoryType.EARRING, Grade.RELIC, None, "유물 귀걸이 (0->1)"),
-         (AccessoryType.RING, Grade.RELIC, None, "유물 반지 (0->1)")],
-         
-        # 0->3 연마 분석 케이스
-        [(AccessoryType.NECKLACE, Grade.ANCIENT, None, "고대 목걸이 (0->3)"),
-         (AccessoryType.EARRING, Grade.ANCIENT, None, "고대 귀걸이 (0->3)"),
-         (AccessoryType.RING, Grade.ANCIENT, None, "고대 반지 (0->3)"),
-         (AccessoryType.NECKLACE, Grade.RELIC, None, "유물 목걸이 (0->3)"),
-         (AccessoryType.EARRING, Grade.RELIC, None, "유물 귀걸이 (0->3)"),
-         (AccessoryType.RING, Grade.RELIC, None, "유물 반지 (0->3)")],
-         
-        # 1->3 연마 분석 케이스 (프리셋 필요)
-        [(AccessoryType.NECKLACE, Grade.ANCIENT, [("추피", OptionGrade.LOW)], "고대 목걸이 (1->3)"),
-         (AccessoryType.EARRING, Grade.ANCIENT, [("공퍼", OptionGrade.LOW)], "고대 귀걸이 (1->3)"),
-         (AccessoryType.RING, Grade.ANCIENT, [("치적", OptionGrade.LOW)], "고대 반지 (1->3)"),
-         (AccessoryType.NECKLACE, Grade.RELIC, [("추피", OptionGrade.LOW)], "유물 목걸이 (1->3)"),
-         (AccessoryType.EARRING, Grade.RELIC, [("공퍼", OptionGrade.LOW)], "유물 귀걸이 (1->3)"),
-         (AccessoryType.RING, Grade.RELIC, [("치적", OptionGrade.LOW)], "유물 반지 (1->3)")]
-    ]
 
     while True:
         print("\n=== 연마 전략 분석기 ===")
         print("\n[0->1 연마 분석]")
         for i in range(6):
-            print(f"{i+1}. {test_cases[0][i][3]}")
+            print(f"{i+1}. {TEST_CASES[0][i][3]}")
             
         print("\n[0->3 연마 분석]")
         for i in range(6):
-            print(f"{i+7}. {test_cases[1][i][3]}")
+            print(f"{i+7}. {TEST_CASES[1][i][3]}")
             
         print("\n[1->3 연마 분석]")
         for i in range(6):
-            print(f"{i+13}. {test_cases[2][i][3]}")
+            print(f"{i+13}. {TEST_CASES[2][i][3]}")
             
         print("\n19. 종료")
 
@@ -411,41 +619,20 @@ def main():
             item_idx = idx % 6
             
             if 0 <= idx < 18:
-                acc_type, grade, preset, desc = test_cases[category][item_idx]
+                acc_type, grade, preset, desc = TEST_CASES[category][item_idx]
                 
                 print(f"\n{desc} 분석을 시작합니다...")
-                print("(기본 품질 90, 시뮬레이션 10000회 기준)")
+                print(f"(품질 {args.quality}, 정확한 확률 분포 기준)")
                 
-                # 분석 방법 선택
-                if category == 0:  # 0->1 연마
-                    results = analyzer.analyze_single_enhancement_strategy(
-                        acc_type=acc_type,
-                        grade=grade,
-                        quality=90,
-                        trials=10000
-                    )
-                elif category == 1:  # 0->3 연마
-                    results = analyzer.analyze_full_enhancement_strategy(
-                        acc_type=acc_type,
-                        grade=grade,
-                        quality=90,
-                        trials=10000
-                    )
-                else:  # 1->3 연마
-                    results = analyzer.analyze_partial_enhancement_strategy(
-                        acc_type=acc_type,
-                        grade=grade,
-                        preset_options=preset,
-                        quality=90,
-                        trials=10000
-                    )
+                # 분류에 맞는 분석 실행
+                results = run_case(analyzer, category, acc_type, grade, preset, quality=args.quality, exact=True)
 
                 # 결과 출력
-                analyzer.print_analysis_results(results)
+                analyzer.analyzer.print_analysis_results(results)
 
                 # 파일로 저장
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                enhancement_type = ["0to1", "0to3", "1to3"][category]
+                enhancement_type = ENHANCEMENT_TYPES[category]
                 filename = f"enhancement_analysis_{enhancement_type}_{grade.value}_{acc_type.value}_{timestamp}.txt"
 
                 with open(filename, 'w', encoding='utf-8') as f:
@@ -454,8 +641,8 @@ def main():
 
                     print(f"\n=== {desc} 분석 결과 ===")
                     print(f"분석 시간: {datetime.now()}")
-                    print(f"시뮬레이션 횟수: 10,000")
-                    analyzer.print_analysis_results(results)
+                    print("계산 방식: 정확한 확률 분포")
+                    analyzer.analyzer.print_analysis_results(results)
 
                     sys.stdout = original_stdout
 
@@ -466,7 +653,7 @@ def main():
 
         except Exception as e:
             print(f"분석 중 오류 발생: {e}")
-            if analyzer.debug:
+            if analyzer.analyzer.debug:
                 import traceback
                 traceback.print_exc()
 
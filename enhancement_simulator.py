@@ -1,4 +1,7 @@
 import random
+import math
+import numpy as np
+from itertools import combinations, product
 from dataclasses import dataclass
 from typing import List, Dict, Tuple, Optional
 from enum import Enum
@@ -30,7 +33,16 @@ class AccessoryOption:
     def __str__(self) -> str:
         return f"{self.name}({self.grade.value if self.grade else 'None'})"
 
+# 연마 결과 하나: (옵션 이름, 옵션 등급)을 정렬한 튜플 (순서는 가격에 영향 없음)
+Outcome = Tuple[Tuple[str, OptionGrade], ...]
+
+def outcome_key(options: List[Tuple[str, OptionGrade]]) -> Outcome:
+    """옵션 목록을 순서와 무관한 결과 키로 변환"""
+    return tuple(sorted(options, key=lambda opt: (opt[0], opt[1].value)))
+
 class EnhancementSimulator:
+    VECTOR_CHUNK_SIZE = 1_000_000  # 한 번에 배열로 만드는 시도 수 (메모리 제한용)
+
     def __init__(self):
         # 각 부위별 특수 옵션
         self.SPECIAL_OPTIONS = {
@@ -151,6 +163,117 @@ class EnhancementSimulator:
 
         return results
 
+    def enumerate_outcomes(self,
+                           acc_type: AccessoryType,
+                           grade: Grade,
+                           enhancement_count: int = 3,
+                           preset_options: Optional[List[Tuple[str, OptionGrade]]] = None) -> Dict[Outcome, float]:
+        """
+        샘플링 없이 모든 결과의 정확한 확률을 계산
+        - 남은 옵션 n개 중 k개를 순서대로 중복 없이 뽑으면 각 조합의 확률은 1/C(n, k)
+        - 등급은 옵션마다 독립이므로 조합 확률 x 등급 확률의 곱
+        - preset_options가 있으면 그 옵션으로 시작 (simulate_enhancement_with_preset과 동일)
+        """
+        preset_options = preset_options or []
+        remaining_count = enhancement_count - len(preset_options)
+        if enhancement_count > 3:
+            raise ValueError("Maximum enhancement count is 3")
+        if remaining_count < 0:
+            raise ValueError("Preset has more options than enhancement count")
+
+        preset_outcome = [(name, option_grade) for name, option_grade in preset_options]
+        if remaining_count == 0:
+            return {outcome_key(preset_outcome): 1.0}
+
+        available_options = [
+            opt for opt in self.SPECIAL_OPTIONS[acc_type] + self.COMMON_OPTIONS
+            if opt not in {name for name, _ in preset_options}
+        ]
+        if len(available_options) < remaining_count:
+            raise ValueError("No available options for enhancement")
+
+        subset_prob = 1.0 / math.comb(len(available_options), remaining_count)
+        grade_items = list(self.GRADE_PROBABILITIES.items())
+
+        distribution = {}
+        for subset in combinations(available_options, remaining_count):
+            for grades in product(grade_items, repeat=remaining_count):
+                prob = subset_prob
+                options = list(preset_outcome)
+                for name, (option_grade, grade_prob) in zip(subset, grades):
+                    prob *= grade_prob
+                    options.append((name, option_grade))
+                distribution[outcome_key(options)] = prob
+        return distribution
+
+    def run_vectorized_simulation(self,
+                                  acc_type: AccessoryType,
+                                  grade: Grade,
+                                  trials: int = 1_000_000,
+                                  enhancement_count: int = 3,
+                                  preset_options: Optional[List[Tuple[str, OptionGrade]]] = None,
+                                  seed: Optional[int] = None) -> Dict[Outcome, int]:
+        """
+        NumPy로 여러 시도를 한 번에 샘플링해서 결과별 발생 횟수를 반환
+        - enhance_once와 같은 규칙: 남은 옵션 중 중복 없이 균등하게 뽑고, 등급은 GRADE_PROBABILITIES로 독립 추첨
+        - preset_options가 있으면 그 옵션으로 시작해서 남은 횟수만 연마 (simulate_enhancement_with_preset과 동일)
+        """
+        preset_options = preset_options or []
+        remaining_count = enhancement_count - len(preset_options)
+        if enhancement_count > 3:
+            raise ValueError("Maximum enhancement count is 3")
+        if remaining_count < 0:
+            raise ValueError("Preset has more options than enhancement count")
+
+        preset_outcome = [(name, option_grade) for name, option_grade in preset_options]
+        if remaining_count == 0:
+            return {outcome_key(preset_outcome): trials}
+
+        available_options = [
+            opt for opt in self.SPECIAL_OPTIONS[acc_type] + self.COMMON_OPTIONS
+            if opt not in {name for name, _ in preset_options}
+        ]
+        if len(available_options) < remaining_count:
+            raise ValueError("No available options for enhancement")
+
+        option_grades = list(self.GRADE_PROBABILITIES.keys())
+        grade_probs = np.array(list(self.GRADE_PROBABILITIES.values()), dtype=np.float64)
+        grade_probs /= grade_probs.sum()
+
+        rng = np.random.default_rng(seed)
+        n_options = len(available_options)
+        n_grades = len(option_grades)
+        base = n_options * n_grades  # (옵션, 등급) 한 쌍을 0 ~ base-1 코드로
+        place = base ** np.arange(remaining_count, dtype=np.int64)
+
+        counts = {}
+        done = 0
+        while done < trials:
+            size = min(self.VECTOR_CHUNK_SIZE, trials - done)
+
+            # 랜덤 키의 하위 k개 = 중복 없는 균등 추첨 (순서는 결과에 영향 없으므로 argpartition으로 충분)
+            keys = rng.random((size, n_options))
+            picks = np.argpartition(keys, remaining_count - 1, axis=1)[:, :remaining_count]
+            grades = rng.choice(n_grades, size=(size, remaining_count), p=grade_probs)
+
+            # 시도별 (옵션, 등급) 코드를 정렬해서 하나의 정수로 묶은 뒤 개수 집계
+            codes = np.sort(picks * n_grades + grades, axis=1)
+            encoded = codes @ place
+            unique_codes, unique_counts = np.unique(encoded, return_counts=True)
+            for code, count in zip(unique_codes.tolist(), unique_counts.tolist()):
+                counts[code] = counts.get(code, 0) + count
+            done += size
+
+        histogram = {}
+        for code, count in counts.items():
+            options = list(preset_outcome)
+            for _ in range(remaining_count):
+                code, pair = divmod(code, base)
+                option_idx, grade_idx = divmod(pair, n_grades)
+                options.append((available_options[option_idx], option_grades[grade_idx]))
+            histogram[outcome_key(options)] = count
+        return histogram
+
     def run_simulation(self, 
                       acc_type: AccessoryType,
                       grade: Grade,
@@ -0,0 +1,205 @@
+import argparse
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy.orm import selectinload
+from database import *
+from listing import BraceletListing
+from market_price_cache import (MarketPriceCache, PriceRecordRow, RawOptionRow, BRACELET_FLAT_COLUMNS,
+                                accessory_group_keys)
+from collection_planner import KeyedPriceFloor, ITEMS_PER_PAGE, bracelet_floor_key
+
+"""
+최저가 기준 페이징 비교 리포트 (python floor_paging_report.py [--cycle 20250101_0200])
+- 요청 수: collection_cycles에 기록된 전체 수집 사이클과 최저가 기준 사이클의 평균 비교
+- 캐시 품질: 전체 수집 사이클 하나의 매물을 기본 프리셋(악세 등급/부위/연마, 팔찌 등급/고정/부여 수량)별로
+  가격 순 페이지로 다시 나눠 수집기와 같은 종료 규칙(KeyedPriceFloor)을 적용 -> 남는 매물과 전체 매물로
+  실제 캐시 계산을 돌려서 비교
+  * 악세: _calculate_group_prices의 base_price, sample_count, common_option_values
+  * 팔찌: _bracelet_second_prices의 패턴별 가격 (두 번째 최저가)
+  * 저장된 매물만 있어서 페이지 마지막 가격은 저장된 매물 기준 (수집기보다 조금 늦게 끊음)
+"""
+
+MAX_DIFF_LINES = 5   # 다른 키를 몇 개까지 출력할지
+
+def replay_floor(rows: Sequence, price: Callable, add: Callable) -> int:
+    """
+    가격 순으로 정렬된 매물에 종료 규칙 적용 (add(floor, row): 매물 하나를 KeyedPriceFloor에 반영)
+    반환값: 최저가 기준 수집이 가져왔을 매물 수
+    """
+    floor = KeyedPriceFloor()
+    for start in range(0, len(rows), ITEMS_PER_PAGE):
+        page = rows[start:start + ITEMS_PER_PAGE]
+        for row in page:
+            add(floor, row)
+        if floor.passed(price(page[-1])):
+            return start + len(page)
+    return len(rows)
+
+def truncate_segments(segments: Dict[tuple, list], price: Callable, add: Callable) -> Tuple[list, int, int]:
+    """구간마다 가격 순(같은 가격은 id 순)으로 정렬해 종료 규칙으로 자름. 반환값: (남는 매물, 전체 페이지 수, 남는 페이지 수)"""
+    kept = []
+    pages = floor_pages = 0
+    for rows in segments.values():
+        rows.sort(key=price)
+        count = replay_floor(rows, price, add)
+        kept.extend(rows[:count])
+        pages += -(-len(rows) // ITEMS_PER_PAGE)
+        floor_pages += -(-count // ITEMS_PER_PAGE)
+    return kept, pages, floor_pages
+
+def compare_prices(full: Dict, truncated: Dict) -> Dict[str, object]:
+    """키별 캐시 결과 비교 (전체 수집에서 가격이 나온 키 기준)"""
+    same = [key for key, value in full.items() if truncated.get(key) == value]
+    return {
+        "keys": len(full),
+        "keys_kept": sum(1 for key in full if truncated.get(key) is not None),
+        "same": len(same),
+        "diff": [(key, full[key], truncated.get(key)) for key in full if truncated.get(key) != full[key]],
+    }
+
+def _add_accessory(floor: KeyedPriceFloor, row: PriceRecordRow):
+    floor.add_accessory(row.grade, row.part, row.level, row.price,
+                        [(option.option_name, option.option_value) for option in row.raw_options], row.option_names)
+
+def load_accessory_rows(db_manager: DatabaseManager, cycle_id: str) -> List[PriceRecordRow]:
+    """사이클의 악세 매물 -> 캐시 계산용 스냅샷 행 (id 순)"""
+    with db_manager.get_read_session() as session:
+        records = session.query(PriceRecord).options(
+            selectinload(PriceRecord.raw_options), selectinload(PriceRecord.options)
+        ).filter(PriceRecord.search_cycle_id == cycle_id).order_by(PriceRecord.id).all()
+        return [
+            PriceRecordRow(record.id, record.timestamp, record.grade, record.name, record.part, record.level,
+                           record.quality, record.trade_count, record.price,
+                           tuple(RawOptionRow(opt.option_name, opt.option_value, opt.is_percentage)
+                                 for opt in record.raw_options),
+                           frozenset(opt.option_name for opt in record.options))
+            for record in records
+        ]
+
+def accessory_prices(price_cache: MarketPriceCache, rows: List[PriceRecordRow]) -> Dict[tuple, tuple]:
+    """악세 그룹별 캐시 계산 -> {(역할, 키): (base_price, sample_count, common_option_values)}"""
+    groups = defaultdict(list)
+    for row in sorted(rows, key=lambda row: row.id):
+        keys = accessory_group_keys(row.grade, row.part, row.level,
+                                    [(option.option_name, option.option_value) for option in row.raw_options])
+        for role, key in zip(("dealer", "support"), keys):
+            groups[(role, key)].append(row)
+
+    prices = {}
+    for (role, key), items in groups.items():
+        if len(items) < 3:
+            continue
+        price_data = price_cache._calculate_group_prices(items, key, role)
+        if price_data:
+            prices[(role, key)] = (int(price_data['base_price']), price_data['sample_count'],
+                                   price_data['common_option_values'])
+    return prices
+
+def compare_accessories(db_manager: DatabaseManager, cycle_id: str) -> Optional[Dict[str, object]]:
+    rows = load_accessory_rows(db_manager, cycle_id)
+    if not rows:
+        return None
+    segments = defaultdict(list)
+    for row in rows:
+        segments[(row.grade, row.part, row.level)].append(row)
+    kept, pages, floor_pages = truncate_segments(segments, lambda row: row.price, _add_accessory)
+
+    price_cache = MarketPriceCache.from_snapshot({}, None)
+    result = compare_prices(accessory_prices(price_cache, rows), accessory_prices(price_cache, kept))
+    result.update(pages=pages, floor_pages=floor_pages)
+    return result
+
+def load_bracelet_rows(db_manager: DatabaseManager, cycle_id: str) -> Dict[tuple, List[Tuple[tuple, tuple]]]:
+    """사이클의 팔찌 매물 -> {(등급, 고정, 부여): [(BRACELET_FLAT_COLUMNS 값, 종료 규칙 키)]}"""
+    segments = defaultdict(list)
+    with db_manager.get_read_session() as session:
+        rows = session.query(BraceletFlatRecord).filter(
+            BraceletFlatRecord.search_cycle_id == cycle_id).order_by(BraceletFlatRecord.id).all()
+        for row in rows:
+            values = tuple(getattr(row, column) for column in BRACELET_FLAT_COLUMNS)
+            segments[(row.grade, row.fixed_option_count, row.extra_option_count)].append(
+                (values, bracelet_floor_key(BraceletListing.from_flat(row))))
+    return segments
+
+def bracelet_prices(price_cache: MarketPriceCache, rows: List[tuple]) -> Dict[tuple, int]:
+    """등급별 팔찌 캐시 계산 -> {(등급, 패턴 타입, 패턴 키): 가격}"""
+    grade_index = BRACELET_FLAT_COLUMNS.index("grade")
+    by_grade = defaultdict(list)
+    for values in rows:
+        by_grade[values[grade_index]].append(values)
+
+    prices = {}
+    for grade, grade_rows in by_grade.items():
+        classified = price_cache._classify_bracelet_batch(price_cache._bracelet_arrays(grade_rows))
+        selected = np.ones(len(grade_rows), dtype=bool)
+        for pattern_type, patterns in price_cache._bracelet_second_prices(classified, selected).items():
+            for key, price in patterns.items():
+                prices[(grade, pattern_type) + key] = price
+    return prices
+
+def compare_bracelets(db_manager: DatabaseManager, cycle_id: str) -> Optional[Dict[str, object]]:
+    segments = load_bracelet_rows(db_manager, cycle_id)
+    if not segments:
+        return None
+    price_index = BRACELET_FLAT_COLUMNS.index("price")
+    full = [values for rows in segments.values() for values, _ in rows]
+    kept, pages, floor_pages = truncate_segments(
+        segments, lambda row: row[0][price_index],
+        lambda floor, row: floor.add_bracelet(row[1], row[0][price_index]))
+
+    price_cache = MarketPriceCache.from_snapshot({}, None)
+    result = compare_prices(bracelet_prices(price_cache, full),
+                            bracelet_prices(price_cache, [values for values, _ in kept]))
+    result.update(pages=pages, floor_pages=floor_pages)
+    return result
+
+def request_summary(db_manager: DatabaseManager) -> Dict[bool, Tuple[int, float]]:
+    """{전체 수집 여부: (사이클 수, 평균 요청 수)}"""
+    summary = {}
+    with db_manager.get_read_session() as session:
+        for full_sweep in (True, False):
+            requests = [row.requests for row in session.query(CollectionCycle).filter(
+                CollectionCycle.full_sweep == full_sweep)]
+            if requests:
+                summary[full_sweep] = (len(requests), sum(requests) / len(requests))
+    return summary
+
+def latest_full_sweep(db_manager: DatabaseManager) -> Optional[str]:
+    with db_manager.get_read_session() as session:
+        row = session.query(CollectionCycle).filter(CollectionCycle.full_sweep.is_(True)).order_by(
+            CollectionCycle.started_at.desc()).first()
+        return row.search_cycle_id if row else None
+
+def print_report(db_manager: DatabaseManager, cycle_id: Optional[str] = None):
+    summary = request_summary(db_manager)
+    for full_sweep, label in ((True, "전체 수집"), (False, "최저가 기준")):
+        if full_sweep in summary:
+            count, average = summary[full_sweep]
+            print(f"{label}: {count}개 사이클, 평균 {average:,.0f} 요청")
+    if True in summary and False in summary:
+        print(f"요청 수 {summary[True][1] / max(summary[False][1], 1):.1f}배 감소")
+
+    cycle_id = cycle_id or latest_full_sweep(db_manager)
+    if cycle_id is None:
+        print("비교할 전체 수집 사이클이 없음")
+        return
+    print(f"\n사이클 {cycle_id} 재현 (종료 기준: 구간에서 본 모든 캐시 키의 가격 계산 값이 정해짐)")
+    for label, result in (("악세", compare_accessories(db_manager, cycle_id)),
+                          ("팔찌", compare_bracelets(db_manager, cycle_id))):
+        if result is None:
+            continue
+        print(f"[{label}] 페이지 {result['floor_pages']:,}/{result['pages']:,}, "
+              f"가격 있는 키 {result['keys_kept']:,}/{result['keys']:,} 유지, "
+              f"캐시 결과 동일 {result['same']:,}/{result['keys']:,}")
+        for key, full, truncated in result["diff"][:MAX_DIFF_LINES]:
+            print(f"  {key}: 전체 {full} / 최저가 기준 {truncated}")
+
+def main():
+    parser = argparse.ArgumentParser(description="최저가 기준 페이징과 전체 수집 비교")
+    parser.add_argument("--cycle", help="재현할 전체 수집 사이클 id (기본: 가장 최근 전체 수집)")
+    args = parser.parse_args()
+    print_report(DatabaseManager(), args.cycle)
+
+if __name__ == "__main__":
+    main()
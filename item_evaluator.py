@@ -4,23 +4,34 @@ import numpy as np
 from typing import List, Dict, Optional, Tuple, Any
 from database import *
 from utils import *
-from market_price_cache import MarketPriceCache
+from market_price_cache import MarketPriceCache, DEFAULT_WINDOW, bracelet_pattern_label
+from price_explanation import load_explanation
+from listing import AccessoryListing, BraceletListing, listing_from_api
 from sqlalchemy.orm import aliased
 
+# 기본 기간(24h)의 표본이 적으면 순서대로 더 넓은 기간의 가격을 사용
+FALLBACK_WINDOWS = ("7d",)
+MIN_WINDOW_SAMPLES = 5
+
 class ItemEvaluator:
-    def __init__(self, price_cache, debug=False):
+    def __init__(self, price_cache, debug=False, watch_cache_file=True, miss_tracker=None):
+        """miss_tracker: PriceMissTracker. 있으면 evaluate_listing(record_misses=True)의 캐시 미스를 기록"""
         self.debug = debug
         self.price_cache = price_cache
+        self.miss_tracker = miss_tracker
         self.last_check_time = self.price_cache.get_last_update_time()
         
         # 캐시 업데이트 체크 스레드 시작
+        # 오케스트레이터처럼 같은 프로세스에서 캐시를 직접 교체해 주는 경우에는 파일 폴링이 필요 없음
         self._stop_flag = threading.Event()
-        self._update_check_thread = threading.Thread(
-            target=self._check_cache_updates,
-            name="CacheUpdateChecker"
-        )
-        self._update_check_thread.daemon = True
-        self._update_check_thread.start()
+        self._update_check_thread = None
+        if watch_cache_file:
+            self._update_check_thread = threading.Thread(
+                target=self._check_cache_updates,
+                name="CacheUpdateChecker"
+            )
+            self._update_check_thread.daemon = True
+            self._update_check_thread.start()
 
     def _check_cache_updates(self):
         """주기적으로 캐시 파일 업데이트 확인"""
@@ -48,7 +59,7 @@ class ItemEvaluator:
             # 1분마다 체크
             time.sleep(60)
             
-    def _get_reference_options(self, item: Dict, part: str) -> Dict[str, Any]:
+    def _get_reference_options(self, listing: AccessoryListing, part: str) -> Dict[str, Any]:
         """
         아이템의 옵션들을 타입별로 분류
         
@@ -77,35 +88,32 @@ class ItemEvaluator:
             "support_exclusive": [],   
             "support_bonus": [],      
             "base_info": {
-                "quality": item["GradeQuality"],
-                "trade_count": item["AuctionInfo"]["TradeAllowCount"],
+                "quality": listing.quality,
+                "trade_count": listing.trade_count,
             }
         }
 
-        for opt in item["Options"]:
-            opt_name = opt["OptionName"]
-            if opt_name in ["깨달음", "도약"]:
-                continue
+        for opt_name, opt_value in listing.named_options():
 
             # 딜러 전용 옵션
             if ((part == "목걸이" and opt_name in ["추피", "적주피"]) or
                 (part == "귀걸이" and opt_name in ["공퍼", "무공퍼"]) or
                 (part == "반지" and opt_name in ["치적", "치피"])):
-                reference_options["dealer_exclusive"].append((opt_name, opt["Value"]))
+                reference_options["dealer_exclusive"].append((opt_name, opt_value))
             
             # 서포터 전용 옵션
             if ((part == "목걸이" and opt_name in ["아덴게이지", "낙인력"]) or
                 (part == "귀걸이" and opt_name == "무공퍼") or  # 귀걸이 무공퍼 추가
                 (part == "반지" and opt_name in ["아공강", "아피강"])):
-                reference_options["support_exclusive"].append((opt_name, opt["Value"]))
+                reference_options["support_exclusive"].append((opt_name, opt_value))
             
             # 딜러용 보너스 옵션
             if opt_name in ["깡공", "깡무공"]:
-                reference_options["dealer_bonus"].append((opt_name, opt["Value"]))
+                reference_options["dealer_bonus"].append((opt_name, opt_value))
             
             # 서포터용 보너스 옵션
             if opt_name in ["최생", "최마", "아군회복", "아군보호막", "깡무공"]:
-                reference_options["support_bonus"].append((opt_name, opt["Value"]))
+                reference_options["support_bonus"].append((opt_name, opt_value))
 
         if self.debug:
             print("\nClassified options:")
@@ -117,18 +125,18 @@ class ItemEvaluator:
 
         return reference_options
     
-    def _estimate_dealer_price(self, reference_options: Dict[str, Any], 
-                            price_data: Dict[str, Any]) -> int:
+    def _estimate_breakdown(self, reference_options: Dict[str, Any], price_data: Dict[str, Any],
+                            bonus_key: str) -> Dict[str, Any]:
         """
-        딜러용 가격 추정
-        모든 아이템은 최소한 base_price를 가지며,
-        옵션이 있는 경우 해당 옵션들의 가치를 더함
+        가격 추정 내역 (딜러/서폿 공통, bonus_key: "dealer_bonus" / "support_bonus")
+        모든 아이템은 최소한 base_price를 가지며, 옵션이 있는 경우 해당 옵션들의 가치를 더함
         """
         # 기본 가격에서 시작
         estimated_price = price_data['base_price']
+        bonus_values = []
 
-        # Common 딜러용 보너스 옵션 가치 추가
-        for opt_name, opt_value in reference_options["dealer_bonus"]:
+        # Common 보너스 옵션 가치 추가
+        for opt_name, opt_value in reference_options[bonus_key]:
             common_values = price_data.get('common_option_values', {})
             if opt_name in common_values and common_values[opt_name]:
                 try:
@@ -139,6 +147,7 @@ class ItemEvaluator:
                         closest_value = max(valid_values)
                         additional_value = common_values[opt_name][closest_value]
                         estimated_price += additional_value
+                        bonus_values.append((opt_name, opt_value, closest_value, additional_value))
                         if self.debug:
                             print(f"Added value for {opt_name} {opt_value}: +{additional_value:,}")
                 except ValueError:
@@ -152,88 +161,91 @@ class ItemEvaluator:
         estimated_price += quality_adjustment
 
         # 거래 횟수 보정 (항상 적용)
+        trade_adjustment = 0
         trade_diff = reference_options["base_info"]["trade_count"] - 2  # 2회가 기준
         if trade_diff < 0:  # 거래 횟수가 적으면 가치 감소
             trade_adjustment = trade_diff * abs(price_data['trade_count_coefficient'])
             estimated_price += trade_adjustment
 
+        return {
+            "base_price": price_data['base_price'],
+            "bonus_values": bonus_values,
+            "quality_adjustment": quality_adjustment,
+            "trade_adjustment": trade_adjustment,
+            "estimate": max(int(estimated_price), 1),
+        }
+
+    def _estimate_dealer_price(self, reference_options: Dict[str, Any], 
+                            price_data: Dict[str, Any]) -> int:
+        """딜러용 가격 추정"""
+        breakdown = self._estimate_breakdown(reference_options, price_data, "dealer_bonus")
         if self.debug:
             print("\nDealer price estimation:")
-            print(f"Base price: {price_data['base_price']:,}")
-            print(f"Quality adjustment: {quality_adjustment:,}")
-            print(f"Trade adjustment: {trade_adjustment if 'trade_adjustment' in locals() else 0:,}")
-            print(f"Final estimate: {estimated_price:,}")
-
-        return max(int(estimated_price), 1)
+            self._print_breakdown(breakdown)
+        return breakdown["estimate"]
     
     def _estimate_support_price(self, reference_options: Dict[str, Any], 
                             price_data: Dict[str, Any]) -> int:
-        """
-        서포터용 가격 추정
-        모든 아이템은 최소한 base_price를 가지며,
-        옵션이 있는 경우 해당 옵션들의 가치를 더함
-        """
-        # 기본 가격에서 시작
-        estimated_price = price_data['base_price']
-
-        # 서포터용 보너스 옵션 가치 추가
-        for opt_name, opt_value in reference_options["support_bonus"]:
-            common_values = price_data.get('common_option_values', {})
-            if opt_name in common_values and common_values[opt_name]:
-                try:
-                    # 정확히 일치하거나 더 작은 값들 중 최대값 찾기
-                    valid_values = [float(v) for v in common_values[opt_name].keys() 
-                                if float(v) <= opt_value]
-                    if valid_values:
-                        closest_value = max(valid_values)
-                        additional_value = common_values[opt_name][closest_value]
-                        estimated_price += additional_value
-                        if self.debug:
-                            print(f"Added value for {opt_name} {opt_value}: +{additional_value:,}")
-                except ValueError:
-                    if self.debug:
-                        print(f"No cached values found for {opt_name} {opt_value}")
-                    continue
-
-        # 품질 보정 (항상 적용)
-        quality_diff = reference_options["base_info"]["quality"] - 67
-        quality_adjustment = quality_diff * price_data['quality_coefficient'] * 0.5 # 보수적으로 잡기 위해 0.5 넣음
-        estimated_price += quality_adjustment
-
-        # 거래 횟수 보정 (항상 적용)
-        trade_diff = reference_options["base_info"]["trade_count"] - 2
-        if trade_diff < 0:  # 거래 횟수가 적으면 가치 감소
-            trade_adjustment = trade_diff * abs(price_data['trade_count_coefficient'])
-            estimated_price += trade_adjustment
-
+        """서포터용 가격 추정"""
+        breakdown = self._estimate_breakdown(reference_options, price_data, "support_bonus")
         if self.debug:
             print("\nSupport price estimation:")
-            print(f"Base price: {price_data['base_price']:,}")
-            print(f"Quality adjustment: {quality_adjustment:,}")
-            print(f"Trade adjustment: {trade_adjustment if 'trade_adjustment' in locals() else 0:,}")
-            print(f"Final estimate: {estimated_price:,}")
+            self._print_breakdown(breakdown)
+        return breakdown["estimate"]
 
-        return max(int(estimated_price), 1)
+    def _print_breakdown(self, breakdown: Dict[str, Any]):
+        print(f"Base price: {breakdown['base_price']:,}")
+        print(f"Quality adjustment: {breakdown['quality_adjustment']:,}")
+        print(f"Trade adjustment: {breakdown['trade_adjustment']:,}")
+        print(f"Final estimate: {breakdown['estimate']:,}")
 
-    def _estimate_acc_price(self, item: Dict, grade: str, part: str, level: int) -> Dict[str, Any]:
+    def _get_price_data(self, grade: str, part: str, level: int, reference_options: Dict[str, Any],
+                        windows: Optional[Dict[str, str]] = None) -> Dict[str, Optional[Dict]]:
+        """
+        기본 기간 가격 데이터를 쓰되, 딜러/서폿 각각 표본이 MIN_WINDOW_SAMPLES 미만이면 더 넓은 기간으로 대체
+        windows에 dict를 넘기면 역할별로 실제 사용한 기간을 채움 (가격 설명용)
+        """
+        price_data = self.price_cache.get_price_data(grade, part, level, reference_options, DEFAULT_WINDOW)
+        used_windows = {role: DEFAULT_WINDOW for role, data in price_data.items() if data}
+        for window in FALLBACK_WINDOWS:
+            thin = [role for role, data in price_data.items()
+                    if data is None or data['sample_count'] < MIN_WINDOW_SAMPLES]
+            if not thin:
+                break
+            wider = self.price_cache.get_price_data(grade, part, level, reference_options, window)
+            for role in thin:
+                if wider[role] and (price_data[role] is None
+                                    or wider[role]['sample_count'] > price_data[role]['sample_count']):
+                    if self.debug:
+                        print(f"Using {window} {role} price data (thin {DEFAULT_WINDOW} samples)")
+                    price_data[role] = wider[role]
+                    used_windows[role] = window
+        if windows is not None:
+            windows.update(used_windows)
+        return price_data
+
+    def _estimate_acc_price(self, listing: AccessoryListing, grade: str, part: str, level: int) -> Dict[str, Any]:
+        """반환값의 missing_roles/reference_options: 캐시에 가격이 없던 역할과 옵션 분류 (미스 기록용)"""
+        missing_roles = []
+        reference_options = None
         try:
             if self.debug:
                 print(f"\n=== Price Estimation Debug ===")
                 print(f"Item: {grade} {part} (Level {level})")
-                print(f"Quality: {item['GradeQuality']}")
+                print(f"Quality: {listing.quality}")
                 print("Options:")
-                for opt in item["Options"]:
-                    if opt["OptionName"] not in ["깨달음", "도약"]:
-                        print(f"  - {opt['OptionName']}: {opt['Value']}")
+                for opt_name, opt_value in listing.named_options():
+                    print(f"  - {opt_name}: {opt_value}")
 
             # 옵션 분류
-            reference_options = self._get_reference_options(item, part)
+            reference_options = self._get_reference_options(listing, part)
         
             # 현재 즉구가
-            current_price = item["AuctionInfo"]["BuyPrice"]
+            current_price = listing.price
 
-            # 캐시된 가격 데이터 조회
-            price_data = self.price_cache.get_price_data(grade, part, level, reference_options)
+            # 캐시된 가격 데이터 조회 (표본이 적으면 더 넓은 기간)
+            price_data = self._get_price_data(grade, part, level, reference_options)
+            missing_roles = [role for role, data in price_data.items() if data is None]
 
             # 딜러용/서포터용 가격 추정 - 항상 양쪽 다 계산
             dealer_price = self._estimate_dealer_price(reference_options, price_data["dealer"])
@@ -245,6 +257,8 @@ class ItemEvaluator:
                 "support_price": support_price,
                 "has_dealer_options": bool(reference_options["dealer_exclusive"] or reference_options["dealer_bonus"]),
                 "has_support_options": bool(reference_options["support_exclusive"] or reference_options["support_bonus"]),
+                "missing_roles": missing_roles,
+                "reference_options": reference_options,
             }
 
             # 최종 타입과 가격 결정 - 항상 둘 중 더 높은 쪽으로
@@ -275,43 +289,52 @@ class ItemEvaluator:
                 "support_price": current_price if reference_options["support_exclusive"] else None,
                 "has_dealer_options": bool(reference_options["dealer_exclusive"]),
                 "has_support_options": bool(reference_options["support_exclusive"]),
+                "missing_roles": missing_roles,
+                "reference_options": reference_options,
             }
 
     def evaluate_item(self, item: Dict) -> Optional[Dict]:
-        """아이템 평가"""
+        """아이템 평가 (API 응답 형식의 dict)"""
         if not item["AuctionInfo"]["BuyPrice"]:
             return None
+        return self.evaluate_listing(listing_from_api(item))
+
+    def evaluate_listing(self, listing, record_misses: bool = False) -> Optional[Dict]:
+        """
+        이미 변환된 매물 레코드 평가
+        record_misses: 실제 시장 매물일 때 True (캐시 미스를 miss_tracker에 기록 -> 수집기가 그 키를 추가 검색)
+        """
+        if not listing.price:
+            return None
+        record_misses = record_misses and self.miss_tracker is not None
 
         # 아이템 타입 구분
-        if "팔찌" in item["Name"]:
-            return self._evaluate_bracelet(item)
+        if listing.is_bracelet:
+            return self._evaluate_bracelet(listing, record_misses)
         else:
-            fix_dup_options(item) # 중복 옵션 처리해서 보내기
-            return self._evaluate_accessory(item)
+            return self._evaluate_accessory(listing, record_misses)
 
-    def _evaluate_accessory(self, item: Dict) -> Optional[Dict]:
-            grade = item["Grade"]
-            level = len(item["Options"]) - 1
+    def _evaluate_accessory(self, listing: AccessoryListing, record_misses: bool = False) -> Optional[Dict]:
+            grade = listing.grade
+            level = listing.level
 
             # 파트 확인
-            if "목걸이" in item["Name"]:
-                part = "목걸이"
-            elif "귀걸이" in item["Name"]:
-                part = "귀걸이"
-            elif "반지" in item["Name"]:
-                part = "반지"
-            else:
+            part = listing.part
+            if part is None:
                 return None
 
             # 기본 검증
-            if item["GradeQuality"] < 67:
+            if listing.quality < 67:
                 # print("품질이 67 미만임")
                 return None
 
             # 가격 추정
-            estimate_result = self._estimate_acc_price(item, grade, part, level)
+            estimate_result = self._estimate_acc_price(listing, grade, part, level)
+            if record_misses and estimate_result["reference_options"]:
+                for role in estimate_result["missing_roles"]:
+                    self.miss_tracker.record_accessory(listing, role, estimate_result["reference_options"])
 
-            current_price = item["AuctionInfo"]["BuyPrice"]
+            current_price = listing.price
             expected_price = estimate_result["price"]
             price_ratio = current_price / expected_price
             profit = expected_price - current_price
@@ -321,7 +344,7 @@ class ItemEvaluator:
                 "grade": grade,
                 "part": part,
                 "level": level,
-                "quality": item["GradeQuality"],
+                "quality": listing.quality,
                 "current_price": current_price,
                 "expected_price": expected_price,
                 "price_ratio": price_ratio,
@@ -334,53 +357,23 @@ class ItemEvaluator:
                 "is_notable": self._is_notable_accessory(level, current_price, expected_price, price_ratio)
             }
 
-    def _evaluate_bracelet(self, item: Dict) -> Optional[Dict]:
+    def _evaluate_bracelet(self, listing: BraceletListing, record_misses: bool = False) -> Optional[Dict]:
         """팔찌 평가"""
-        grade = item["Grade"]
-        current_price = item["AuctionInfo"]["BuyPrice"]
-
-        # 기본 정보 추출
-        fixed_option_count = 0  # 처음부터 카운트
-        extra_option_count = 0
-        combat_stats = []
-        base_stats = []
-        special_effects = []
-
-        for option in item["Options"]:
-            # 깨달음/도약은 건너뛰기
-            if option["OptionName"] in ["깨달음", "도약"]:
-                continue
-                
-            # 부여 효과 수량만 따로 처리하고, 나머지는 모두 고정 효과로 카운트
-            if option["Type"] == "BRACELET_RANDOM_SLOT":
-                extra_option_count = int(option["Value"])
-            else:
-                fixed_option_count += 1  # 모든 다른 옵션은 고정 효과로 카운트
-                
-                # 옵션 종류별 분류
-                if option["Type"] == "STAT":
-                    if option["OptionName"] in ["특화", "치명", "신속"]:
-                        combat_stats.append((option["OptionName"], option["Value"]))
-                    elif option["OptionName"] in ["힘", "민첩", "지능"]:
-                        base_stats.append((option["OptionName"], option["Value"]))
-                    else: # special_effect는 아닌데 의미는 없음(제인숙, 체력)
-                        special_effects.append((option["OptionName"], option["Value"]))
-                else:
-                    special_effects.append((option["OptionName"], option["Value"]))
-
-        # print(grade, fixed_option_count, extra_option_count, combat_stats, base_stats, special_effects)
-        # 캐시된 가격 데이터를 사용하여 예상 가격 계산
-        item_data = {
-            'fixed_option_count': fixed_option_count,
-            'extra_option_count': extra_option_count,
-            'combat_stats': combat_stats,
-            'base_stats': base_stats,
-            'special_effects': special_effects
-        }
-        
-        expected_price = self.price_cache.get_bracelet_price(grade, item_data)
+        grade = listing.grade
+        current_price = listing.price
+        fixed_option_count = listing.fixed_option_count
+        extra_option_count = listing.extra_option_count
+        combat_stats = listing.combat_stats
+        base_stats = listing.base_stats
+        special_effects = listing.special_effects
+
+        # 캐시된 가격 데이터를 사용하여 예상 가격 계산 (기본 기간에 패턴이 없으면 더 넓은 기간)
+        match = self._match_bracelet_price(listing)
+        expected_price = match[3] if match else None
 
         if not expected_price:
+            if record_misses:
+                self.miss_tracker.record_bracelet(listing, self.price_cache._classify_bracelet_pattern(listing))
             if current_price > 5000:
                 # print(f"팔찌값 산출 실패 {item_data}")
                 stats_str = []
@@ -395,8 +388,7 @@ class ItemEvaluator:
                     stats_str.append(f"{effect_name}{effect_value}")
                 # 부여 효과 수량 추가
                 stats_str.append(f"부여 효과 수량{extra_option_count}")
-                # print(item["Options"])
-                print(f"{grade} {item['Name']} | {current_price:,}골드 vs ?? | 고정 {fixed_option_count} 부여 {extra_option_count} | 만료 {item['AuctionInfo']['EndDate']} | {' '.join(stats_str)}")
+                print(f"{grade} {listing.name} | {current_price:,}골드 vs ?? | 고정 {fixed_option_count} 부여 {extra_option_count} | 만료 {listing.end_time} | {' '.join(stats_str)}")
             return None
 
         price_ratio = current_price / expected_price
@@ -411,12 +403,57 @@ class ItemEvaluator:
             "profit": profit,
             "fixed_option_count": fixed_option_count,
             "extra_option_count": extra_option_count,
-            "combat_stats": combat_stats,
-            "base_stats": base_stats,
-            "special_effects": special_effects,
+            "combat_stats": list(combat_stats),
+            "base_stats": list(base_stats),
+            "special_effects": list(special_effects),
             "is_notable": self._is_notable_bracelet(current_price, expected_price, price_ratio),
         }
 
+    def _match_bracelet_price(self, listing: BraceletListing) -> Optional[Tuple[str, str, Tuple[str, str, str], int]]:
+        """기본 기간 -> 더 넓은 기간 순으로 팔찌 가격 조회. 반환값: (기간, 패턴 타입, 캐시 키, 가격)"""
+        for window in (DEFAULT_WINDOW,) + FALLBACK_WINDOWS:
+            match = self.price_cache.match_bracelet_price(listing.grade, listing, window)
+            if match and match[2]:
+                return (window,) + match
+        return None
+
+    def explain_listing(self, listing) -> Dict[str, Any]:
+        """
+        평가 결과와 그 가격이 나온 이유 (저장된 가격 설명만 읽음, 캐시 재빌드 없음)
+        - 악세: 역할별 캐시 키/사용한 기간/추정 내역(기본 가격 + 공통 옵션 + 품질/거래 보정)/빌드 중간값
+        - 팔찌: 찾은 패턴 키(유사 패턴이면 그 패턴)/기간/빌드 중간값
+        """
+        build_time = self.price_cache.last_update
+        result = {"evaluation": self.evaluate_listing(listing), "roles": {}}
+
+        if listing.is_bracelet:
+            match = self._match_bracelet_price(listing)
+            if match:
+                window, pattern_type, key, price = match
+                label = bracelet_pattern_label(listing.grade, pattern_type, key)
+                result["roles"]["bracelet"] = {
+                    "cache_key": label, "window": window, "price": price,
+                    "stored": load_explanation(self.price_cache.db, "bracelet", label, window, build_time),
+                }
+            return result
+
+        part = listing.part
+        if part is None:
+            return result
+        reference_options = self._get_reference_options(listing, part)
+        windows = {}
+        price_data = self._get_price_data(listing.grade, part, listing.level, reference_options, windows)
+        keys = self.price_cache.get_cache_key(listing.grade, part, listing.level, reference_options)
+        for role, cache_key in zip(("dealer", "support"), keys):
+            window = windows.get(role, DEFAULT_WINDOW)
+            result["roles"][role] = {
+                "cache_key": cache_key, "window": window,
+                "estimate": (self._estimate_breakdown(reference_options, price_data[role], f"{role}_bonus")
+                             if price_data[role] else None),
+                "stored": load_explanation(self.price_cache.db, role, cache_key, window, build_time),
+            }
+        return result
+
     def _sigmoid(self, expected_price: int) -> float:
         min_ratio = 0.5
         max_ratio = 0.75
@@ -1,7 +1,10 @@
 import re
+import argparse
 from database import *
-from market_price_cache import MarketPriceCache
-from item_checker import ItemEvaluator
+from market_price_cache import MarketPriceCache, DEFAULT_WINDOW
+from item_evaluator import ItemEvaluator
+from listing import listing_from_api
+from price_explanation import load_explanation, format_explanation
 
 def parse_market_item(line: str) -> dict:
     """매물 정보 문자열을 아이템 딕셔너리로 변환"""
@@ -103,12 +106,56 @@ def parse_market_item(line: str) -> dict:
         "Options": options
     }
 
+def print_explanation(explanation: dict):
+    """ItemEvaluator.explain_listing 결과 출력"""
+    evaluation = explanation["evaluation"]
+    print("\n=== 가격 평가 결과 ===")
+    if evaluation:
+        print(f"아이템 종류: {evaluation['type']}")
+        print(f"예상 가격: {evaluation['expected_price']:,}")
+        print(f"가격 비율: {evaluation['price_ratio']:.1%}")
+        print(f"주목할만함: {evaluation['is_notable']}")
+    else:
+        print("가격 평가 실패")
+
+    if not explanation["roles"]:
+        print("\n캐시에서 찾은 키 없음")
+    for role, detail in explanation["roles"].items():
+        print(f"\n=== {role}: {detail['cache_key']} ({detail['window']}) ===")
+        estimate = detail.get("estimate")
+        if estimate:
+            print(f"기본 가격 {estimate['base_price']:,}")
+            for opt_name, opt_value, matched_value, additional_value in estimate["bonus_values"]:
+                print(f"  + {opt_name} {opt_value:g} (캐시 값 {matched_value:g}): {additional_value:+,}")
+            print(f"  + 품질 보정 {estimate['quality_adjustment']:+,.0f}")
+            print(f"  + 거래 횟수 보정 {estimate['trade_adjustment']:+,.0f}")
+            print(f"  = {estimate['estimate']:,}")
+        elif "price" in detail:
+            print(f"패턴 가격 {detail['price']:,}")
+        else:
+            print("캐시에 가격 없음")
+        if detail["stored"]:
+            print("\n".join(format_explanation(detail["stored"])))
+        else:
+            print("저장된 가격 설명 없음 (설명 저장 이전에 만든 캐시)")
+
 def main():
-    # 데이터베이스 매니저와 평가기 초기화
-    db_manager = init_database()  # DatabaseManager() 대신 init_database() 사용
-    price_cache = MarketPriceCache(db_manager, debug=True)
-    evaluator = ItemEvaluator(price_cache, debug=True)
-    
+    parser = argparse.ArgumentParser(description="가격 설명 조회 (저장된 캐시 빌드 중간값만 읽음)")
+    parser.add_argument("--key", help="캐시 키를 바로 조회 (예: \"고대:목걸이:3:base\", \"고대|전특2|치명+특화|80+90|부여2\")")
+    parser.add_argument("--kind", choices=["dealer", "support", "bracelet"], default="dealer", help="--key의 종류")
+    parser.add_argument("--window", default=DEFAULT_WINDOW, help="2h / 6h / 24h / 7d")
+    args = parser.parse_args()
+
+    # 데이터베이스 매니저와 평가기 초기화 (캐시 파일만 읽고, 재빌드/파일 감시 안 함)
+    db_manager = init_database()
+    price_cache = MarketPriceCache(db_manager)
+    evaluator = ItemEvaluator(price_cache, watch_cache_file=False)
+
+    if args.key:
+        stored = load_explanation(db_manager, args.kind, args.key, args.window, price_cache.last_update)
+        print("\n".join(format_explanation(stored)) if stored else "저장된 가격 설명 없음")
+        return
+
     print("매물 정보를 입력하세요. 종료하려면 'q' 또는 'exit'를 입력하세요.")
     print("입력 형식 예시:")
     print("팔찌: 고대 찬란한 구원자의 팔찌 | 27,777골드 vs 42,555골드 (65.3%) | 고정 2 부여 3 | 만료 2024-11-18T17:49:20.913 | 신속78.0 특화78.0 부여 효과 수량3.0")
@@ -130,17 +177,8 @@ def main():
             print("옵션:")
             for opt in test_item['Options']:
                 print(f"  {opt['OptionName']}: {opt['Value']}")
-                
-            print("\n=== 가격 평가 결과 ===")
-            evaluation = evaluator.evaluate_item(test_item)
-            
-            if evaluation:
-                print(f"아이템 종류: {evaluation['type']}")
-                print(f"예상 가격: {evaluation['expected_price']:,}")
-                print(f"가격 비율: {evaluation['price_ratio']:.1%}")
-                print(f"주목할만함: {evaluation['is_notable']}")
-            else:
-                print("가격 평가 실패")
+
+            print_explanation(evaluator.explain_listing(listing_from_api(test_item)))
                 
         except Exception as e:
             print(f"오류 발생: {e}")
@@ -0,0 +1,313 @@
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Any
+from utils import option_dict, number_to_scale, FULLNAME_TO_ABB
+from async_api_client import decode_auction_response, decode_auction_struct, msgspec
+
+"""
+경매장 매물 한 건을 가볍게 표현하는 레코드
+- API 응답 하나당 한 번만 변환해서 수집기/스캐너/평가기/DB 저장이 같이 씀
+- dict 대신 __slots__ 객체라 매물당 할당과 메모리가 적음
+- 악세 옵션은 utils.option_dict의 번호(int)로, 팔찌 옵션 이름은 sys.intern으로 공유
+"""
+
+SKIP_OPTIONS = ("깨달음", "도약")
+OPTION_NAMES = {opt_id: name for name, opt_id in option_dict.items()}
+
+def normalize_option_name(option_name: str, is_percentage: bool) -> str:
+    """fix_dup_options와 같은 규칙으로 옵션 이름을 약어로 (원본 dict는 건드리지 않음)"""
+    if option_name == "공격력 ":
+        return "공퍼" if is_percentage else "깡공"
+    if option_name == "무기 공격력 ":
+        return "무공퍼" if is_percentage else "깡무공"
+    return FULLNAME_TO_ABB.get(option_name, option_name)
+
+def option_id(option_name: str):
+    """옵션 약어 -> option_dict 번호 (모르는 옵션은 intern된 이름 그대로)"""
+    return option_dict.get(option_name) or sys.intern(option_name)
+
+def option_name(opt_id) -> str:
+    return OPTION_NAMES.get(opt_id, opt_id)
+
+def _parse_end_date(end_date: Optional[str]) -> Optional[datetime]:
+    if not end_date:
+        return None
+    return datetime.fromisoformat(end_date)
+
+def _dict_fields(item: Dict) -> tuple:
+    """API dict -> (이름, 등급, 품질, 거래 횟수, 즉구가, 만료, [(타입, 옵션명, 값, 퍼센트 여부)])"""
+    auction_info = item["AuctionInfo"]
+    return (item["Name"], item["Grade"], item.get("GradeQuality"),
+            auction_info.get("TradeAllowCount"), auction_info.get("BuyPrice"), auction_info.get("EndDate"),
+            [(opt.get("Type"), opt["OptionName"], opt["Value"], opt.get("IsValuePercentage", False))
+             for opt in item["Options"]])
+
+def _struct_fields(item) -> tuple:
+    """msgspec Struct(async_api_client.AuctionItemFields) -> _dict_fields와 같은 형태"""
+    auction_info = item.AuctionInfo
+    return (item.Name, item.Grade, item.GradeQuality,
+            auction_info.TradeAllowCount, auction_info.BuyPrice, auction_info.EndDate,
+            [(opt.Type, opt.OptionName, opt.Value, opt.IsValuePercentage) for opt in item.Options])
+
+class AccessoryListing:
+    """목걸이/귀걸이/반지 매물 (options: (옵션 번호, 값, 퍼센트 여부) 튜플)"""
+    __slots__ = ("name", "grade", "part", "level", "quality", "trade_count", "price",
+                 "end_time", "timestamp", "options")
+
+    is_bracelet = False
+
+    def __init__(self, name: str, grade: str, part: Optional[str], level: int, quality: int,
+                 trade_count: int, price: Optional[int], end_time: Optional[datetime],
+                 options: Tuple[Tuple[Any, float, bool], ...], timestamp: Optional[datetime] = None):
+        self.name = name
+        self.grade = grade
+        self.part = part
+        self.level = level
+        self.quality = quality
+        self.trade_count = trade_count
+        self.price = price
+        self.end_time = end_time
+        self.timestamp = timestamp
+        self.options = options
+
+    @classmethod
+    def from_api(cls, item: Dict, timestamp: Optional[datetime] = None) -> "AccessoryListing":
+        return cls._from_fields(*_dict_fields(item), timestamp)
+
+    @classmethod
+    def from_struct(cls, item, timestamp: Optional[datetime] = None) -> "AccessoryListing":
+        return cls._from_fields(*_struct_fields(item), timestamp)
+
+    @classmethod
+    def _from_fields(cls, name, grade, quality, trade_count, price, end_date, raw_options,
+                     timestamp) -> "AccessoryListing":
+        options = tuple(
+            (option_id(normalize_option_name(opt_name, is_percentage)), value, is_percentage)
+            for _, opt_name, value, is_percentage in raw_options
+            if opt_name not in SKIP_OPTIONS
+        )
+        return cls(
+            name=name,
+            grade=grade,
+            part=accessory_part(name),
+            level=len(raw_options) - 1,
+            quality=quality,
+            trade_count=trade_count,
+            price=price,
+            end_time=_parse_end_date(end_date),
+            options=options,
+            timestamp=timestamp,
+        )
+
+    @classmethod
+    def from_record(cls, record) -> "AccessoryListing":
+        """DB의 PriceRecord(+raw_options)에서 생성"""
+        options = tuple(
+            (option_id(opt.option_name), opt.option_value, opt.is_percentage)
+            for opt in record.raw_options
+            if opt.option_name not in SKIP_OPTIONS
+        )
+        return cls(record.name, record.grade, record.part, record.level, record.quality,
+                   record.trade_count, record.price, record.end_time, options, record.timestamp)
+
+    def named_options(self) -> List[Tuple[str, float]]:
+        """(옵션 약어, 값) 목록"""
+        return [(option_name(opt_id), value) for opt_id, value, _ in self.options]
+
+    def scaled_options(self) -> List[Tuple[str, int]]:
+        """(옵션 약어, 하중상 1~3) 목록. 값이 표에 없으면 1"""
+        result = []
+        for opt_id, value, _ in self.options:
+            name = option_name(opt_id)
+            result.append((name, number_to_scale.get(name, {}).get(value, 1)))
+        return result
+
+    def dedup_key(self) -> tuple:
+        """같은 사이클 안에서 완전히 같은 매물을 걸러내기 위한 키"""
+        return (self.grade, self.name, self.part, self.level, self.quality, self.price,
+                self.trade_count, tuple(sorted(self.scaled_options())))
+
+class BraceletListing:
+    """팔찌 매물 (스탯/효과는 (이름, 값) 튜플)"""
+    __slots__ = ("name", "grade", "trade_count", "price", "end_time", "timestamp",
+                 "fixed_option_count", "extra_option_count",
+                 "combat_stats", "base_stats", "special_effects")
+
+    is_bracelet = True
+
+    def __init__(self, name: str, grade: str, trade_count: int, price: Optional[int],
+                 end_time: Optional[datetime], fixed_option_count: int, extra_option_count: int,
+                 combat_stats: Tuple[Tuple[str, float], ...], base_stats: Tuple[Tuple[str, float], ...],
+                 special_effects: Tuple[Tuple[str, float], ...], timestamp: Optional[datetime] = None):
+        self.name = name
+        self.grade = grade
+        self.trade_count = trade_count
+        self.price = price
+        self.end_time = end_time
+        self.timestamp = timestamp
+        self.fixed_option_count = fixed_option_count
+        self.extra_option_count = extra_option_count
+        self.combat_stats = combat_stats
+        self.base_stats = base_stats
+        self.special_effects = special_effects
+
+    @classmethod
+    def from_api(cls, item: Dict, timestamp: Optional[datetime] = None) -> "BraceletListing":
+        return cls._from_fields(*_dict_fields(item), timestamp)
+
+    @classmethod
+    def from_struct(cls, item, timestamp: Optional[datetime] = None) -> "BraceletListing":
+        return cls._from_fields(*_struct_fields(item), timestamp)
+
+    @classmethod
+    def _from_fields(cls, name, grade, quality, trade_count, price, end_date, raw_options,
+                     timestamp) -> "BraceletListing":
+        fixed_option_count = 0
+        extra_option_count = 0
+        combat_stats = []
+        base_stats = []
+        special_effects = []
+
+        for option_type, opt_name, value, _ in raw_options:
+            # 깨달음/도약(ARK_PASSIVE)은 건너뛰기
+            if opt_name in SKIP_OPTIONS or option_type == "ARK_PASSIVE":
+                continue
+
+            # 부여 효과 수량만 따로 처리하고, 나머지는 모두 고정 효과로 카운트
+            if option_type == "BRACELET_RANDOM_SLOT":
+                extra_option_count = int(value)
+                continue
+
+            fixed_option_count += 1
+            opt_name = sys.intern(opt_name)
+            if option_type == "STAT" and opt_name in ("특화", "치명", "신속"):
+                combat_stats.append((opt_name, value))
+            elif option_type == "STAT" and opt_name in ("힘", "민첩", "지능"):
+                base_stats.append((opt_name, value))
+            else: # 제인숙, 체력 등 그 외 모든 건 특수 효과로
+                special_effects.append((opt_name, value))
+
+        return cls(
+            name=name,
+            grade=grade,
+            trade_count=trade_count,
+            price=price,
+            end_time=_parse_end_date(end_date),
+            fixed_option_count=fixed_option_count,
+            extra_option_count=extra_option_count,
+            combat_stats=tuple(combat_stats),
+            base_stats=tuple(base_stats),
+            special_effects=tuple(special_effects),
+            timestamp=timestamp,
+        )
+
+    @classmethod
+    def from_record(cls, record) -> "BraceletListing":
+        """DB의 BraceletPriceRecord(+스탯/효과 테이블)에서 생성"""
+        return cls(
+            record.name, record.grade, record.trade_count, record.price, record.end_time,
+            record.fixed_option_count, record.extra_option_count,
+            tuple((sys.intern(stat.stat_type), stat.value) for stat in record.combat_stats),
+            tuple((sys.intern(stat.stat_type), stat.value) for stat in record.base_stats),
+            tuple((sys.intern(effect.effect_type), effect.value) for effect in record.special_effects),
+            record.timestamp,
+        )
+
+    @classmethod
+    def from_flat(cls, row) -> "BraceletListing":
+        """bracelet_flat_records 한 행에서 생성 (JOIN 없이 한 번에)"""
+        combat_stats = tuple(
+            (sys.intern(stat), value)
+            for stat, value in ((row.combat_stat_1, row.combat_value_1), (row.combat_stat_2, row.combat_value_2))
+            if stat is not None
+        )
+        base_stats = ((sys.intern(row.base_stat), row.base_value),) if row.base_stat is not None else ()
+        special_effects = tuple(
+            (sys.intern(effect), value)
+            for effect, value in ((row.special_effect_1, row.special_value_1),
+                                  (row.special_effect_2, row.special_value_2),
+                                  (row.special_effect_3, row.special_value_3))
+            if effect is not None
+        )
+        return cls(row.name, row.grade, row.trade_count, row.price, row.end_time,
+                   row.fixed_option_count, row.extra_option_count,
+                   combat_stats, base_stats, special_effects, row.timestamp)
+
+    def flat_columns(self) -> Dict[str, Any]:
+        """bracelet_flat_records의 스탯/효과 컬럼 값 (슬롯보다 많은 스탯은 버리고 경고)"""
+        if len(self.combat_stats) > 2 or len(self.base_stats) > 1 or len(self.special_effects) > 3:
+            print(f"Bracelet has more stats than flat columns: {self.combat_stats} {self.base_stats} {self.special_effects}")
+
+        columns = {}
+        for i, (stat, value) in enumerate(self.combat_stats[:2], 1):
+            columns[f"combat_stat_{i}"] = stat
+            columns[f"combat_value_{i}"] = value
+        for stat, value in self.base_stats[:1]:
+            columns["base_stat"] = stat
+            columns["base_value"] = value
+        for i, (effect, value) in enumerate(self.special_effects[:3], 1):
+            columns[f"special_effect_{i}"] = effect
+            columns[f"special_value_{i}"] = value
+        return columns
+
+    def dedup_key(self) -> tuple:
+        """같은 사이클 안에서 완전히 같은 매물을 걸러내기 위한 키"""
+        return (self.grade, self.name, self.price, self.trade_count,
+                self.fixed_option_count, self.extra_option_count,
+                tuple(sorted(self.combat_stats)), tuple(sorted(self.base_stats)),
+                tuple(sorted(self.special_effects)))
+
+def accessory_part(name: str) -> Optional[str]:
+    if "목걸이" in name:
+        return "목걸이"
+    if "귀걸이" in name:
+        return "귀걸이"
+    if "반지" in name:
+        return "반지"
+    return None
+
+def listing_from_api(item: Dict, timestamp: Optional[datetime] = None):
+    """API 응답의 매물 하나를 알맞은 레코드로 변환"""
+    if "팔찌" in item["Name"]:
+        return BraceletListing.from_api(item, timestamp)
+    return AccessoryListing.from_api(item, timestamp)
+
+def listing_from_struct(item, timestamp: Optional[datetime] = None):
+    """msgspec으로 디코딩된 매물 하나를 알맞은 레코드로 변환"""
+    if "팔찌" in item.Name:
+        return BraceletListing.from_struct(item, timestamp)
+    return AccessoryListing.from_struct(item, timestamp)
+
+class AuctionPage:
+    """경매장 응답 한 페이지 (전체 매물 수 + 변환된 매물 레코드)"""
+    __slots__ = ("total_count", "listings", "items")
+
+    def __init__(self, total_count: int, listings: list, items: Optional[list] = None):
+        self.total_count = total_count
+        self.listings = listings
+        self.items = items  # keep_items=True일 때만 원본 (dict 또는 msgspec Struct)
+
+    def item_dict(self, index: int) -> Dict:
+        """알림 문구/추적 검색용으로 원본 매물을 API 형식 dict로"""
+        item = self.items[index]
+        if isinstance(item, dict):
+            return item
+        return msgspec.to_builtins(item)
+
+def decode_auction_page(body: bytes, keep_items: bool = False) -> AuctionPage:
+    """
+    응답 본문을 바로 매물 레코드 페이지로 디코딩 (TokenBatchRequester의 decoder로 사용)
+    - msgspec이 있으면 필요한 필드만 Struct로 디코딩한 뒤 변환, 없으면 dict로 디코딩한 뒤 변환
+    - 큰 응답은 요청기가 스레드에서 호출하므로 레코드 변환까지 이벤트 루프 밖에서 끝남
+    """
+    if decode_auction_struct is not None:
+        data = decode_auction_struct(body)
+        items = data.Items or []
+        listings = [listing_from_struct(item) for item in items]
+        total_count = data.TotalCount
+    else:
+        data = decode_auction_response(body)
+        items = data.get("Items") or []
+        listings = [listing_from_api(item) for item in items]
+        total_count = data.get("TotalCount", 0)
+    return AuctionPage(total_count, listings, items if keep_items else None)
@@ -1,7 +1,14 @@
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, List, Tuple, Optional, Any, NamedTuple
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+import argparse
 import numpy as np
 from database import *
+from sqlalchemy import select
+from listing import BraceletListing
+from cache_build_log import CacheBuildLogger, DEFAULT_LOG_LEVEL, LOG_LEVELS
+from price_explanation import save_explanations
 import pickle
 import time
 import os
@@ -9,16 +16,129 @@ import sys
 import threading
 from contextlib import contextmanager, nullcontext
 
-@contextmanager
-def redirect_stdout(file_path, mode='a'):
-    """stdout을 파일로 임시 리다이렉트하는 컨텍스트 매니저"""
-    original_stdout = sys.stdout
-    with open(file_path, mode, encoding='utf-8') as f:
-        sys.stdout = f
-        try:
-            yield
-        finally:
-            sys.stdout = original_stdout
+# 팔찌 수치 구간 (값을 이 기준값으로 내림, 첫 기준값보다 작으면 첫 기준값)
+COMBAT_STAT_THRESHOLDS = np.array([40, 50, 60, 70, 80, 90, 100, 110])
+BASE_STAT_THRESHOLDS = np.array([6400, 8000, 9600, 11200, 12800, 14400])
+BRACELET_PATTERN_TYPES = ["전특2", "전특1+기본", "전특1+공이속", "전특1+잡옵", "전특1"]
+SPEED_EFFECT = "공격 및 이동 속도 증가"
+
+# 팔찌 가격 계산에서 읽는 bracelet_flat_records 컬럼 (스탯 이름 바로 뒤에 값)
+BRACELET_FLAT_COLUMNS = [
+    "grade", "name", "price", "trade_count", "timestamp", "fixed_option_count", "extra_option_count",
+    "combat_stat_1", "combat_value_1", "combat_stat_2", "combat_value_2", "base_stat", "base_value",
+    "special_effect_1", "special_value_1", "special_effect_2", "special_value_2",
+    "special_effect_3", "special_value_3", "bracelet_id",
+]
+BRACELET_STAT_INDEXES = [BRACELET_FLAT_COLUMNS.index(column) for column in (
+    "combat_stat_1", "combat_stat_2", "base_stat", "special_effect_1", "special_effect_2", "special_effect_3")]
+
+def round_to_thresholds(values, thresholds: np.ndarray):
+    """값(스칼라/배열)을 기준값 구간으로 내림"""
+    index = np.searchsorted(thresholds, values, side='right') - 1
+    return thresholds[np.maximum(index, 0)]
+
+# 캐시를 만드는 기간별 뷰 (DB는 가장 넓은 기간으로 한 번만 읽고 좁은 기간은 잘라서 계산)
+PRICE_WINDOWS = {
+    "2h": timedelta(hours=2),
+    "6h": timedelta(hours=6),
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+}
+DEFAULT_WINDOW = "24h"   # 최상위 dealer/support/bracelet_* 키에도 같은 객체로 들어감 (예전 형식 호환)
+
+# 가격 설명(price_explanations)에 남기는 표본 id 수 (가격 낮은 순)
+EXPLANATION_SAMPLE_IDS = 20
+
+def bracelet_pattern_label(grade: str, pattern_type: str, key: Tuple[str, str, str]) -> str:
+    """팔찌 패턴 키 문자열 (빌드 로그/가격 설명 공통). 예: 고대|전특2|치명+특화|80+90|부여2"""
+    return "|".join((grade, pattern_type) + tuple(key))
+
+# 부위별 역할 전용 옵션 (악세 그룹 키에 들어가는 옵션)
+EXCLUSIVE_OPTIONS = {
+    "목걸이": {
+        "dealer": ["추피", "적주피"],
+        "support": ["아덴게이지", "낙인력"]
+    },
+    "귀걸이": {
+        "dealer": ["공퍼", "무공퍼"],
+        "support": ["무공퍼"]
+    },
+    "반지": {
+        "dealer": ["치적", "치피"],
+        "support": ["아공강", "아피강"]
+    }
+}
+
+COMMON_OPTIONS = {
+    # 딜러용 부가 옵션
+    "깡공": [80.0, 195.0, 390.0],
+    "깡무공": [195.0, 480.0, 960.0], # 얘는 서포터용 부가 옵션이기도 함
+    # 서포터용 부가 옵션
+    "최생": [1300.0, 3250.0, 6500.0],
+    "최마": [6.0, 15.0, 30.0],
+    "아군회복": [0.95, 2.1, 3.5],
+    "아군보호막": [0.95, 2.1, 3.5]
+}
+
+# 역할별 공통 옵션 (이 옵션이 없는 매물로 기본 가격을 정함)
+ROLE_COMMON_OPTIONS = {
+    "dealer": ["깡공", "깡무공"],
+    "support": ["깡무공", "최생", "최마", "아군회복", "아군보호막"]
+}
+
+def accessory_group_keys(grade: str, part: str, level: int, options) -> Tuple[str, str]:
+    """악세 매물의 (딜러용, 서포터용) 그룹 키. options: (옵션 이름, 값) 목록"""
+    keys = []
+    for role in ("dealer", "support"):
+        role_options = sorted((name, value) for name, value in options if name in EXCLUSIVE_OPTIONS[part][role])
+        keys.append(f"{grade}:{part}:{level}:{role_options}" if role_options else f"{grade}:{part}:{level}:base")
+    return keys[0], keys[1]
+
+# 악세 그룹 가격 계산 병렬화
+GROUP_WORKERS = os.cpu_count() or 1
+MIN_GROUPS_FOR_POOL = 64   # 그룹이 이보다 적으면 프로세스 띄우는 비용이 더 커서 직렬로 계산
+
+class RawOptionRow(NamedTuple):
+    option_name: str
+    option_value: float
+    is_percentage: bool
+
+class PriceRecordRow(NamedTuple):
+    """가격 계산용 PriceRecord 스냅샷 (세션 없이 워커 프로세스로 넘길 수 있는 값만)"""
+    id: int
+    timestamp: datetime
+    grade: str
+    name: str
+    part: str
+    level: int
+    quality: int
+    trade_count: int
+    price: int
+    raw_options: Tuple[RawOptionRow, ...]
+    option_names: frozenset   # item_options의 옵션 이름 (다른 전용 옵션이 붙은 매물 제외용)
+
+def _compute_group(price_cache: "MarketPriceCache", records: List[PriceRecordRow],
+                   task: Tuple[str, str, str, List[int]],
+                   logger: CacheBuildLogger) -> Tuple[Optional[Dict], Dict, List[Dict]]:
+    """그룹 하나의 가격 계산. 반환값: (가격 데이터, 가격 설명, 로그 기록) - 부모가 작업 순서대로 합침"""
+    window, key, role, indices = task
+    group_logger = logger.child()
+    explanation = {}
+    price_data = price_cache._calculate_group_prices([records[i] for i in indices], key, role, window,
+                                                     group_logger, explanation)
+    return price_data, explanation, group_logger.records
+
+_group_worker_state = {}
+
+def _init_group_worker(records: List[PriceRecordRow], log_level: str, focus_key: Optional[str]):
+    """워커 프로세스마다 한 번: 읽기 전용 스냅샷과 계산용 인스턴스 준비"""
+    _group_worker_state["price_cache"] = MarketPriceCache.from_snapshot({}, None)
+    _group_worker_state["records"] = records
+    _group_worker_state["logger"] = CacheBuildLogger(log_level, focus_key)
+
+def _run_group_worker(task: Tuple[str, str, str, List[int]]) -> Tuple[Optional[Dict], Dict, List[Dict]]:
+    return _compute_group(_group_worker_state["price_cache"], _group_worker_state["records"], task,
+                          _group_worker_state["logger"])
 
 class DoubleBufferCache:
     def __init__(self, cache_name: str):
@@ -139,6 +259,64 @@ class DoubleBufferCache:
     def _release_lock(self):
         os.remove(self.lock_file_path)
 
+class BraceletPriceIndex:
+    """
+    팔찌 캐시를 (등급, 패턴 타입, 패턴, 부여 슬롯)별 수치 배열로 컴파일한 유사 패턴 조회용 인덱스
+    - 값은 첫 번째 수치 기준으로 정렬 -> searchsorted로 허용 범위 안의 후보만 보고 가장 가까운 패턴 선택
+    - 허용 범위: 전투특성 ±10, 기본스탯 ±1600 (전특1+기본의 두 번째 값)
+    """
+    COMBAT_TOLERANCE = 10
+    BASE_TOLERANCE = 1600
+
+    def __init__(self, cache: Dict):
+        self.groups: Dict[tuple, Tuple[np.ndarray, List[int], List[str]]] = {}
+        for cache_key, pattern_prices in cache.items():
+            if not cache_key.startswith("bracelet_"):
+                continue
+            grade = cache_key[len("bracelet_"):]
+            for pattern_type, prices in pattern_prices.items():
+                grouped = {}
+                for (pattern, values, extra_slots), price in prices.items():
+                    try:
+                        numbers = tuple(float(v) for v in values.split('+'))
+                    except ValueError:
+                        continue
+                    grouped.setdefault((grade, pattern_type, pattern, extra_slots, len(numbers)), []).append(
+                        (numbers, price, values))
+
+                for group_key, entries in grouped.items():
+                    entries.sort(key=lambda entry: entry[0])
+                    self.groups[group_key] = (np.array([numbers for numbers, _, _ in entries]),
+                                              [price for _, price, _ in entries],
+                                              [values for _, _, values in entries])
+
+    def tolerances(self, pattern_type: str, dims: int) -> np.ndarray:
+        if pattern_type == "전특1+기본":
+            return np.array([self.COMBAT_TOLERANCE, self.BASE_TOLERANCE], dtype=float)
+        return np.full(dims, self.COMBAT_TOLERANCE, dtype=float)
+
+    def lookup(self, grade: str, pattern_type: str, pattern: str, extra_slots: str,
+               numbers: Tuple[float, ...]) -> Optional[Tuple[str, int]]:
+        """허용 범위 안에서 가장 가까운 패턴의 (캐시 키의 값 문자열, 가격). 허용 범위로 나눈 차이의 최댓값이 거리, 같으면 값이 작은 쪽"""
+        group = self.groups.get((grade, pattern_type, pattern, extra_slots, len(numbers)))
+        if group is None:
+            return None
+        values, prices, labels = group
+        tolerance = self.tolerances(pattern_type, len(numbers))
+        target = np.asarray(numbers, dtype=float)
+
+        first = values[:, 0]
+        lo = np.searchsorted(first, target[0] - tolerance[0], side='left')
+        hi = np.searchsorted(first, target[0] + tolerance[0], side='right')
+        if lo == hi:
+            return None
+
+        distance = (np.abs(values[lo:hi] - target) / tolerance).max(axis=1)
+        best = int(np.argmin(distance))
+        if distance[best] > 1:
+            return None
+        return labels[lo + best], prices[lo + best]
+
 class MarketPriceCache:
     def __init__(self, db_manager, debug=False):
         self.db = db_manager
@@ -152,37 +330,30 @@ class MarketPriceCache:
             "dealer": {},
             "support": {},
             "bracelet_고대": {},
-            "bracelet_유물": {}
+            "bracelet_유물": {},
+            "windows": {}   # 기간 -> 위 네 키를 가진 뷰
         }
         
         # 캐시 로드
         self._load_cache()
+        self._init_option_tables()
 
-        self.EXCLUSIVE_OPTIONS = {
-            "목걸이": {
-                "dealer": ["추피", "적주피"],
-                "support": ["아덴게이지", "낙인력"]
-            },
-            "귀걸이": {
-                "dealer": ["공퍼", "무공퍼"],
-                "support": ["무공퍼"]
-            },
-            "반지": {
-                "dealer": ["치적", "치피"],
-                "support": ["아공강", "아피강"]
-            }
-        }
+    @classmethod
+    def from_snapshot(cls, cache: Dict, last_update: Optional[datetime], debug=False) -> "MarketPriceCache":
+        """이미 로드된 캐시 데이터로 조회 전용 인스턴스 생성 (워커 프로세스용, DB/캐시 파일을 건드리지 않음)"""
+        self = cls.__new__(cls)
+        self.db = None
+        self.debug = debug
+        self.cache_manager = None
+        self.cache = cache
+        self.last_update = last_update
+        self.bracelet_indexes = self._compile_bracelet_indexes(cache)
+        self._init_option_tables()
+        return self
 
-        self.COMMON_OPTIONS = {
-            # 딜러용 부가 옵션
-            "깡공": [80.0, 195.0, 390.0],
-            "깡무공": [195.0, 480.0, 960.0], # 얘는 서포터용 부가 옵션이기도 함
-            # 서포터용 부가 옵션
-            "최생": [1300.0, 3250.0, 6500.0],
-            "최마": [6.0, 15.0, 30.0],
-            "아군회복": [0.95, 2.1, 3.5],
-            "아군보호막": [0.95, 2.1, 3.5]
-        }
+    def _init_option_tables(self):
+        self.EXCLUSIVE_OPTIONS = EXCLUSIVE_OPTIONS
+        self.COMMON_OPTIONS = COMMON_OPTIONS
 
     # -----------------------------
     # Cache Management Methods
@@ -193,6 +364,7 @@ class MarketPriceCache:
         self.cache, self.last_update = self.cache_manager.get_active_cache()
         if not self.cache:  # 캐시가 비어있으면 기본 구조로 초기화
             self.cache = self.cache_structure.copy()
+        self.bracelet_indexes = self._compile_bracelet_indexes(self.cache)
             
         if self.debug:
             print(f"Cache loaded. Last update: {self.last_update}")
@@ -201,8 +373,24 @@ class MarketPriceCache:
             print(f"고대 팔찌 cache entries: {len(self.cache['bracelet_고대'])}")
             print(f"유물 팔찌 cache entries: {len(self.cache['bracelet_유물'])}")
 
+    def _window_view(self, window: str) -> Optional[Dict]:
+        """기간별 캐시 뷰 (기간별 뷰가 없는 예전 캐시 파일은 최상위 키를 기본 기간으로 사용)"""
+        windows = self.cache.get("windows")
+        if windows:
+            return windows.get(window)
+        return self.cache if window == DEFAULT_WINDOW else None
+
+    def _compile_bracelet_indexes(self, cache: Dict) -> Dict[str, "BraceletPriceIndex"]:
+        """기간별 팔찌 유사 패턴 인덱스"""
+        windows = cache.get("windows")
+        if not windows:
+            return {DEFAULT_WINDOW: BraceletPriceIndex(cache)}
+        return {window: BraceletPriceIndex(view) for window, view in windows.items()}
+
     def get_last_update_time(self) -> Optional[datetime]:
         """캐시의 마지막 업데이트 시간 확인"""
+        if self.cache_manager is None:  # 스냅샷 인스턴스
+            return self.last_update
         return self.cache_manager.get_last_update_time()
 
     # -----------------------------
@@ -210,8 +398,9 @@ class MarketPriceCache:
     # -----------------------------
 
     def get_price_data(self, grade: str, part: str, level: int, 
-                      options: Dict[str, List[Tuple[str, float]]]) -> Dict[str, Optional[Dict]]:
-        """가격 데이터 조회"""            
+                      options: Dict[str, List[Tuple[str, float]]],
+                      window: str = DEFAULT_WINDOW) -> Dict[str, Optional[Dict]]:
+        """가격 데이터 조회 (window: PRICE_WINDOWS의 기간)"""            
         dealer_key, support_key = self.get_cache_key(grade, part, level, options)
         
         cache_data = {
@@ -219,15 +408,19 @@ class MarketPriceCache:
             "support": None
         }
 
-        if dealer_key and dealer_key in self.cache["dealer"]:
-            cache_data["dealer"] = self.cache["dealer"][dealer_key]
+        view = self._window_view(window)
+        if view is None:
+            return cache_data
+
+        if dealer_key and dealer_key in view["dealer"]:
+            cache_data["dealer"] = view["dealer"][dealer_key]
             if self.debug:
                 print(f"\nDealer cache hit for {dealer_key}")
                 print(f"Base price: {cache_data['dealer']['base_price']:,}")
                 print(f"Sample count: {cache_data['dealer']['sample_count']}")
 
-        if support_key and support_key in self.cache["support"]:
-            cache_data["support"] = self.cache["support"][support_key]
+        if support_key and support_key in view["support"]:
+            cache_data["support"] = view["support"][support_key]
             if self.debug:
                 print(f"\nSupport cache hit for {support_key}")
                 print(f"Base price: {cache_data['support']['base_price']:,}")
@@ -235,104 +428,179 @@ class MarketPriceCache:
 
         return cache_data
 
-    def update_cache(self):
-        """시장 가격 데이터 업데이트"""
+    def update_cache(self, log_level: str = DEFAULT_LOG_LEVEL, focus_key: Optional[str] = None,
+                     max_workers: Optional[int] = None) -> bool:
+        """
+        시장 가격 데이터 업데이트 (DB 스캔 -> 파일 캐시 기록 -> 인스턴스 캐시 교체)
+        진단 기록은 price_log/price_calculation_*.jsonl (log_level="off"면 기록 안 함)
+        """
         try:
             print("\nUpdating price cache...")
             start_time = datetime.now()
-            timestamp = start_time.strftime("%Y%m%d_%H%M%S")
-            log_filename = f'price_log/price_calculation_{timestamp}.log'
 
-            with redirect_stdout(log_filename):
-                new_cache = self.cache_structure.copy()
-
-                with self.db.get_read_session() as session:
-                    recent_time = datetime.now() - timedelta(hours=24)
-                    
-                    # 최근 24시간 데이터 조회
-                    records = session.query(PriceRecord).filter(
-                        PriceRecord.timestamp >= recent_time
-                    ).all()
-
-                    # 딜러용/서포터용 데이터 그룹화
-                    dealer_groups = {}
-                    support_groups = {}
-
-                    for record in records:
-                        session.refresh(record)
-
-                        dealer_options = []
-                        support_options = []
-                        # 부위 확인
-                        if "목걸이" in record.name:
-                            part = "목걸이"
-                            # 딜러 옵션 체크
-                            dealer_options.extend([("추피", opt.option_value) for opt in record.raw_options if opt.option_name == "추피"])
-                            dealer_options.extend([("적주피", opt.option_value) for opt in record.raw_options if opt.option_name == "적주피"])
-                            # 서폿 옵션 체크
-                            support_options.extend([("아덴게이지", opt.option_value) for opt in record.raw_options if opt.option_name == "아덴게이지"])
-                            support_options.extend([("낙인력", opt.option_value) for opt in record.raw_options if opt.option_name == "낙인력"])
-                        elif "귀걸이" in record.name:
-                            part = "귀걸이"
-                            # 딜러 옵션 체크
-                            dealer_options.extend([("공퍼", opt.option_value) for opt in record.raw_options if opt.option_name == "공퍼"])
-                            dealer_options.extend([("무공퍼", opt.option_value) for opt in record.raw_options if opt.option_name == "무공퍼"])
-                            # 서폿 옵션 체크
-                            support_options.extend([("무공퍼", opt.option_value) for opt in record.raw_options if opt.option_name == "무공퍼"])
-                        elif "반지" in record.name:
-                            part = "반지"
-                            # 딜러 옵션 체크
-                            dealer_options.extend([("치적", opt.option_value) for opt in record.raw_options if opt.option_name == "치적"])
-                            dealer_options.extend([("치피", opt.option_value) for opt in record.raw_options if opt.option_name == "치피"])
-                            # 서폿 옵션 체크
-                            support_options.extend([("아공강", opt.option_value) for opt in record.raw_options if opt.option_name == "아공강"])
-                            support_options.extend([("아피강", opt.option_value) for opt in record.raw_options if opt.option_name == "아피강"])
-                        else:
-                            continue
-
-                        # 딜러용/서포터용 키 생성
-                        dealer_key = f"{record.grade}:{part}:{record.level}:{sorted(dealer_options)}" if dealer_options else f"{record.grade}:{part}:{record.level}:base"
-                        if dealer_key not in dealer_groups:
-                            dealer_groups[dealer_key] = []
-                        dealer_groups[dealer_key].append(record)
-
-                        support_key = f"{record.grade}:{part}:{record.level}:{sorted(support_options)}" if support_options else f"{record.grade}:{part}:{record.level}:base"
-                        if support_key not in support_groups:
-                            support_groups[support_key] = []
-                        support_groups[support_key].append(record)
-
-                    # 각 그룹별로 가격 계산
-                    for key, items in dealer_groups.items():
-                        if len(items) >= 3:  # 최소 3개 이상의 데이터가 있는 경우만
-                            price_data = self._calculate_group_prices(items, key, "dealer")
-                            if price_data:
-                                new_cache["dealer"][key] = price_data
-
-                    for key, items in support_groups.items():
-                        if len(items) >= 3:
-                            price_data = self._calculate_group_prices(items, key, "support")
-                            if price_data:
-                                new_cache["support"][key] = price_data
-                                
-                # 팔찌 가격 업데이트
-                for grade in ["고대", "유물"]:
-                    cache_key = f"bracelet_{grade}"
-                    new_cache[cache_key] = self._calculate_bracelet_prices(grade)
+            logger = CacheBuildLogger(log_level, focus_key)
+            explanations = []
+            new_cache = self.build_cache(max_workers, logger, explanations)
+            log_path = logger.write()
+            if log_path:
+                print(f"Cache build log: {log_path} ({len(logger.records)} records)")
 
             # Double Buffer 캐시 업데이트
             if self.cache_manager.update_cache(new_cache):
                 # 업데이트 성공 시 현재 인스턴스의 캐시도 업데이트
-                self.cache = new_cache
-                self.last_update = datetime.now()
+                last_update = self.cache_manager.get_last_update_time()
+                self.swap_cache(new_cache, last_update)
+                # 가격 설명은 캐시 파일과 같은 시각으로 저장 (설명 조회가 로드된 캐시와 같은 빌드를 찾음)
+                try:
+                    save_explanations(self.db, last_update, explanations)
+                except Exception as e:
+                    print(f"Error saving price explanations: {e}")
                 print(f"Cache update completed in {(datetime.now() - start_time).total_seconds():.2f} seconds")
+                return True
             else:
                 print("Cache update failed")
+                return False
                 
         except Exception as e:
             print(f"Error updating price cache: {e}")
             if self.debug:
                 import traceback
                 traceback.print_exc()
+            return False
+
+    def build_cache(self, max_workers: Optional[int] = None, logger: Optional[CacheBuildLogger] = None,
+                    explanations: Optional[List[Dict]] = None) -> Dict:
+        """
+        DB를 스캔해서 새 캐시 데이터를 만들어 반환 (파일/인스턴스 캐시는 건드리지 않음)
+        - PRICE_WINDOWS의 기간별 뷰를 가장 넓은 기간의 스냅샷 한 번으로 만듦 (그룹화/중복 제거도 한 번)
+        - 악세 그룹별 가격 계산은 스냅샷을 넘긴 프로세스 풀에서 나눠서 계산
+        - 결과와 로그는 직렬 계산과 같은 순서로 합침 (max_workers=1이면 직렬)
+        - explanations에 리스트를 넘기면 키별 가격 설명 행을 채움 (price_explanation.save_explanations 형식)
+        """
+        logger = logger or CacheBuildLogger("off")
+        new_cache = {key: {} for key in self.cache_structure}
+        build_time = datetime.now()
+        cutoffs = {window: build_time - span for window, span in PRICE_WINDOWS.items()}
+
+        with self.db.get_read_session() as session:
+            records = self._load_price_snapshot(session, min(cutoffs.values()))
+        logger.info("snapshot", records=len(records), since=min(cutoffs.values()))
+
+        # 딜러용/서포터용 데이터 그룹화 (스냅샷 인덱스 목록)
+        dealer_groups = {}
+        support_groups = {}
+
+        for index, record in enumerate(records):
+            # 부위 확인
+            part = next((part for part in EXCLUSIVE_OPTIONS if part in record.name), None)
+            if part is None:
+                continue
+
+            # 딜러용/서포터용 키 생성 (부위별 전용 옵션과 값)
+            dealer_key, support_key = accessory_group_keys(
+                record.grade, part, record.level, [(opt.option_name, opt.option_value) for opt in record.raw_options])
+            dealer_groups.setdefault(dealer_key, []).append(index)
+            support_groups.setdefault(support_key, []).append(index)
+
+        # 그룹마다 중복 제거는 가장 넓은 기간에서 한 번만
+        # (같은 매물은 가장 최근 것을 남기므로 좁은 기간의 중복 제거 결과 = 넓은 기간 결과 중 그 기간에 드는 것)
+        timestamps = [record.timestamp for record in records]
+        groups = []
+        for role, role_groups in (("dealer", dealer_groups), ("support", support_groups)):
+            for key, indices in role_groups.items():
+                unique = self._unique_item_indices(records, indices)
+                groups.append((role, key, indices, unique, [timestamps[i] for i in unique]))
+
+        # 기간별로 각 그룹 가격 계산 (기간 안에 최소 3개 이상의 데이터가 있는 경우만, 스냅샷은 id 순이라 기간은 타임스탬프로 거름)
+        tasks = []
+        for window, cutoff in cutoffs.items():
+            for role, key, indices, unique, unique_times in groups:
+                if sum(1 for index in indices if timestamps[index] >= cutoff) >= 3:
+                    tasks.append((window, key, role,
+                                  [index for index, timestamp in zip(unique, unique_times) if timestamp >= cutoff]))
+
+        views = {window: {key: {} for key in self.cache_structure if key != "windows"} for window in PRICE_WINDOWS}
+        results = self._run_group_tasks(records, tasks, max_workers, logger)
+        for (window, key, role, _), (price_data, explanation, group_records) in zip(tasks, results):
+            logger.extend(group_records)
+            if price_data:
+                views[window][role][key] = self._merge_group_result(price_data, build_time)
+            if explanations is not None and explanation:
+                explanations.append({"window": window, "kind": role, "cache_key": key,
+                                     "price": int(price_data['base_price']) if price_data else None,
+                                     "sample_count": explanation["samples"], "details": explanation})
+
+        # 팔찌 가격 업데이트
+        for grade in ["고대", "유물"]:
+            for window, prices in self._calculate_bracelet_prices(grade, cutoffs, logger, explanations).items():
+                views[window][f"bracelet_{grade}"] = prices
+
+        for window, view in views.items():
+            logger.info("window", window=window, dealer=len(view["dealer"]), support=len(view["support"]),
+                        bracelet={grade: sum(map(len, view[f"bracelet_{grade}"].values())) for grade in ["고대", "유물"]})
+        logger.info("build", groups=len(groups), tasks=len(tasks),
+                    seconds=round((datetime.now() - build_time).total_seconds(), 2))
+
+        new_cache["windows"] = views
+        new_cache.update(views[DEFAULT_WINDOW])
+        return new_cache
+
+    def _load_price_snapshot(self, session, since: datetime) -> List[PriceRecordRow]:
+        """최근 악세 레코드를 옵션까지 한 번에 읽어서 스냅샷 행으로 (레코드별 지연 로딩 없음, 기존 쿼리처럼 id 순)"""
+        raw_options = {}
+        for record_id, name, value, is_percentage in session.query(
+                RawItemOption.price_record_id, RawItemOption.option_name,
+                RawItemOption.option_value, RawItemOption.is_percentage
+        ).join(PriceRecord).filter(PriceRecord.timestamp >= since).order_by(RawItemOption.id):
+            raw_options.setdefault(record_id, []).append(RawOptionRow(name, value, is_percentage))
+
+        option_names = {}
+        for record_id, name in session.query(ItemOption.price_record_id, ItemOption.option_name).join(
+                PriceRecord).filter(PriceRecord.timestamp >= since):
+            option_names.setdefault(record_id, set()).add(name)
+
+        return [
+            PriceRecordRow(*row, tuple(raw_options.get(row.id, ())), frozenset(option_names.get(row.id, ())))
+            for row in session.query(
+                PriceRecord.id, PriceRecord.timestamp, PriceRecord.grade, PriceRecord.name, PriceRecord.part,
+                PriceRecord.level, PriceRecord.quality, PriceRecord.trade_count, PriceRecord.price
+            ).filter(PriceRecord.timestamp >= since).order_by(PriceRecord.id)
+        ]
+
+    def _run_group_tasks(self, records: List[PriceRecordRow], tasks: List[tuple], max_workers: Optional[int],
+                         logger: CacheBuildLogger) -> List[Tuple[Optional[Dict], Dict, List[Dict]]]:
+        """그룹 계산 작업 실행. 결과는 tasks 순서 그대로"""
+        max_workers = max_workers or GROUP_WORKERS
+        if max_workers <= 1 or len(tasks) < MIN_GROUPS_FOR_POOL:
+            return [_compute_group(self, records, task, logger) for task in tasks]
+
+        chunksize = max(1, len(tasks) // (max_workers * 4))
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp.get_context("spawn"),
+                                 initializer=_init_group_worker,
+                                 initargs=(records, logger.level_name, logger.focus_key)) as executor:
+            return list(executor.map(_run_group_worker, tasks, chunksize=chunksize))
+
+    def _merge_group_result(self, price_data: Dict, build_time: datetime) -> Dict:
+        """
+        그룹 결과를 새 캐시에 넣을 형태로 (빌드 시각 기록)
+        워커에서 돌아온 dict의 키 문자열을 intern해서 직렬 계산과 같은 객체를 공유 -> pickle 결과가 바이트 단위로 같음
+        """
+        price_data = {sys.intern(key): value for key, value in price_data.items()}
+        price_data['common_option_values'] = {
+            sys.intern(opt_name): values for opt_name, values in price_data['common_option_values'].items()
+        }
+        price_data['last_update'] = build_time
+        return price_data
+
+    def swap_cache(self, new_cache: Dict, last_update: Optional[datetime] = None):
+        """이미 만들어진 캐시 데이터로 즉시 교체 (파일을 다시 읽지 않음)"""
+        bracelet_indexes = self._compile_bracelet_indexes(new_cache)  # 교체 전에 미리 컴파일
+        self.cache = new_cache
+        self.bracelet_indexes = bracelet_indexes
+        self.last_update = last_update or datetime.now()
+
+        if self.debug:
+            print(f"Cache swapped in memory. Last update: {self.last_update}")
 
     def get_cache_key(self, grade: str, part: str, level: int, options: Dict[str, List[Tuple[str, float]]]) -> str:
         """캐시 키 생성 - exclusive 옵션만 사용"""
@@ -349,13 +617,13 @@ class MarketPriceCache:
         
         return dealer_key, support_key
 
-    def _classify_bracelet_pattern(self, item_data: Dict) -> Tuple[str, Dict]:
+    def _classify_bracelet_pattern(self, listing: BraceletListing) -> Tuple[str, Dict]:
         """팔찌 패턴 분류 및 키 생성"""
-        fixed_count = item_data['fixed_option_count']
-        extra_slots = item_data['extra_option_count']
-        combat_stats = [(stat, value) for stat, value in item_data['combat_stats']]
-        base_stats = [(stat, value) for stat, value in item_data['base_stats']]
-        special_effects = [(effect, value) for effect, value in item_data['special_effects']]
+        fixed_count = listing.fixed_option_count
+        extra_slots = listing.extra_option_count
+        combat_stats = listing.combat_stats
+        base_stats = listing.base_stats
+        special_effects = listing.special_effects
         
         # 디버깅을 위한 출력 추가
         if self.debug:
@@ -382,6 +650,7 @@ class MarketPriceCache:
                     {
                         "pattern": f"{stats[0][0]}+{stats[1][0]}",
                         "values": f"{stats[0][1]}+{stats[1][1]}",
+                        "numbers": (stats[0][1], stats[1][1]),
                         "extra_slots": f"부여{extra_slots}"
                     }
                 )
@@ -395,6 +664,7 @@ class MarketPriceCache:
                     {
                         "pattern": f"{combat[0]}+{base[0]}",
                         "values": f"{combat[1]}+{base[1]}",
+                        "numbers": (combat[1], base[1]),
                         "extra_slots": f"부여{extra_slots}"
                     }
                 )
@@ -411,6 +681,7 @@ class MarketPriceCache:
                         {
                             "pattern": combat[0],
                             "values": str(combat[1]),
+                            "numbers": (combat[1],),
                             "extra_slots": f"부여{extra_slots}"
                         }
                     )
@@ -423,6 +694,7 @@ class MarketPriceCache:
                         {
                             "pattern": combat[0],
                             "values": str(combat[1]),
+                            "numbers": (combat[1],),
                             "extra_slots": f"부여{extra_slots}"
                         }
                     )
@@ -437,6 +709,7 @@ class MarketPriceCache:
                 {
                     "pattern": combat[0],
                     "values": str(combat[1]),
+                    "numbers": (combat[1],),
                     "extra_slots": f"부여{extra_slots}"
                 }
             )
@@ -447,58 +720,51 @@ class MarketPriceCache:
 
     def _round_combat_stat(self, value: float) -> int:
         """전투특성 값을 기준값으로 내림"""
-        thresholds = [40, 50, 60, 70, 80, 90, 100, 110]
-        for threshold in thresholds:
-            if value < threshold:
-                return thresholds[max(0, thresholds.index(threshold) - 1)]
-        return thresholds[-1]
+        return int(round_to_thresholds(value, COMBAT_STAT_THRESHOLDS))
 
     def _round_base_stat(self, value: float) -> int:
         """기본스탯 값을 기준값으로 내림"""
-        thresholds = [6400, 8000, 9600, 11200, 12800, 14400]
-        for threshold in thresholds:
-            if value < threshold:
-                return thresholds[max(0, thresholds.index(threshold) - 1)]
-        return thresholds[-1]
-
-    def _calculate_common_option_values(self, filtered_items: List[PriceRecord], exclusive_key: str, role: str):
-        """각 Common 옵션 값의 추가 가치를 계산"""
+        return int(round_to_thresholds(value, BASE_STAT_THRESHOLDS))
+
+    def _calculate_common_option_values(self, filtered_items: List[PriceRecordRow], exclusive_key: str, role: str,
+                                        logger: CacheBuildLogger, window: str = DEFAULT_WINDOW,
+                                        explanation: Optional[Dict] = None):
+        """각 Common 옵션 값의 추가 가치를 계산 (explanation이 있으면 값별 표본 수/가치를 common_options에 기록)"""
         MIN_SAMPLES = 3
+        log_debug = logger.enabled("debug", exclusive_key)
         if len(filtered_items) < MIN_SAMPLES:
-            print(f"\nInsufficient samples for common option calculation: {len(filtered_items)} < {MIN_SAMPLES}")
+            if log_debug:
+                logger.debug("common_options_skipped", exclusive_key, window=window, role=role,
+                             samples=len(filtered_items), min_samples=MIN_SAMPLES)
             return {}
 
         # exclusive_key에서 정보 추출
         grade, part, level, *_ = exclusive_key.split(':')
         
         # 역할별 관련 옵션 정의
-        role_related_options = {
-            "dealer": ["깡공", "깡무공"],
-            "support": ["깡무공", "최생", "최마", "아군회복", "아군보호막"]
-        }
+        role_related_options = ROLE_COMMON_OPTIONS
 
         # base_items 계산 (common 옵션이 없는 아이템)
         base_items = [item for item in filtered_items 
                     if not any(opt.option_name in role_related_options[role] 
                             for opt in item.raw_options)]
 
-        if not base_items:
-            print("\nNo pure base items found, using filtered items for base price")
-            prices = [item.price for item in filtered_items]
-        else:
-            print(f"\nUsing {len(base_items)} pure base items")
-            prices = [item.price for item in base_items]
+        # base_items가 없으면 필터링된 아이템 전체로 base 가격 계산
+        prices = [item.price for item in (base_items or filtered_items)]
 
         sorted_prices = sorted(prices)
         base_price = sorted_prices[1] if len(sorted_prices) > 1 else sorted_prices[0]
-        print(f"Selected base price: {base_price:,}")
+        if log_debug:
+            logger.debug("common_options_base", exclusive_key, window=window, role=role,
+                         base_items=len(base_items), base_price=base_price)
+        if explanation is not None:
+            explanation["common_base_price"] = int(base_price)
+            explanation["common_options"] = []
 
         values = {}
         # 역할별 관련 옵션에 대해서만 계산
         for opt_name in role_related_options[role]:
             if opt_name in self.COMMON_OPTIONS:
-                print(f"\nProcessing option: {opt_name}")
-                
                 values[opt_name] = {}
                 for value in self.COMMON_OPTIONS[opt_name]:
                     matching_items = [item for item in filtered_items 
@@ -515,7 +781,15 @@ class MarketPriceCache:
                         
                         if additional_value > 0:
                             values[opt_name][value] = additional_value
-                            print(f"  {opt_name} {value}: +{additional_value:,} ({len(matching_items)} samples)")
+                        if log_debug:
+                            logger.debug("common_option", exclusive_key, window=window, role=role, option=opt_name,
+                                         value=value, samples=len(matching_items), additional_value=additional_value)
+                        if explanation is not None:
+                            explanation["common_options"].append({
+                                "option": opt_name, "value": value, "samples": len(matching_items),
+                                "price": int(min_price), "delta": int(additional_value),
+                                "used": additional_value > 0,
+                            })
 
         return values
                
@@ -559,140 +833,129 @@ class MarketPriceCache:
 
         return support_options
 
-    def _calculate_group_prices(self, items: List[PriceRecord], exclusive_key: str, role: str) -> Optional[Dict]:
-        """그룹의 가격 통계 계산"""
+    def _calculate_group_prices(self, items: List[PriceRecordRow], exclusive_key: str, role: str,
+                                window: str = DEFAULT_WINDOW, logger: Optional[CacheBuildLogger] = None,
+                                explanation: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        그룹의 가격 통계 계산 (items는 중복 제거된 스냅샷 행, 시간 순)
+        스냅샷 행만 사용하고 DB 접근 없음 -> 워커 프로세스에서도 실행 가능
+        explanation에 dict를 넘기면 계산 중간값(표본 id, 두 번째 최저가, 계수, 공통 옵션 가치)을 채움
+        """
         if not items:
             return None
-        print(f"\n=== Calculating Group Prices for {exclusive_key} ({role}) ===")
-        print(f"Total items in group: {len(items)}")
-
-        # 중복 제거
-        items = self._get_unique_items(items)
-        print(f"Total items after deduplication: {len(items)}")
+        logger = logger or CacheBuildLogger("off")
         
         # exclusive_key에서 정보 추출
         grade, part, level, *_ = exclusive_key.split(':')
 
-        with self.db.get_read_session() as session:
-            # 아이템들의 ID 목록
-            item_ids = [item.id for item in items]
-            
-            print("\nStarting item filtering:")
-            print(f"Initial item count: {len(item_ids)}")
-
-            query = session.query(PriceRecord).filter(
-                PriceRecord.id.in_(item_ids)
-            )
-
-            initial_count = query.count()
-            print(f"Items after initial filter: {initial_count}")
+        # 같은 exclusive 그룹의 다른 옵션들이 없는 아이템만 선택 (id 순)
+        filtered_items = sorted(items, key=lambda item: item.id)
+        # 로그 필드(남은 개수, 최저가/표준편차 등)는 그 레벨이 켜져 있을 때만 계산
+        log_debug = logger.enabled("debug", exclusive_key)
+        log_info = logger.enabled("info", exclusive_key)
+        remaining = {}
+        for group_role in ["dealer", "support"]:
+            for exc_opt in self.EXCLUSIVE_OPTIONS[part][group_role]:
+                # 현재 검색 중인 옵션은 건너뛰기
+                if exc_opt in exclusive_key:
+                    continue
+                # 다른 exclusive 옵션이 있는 아이템 제외
+                filtered_items = [item for item in filtered_items if exc_opt not in item.option_names]
+                if log_debug:
+                    remaining[exc_opt] = len(filtered_items)
+        if log_debug:
+            logger.debug("group_filter", exclusive_key, window=window, role=role, items=len(items),
+                         remaining_after_excluding=remaining)
+
+        role_related_options = ROLE_COMMON_OPTIONS
+
+        # 기본 가격 계산 (common 옵션 제외)
+        base_items = [item for item in items 
+                    if not any(opt.option_name in role_related_options[role] 
+                            for opt in item.raw_options)]
 
-            # 같은 exclusive 그룹의 다른 옵션들이 없는 아이템만 선택
-            for group_role in ["dealer", "support"]:
-                for exc_opt in self.EXCLUSIVE_OPTIONS[part][group_role]:
-                    # 현재 검색 중인 옵션은 건너뛰기
-                    if exc_opt in exclusive_key:
-                        continue
-                    # 다른 exclusive 옵션이 있는 아이템 제외
-                    subq = (session.query(ItemOption.price_record_id)
-                        .filter(ItemOption.option_name == exc_opt)
-                        .scalar_subquery())
+        prices = []
+        qualities = []
+        trade_counts = []
 
-                    query = query.filter(~PriceRecord.id.in_(subq))
+        # base_items가 있으면 그것만 사용, 없으면 전체 사용
+        target_items = base_items if base_items else filtered_items
+        for item in target_items:
+            prices.append(item.price)
+            qualities.append(item.quality)
+            trade_counts.append(item.trade_count)
 
-                    count_after = query.count()
-                    print(f"Items after excluding {exc_opt}: {count_after}")
+        # 첫 번째 단계: 두 번째로 낮은 가격을 base 가격으로 설정
+        prices = np.array(prices)
+        sorted_prices = np.sort(prices)
 
-            filtered_items = query.all()
-            print(f"\nItems after exclusive option filtering: {len(filtered_items)}")
+        # base 가격 계산 (두 번째로 낮은 가격)
+        base_price = sorted_prices[1] if len(sorted_prices) > 1 else sorted_prices[0]
 
-            role_related_options = {
-                "dealer": ["깡공", "깡무공"],
-                "support": ["깡무공", "최생", "최마", "아군회복", "아군보호막"]
-            }
+        # 두 번째 단계: base 가격의 일정 배수 초과 제외
+        MAX_PRICE_MULTIPLIER = 5.0
+        mask = prices <= base_price * MAX_PRICE_MULTIPLIER
+        filtered_prices = prices[mask]
+        filtered_qualities = np.array(qualities)[mask]
+        filtered_trade_counts = np.array(trade_counts)[mask]
+
+        if log_debug:
+            logger.debug("group_samples", exclusive_key, window=window, role=role,
+                         used_base_items=bool(base_items), lowest_prices=sorted_prices[:5].tolist(),
+                         sample_base_items=[(item.id, item.price, item.quality, item.trade_count)
+                                            for item in base_items[:3]],
+                         quality_range=[int(np.min(filtered_qualities)), int(np.max(filtered_qualities))],
+                         trade_count_range=[int(np.min(filtered_trade_counts)), int(np.max(filtered_trade_counts))])
+
+        if explanation is not None:
+            sample_order = np.argsort(filtered_prices, kind='stable')[:EXPLANATION_SAMPLE_IDS]
+            sample_items = [item for item, keep in zip(target_items, mask) if keep]
+            explanation.update({
+                "role": role, "items": len(items), "filtered": len(filtered_items), "base_items": len(base_items),
+                "used_base_items": bool(base_items), "second_lowest": int(base_price),
+                "price_cap": float(base_price * MAX_PRICE_MULTIPLIER), "samples": len(filtered_prices),
+                "sample_ids": [sample_items[i].id for i in sample_order],
+                "sample_prices": [int(filtered_prices[i]) for i in sample_order],
+            })
+
+        if len(filtered_prices) < 3:
+            if explanation is not None:
+                explanation["skipped"] = "insufficient_samples"
+            if log_info:
+                logger.info("group_skipped", exclusive_key, window=window, role=role, reason="insufficient_samples",
+                            items=len(items), filtered=len(filtered_items), samples=len(filtered_prices))
+            return None
 
-            # 기본 가격 계산 (common 옵션 제외)
-            base_items = [item for item in items 
-                        if not any(opt.option_name in role_related_options[role] 
-                                for opt in item.raw_options)]
-        
-            print(f"\nBase items (without common options): {len(base_items)}")
-            if base_items:
-                print("Sample base items:")
-                for item in base_items[:3]:
-                    print(f"- Price: {item.price:,}, Quality: {item.quality}, "
-                        f"Trade Count: {item.trade_count}")
-        
-            prices = []
-            qualities = []
-            trade_counts = []
-
-            # base_items가 있으면 그것만 사용, 없으면 전체 사용
-            target_items = base_items if base_items else filtered_items
-            if not base_items:
-                print("\nNo pure base items found, using all items for base calculation")
-        
-            for item in target_items:
-                prices.append(item.price)
-                qualities.append(item.quality)
-                trade_counts.append(item.trade_count)
-
-            # 첫 번째 단계: 두 번째로 낮은 가격을 base 가격으로 설정
-            prices = np.array(prices)
-            sorted_prices = np.sort(prices)
-        
-            print(f"\nStep 1 - Before filtering:")
-            print(f"- Initial price range: {np.min(prices):,} ~ {np.max(prices):,}")
-            print(f"- Lowest prices (sorted): {sorted_prices[:5]}")  # 가장 낮은 5개 가격 출력
-        
-            # base 가격 계산 (두 번째로 낮은 가격)
-            base_price = sorted_prices[1] if len(sorted_prices) > 1 else sorted_prices[0]
-            print(f"\nBase price calculation:")
-            print(f"- Second lowest price selected as base: {base_price:,}")
-
-            # 두 번째 단계: base 가격의 일정 배수 초과 제외
-            MAX_PRICE_MULTIPLIER = 5.0
-            mask = prices <= base_price * MAX_PRICE_MULTIPLIER
-            filtered_prices = prices[mask]
-            filtered_qualities = np.array(qualities)[mask]
-            filtered_trade_counts = np.array(trade_counts)[mask]
-
-            print(f"\nStep 2 - After removing prices > {base_price * MAX_PRICE_MULTIPLIER:,.0f} (base_price * {MAX_PRICE_MULTIPLIER}):")
-            print(f"- Final remaining samples: {len(filtered_prices)}/{len(prices)}")
-            print(f"- Final price range: {np.min(filtered_prices):,} ~ {np.max(filtered_prices):,}")
-            print(f"- Quality range: {np.min(filtered_qualities)} ~ {np.max(filtered_qualities)}")
-            print(f"- Trade count range: {np.min(filtered_trade_counts)} ~ {np.max(filtered_trade_counts)}")
-    
-            if len(filtered_prices) < 3:
-                print("\nInsufficient samples after filtering")
-                return None
-
-            # 계수 계산
-            quality_coefficient = self._calculate_quality_coefficient(filtered_prices, filtered_qualities)
-            trade_coefficient = self._calculate_trade_coefficient(filtered_prices, filtered_trade_counts)
-
-            print("\nCalculated coefficients:")
-            print(f"- Quality coefficient: {quality_coefficient:,.2f}")
-            print(f"- Trade count coefficient: {trade_coefficient:,.2f}")
-
-            # Common 옵션 값 계산
-            common_option_values = self._calculate_common_option_values(filtered_items, exclusive_key, role)
-
-            print("\nFinal price statistics:")
-            print(f"- Base price: {np.min(filtered_prices):,}")
-            print(f"- Standard deviation: {np.std(filtered_prices):,.2f}")
-            print(f"- Sample count: {len(filtered_prices)}")
-
-            return {
-                'base_price': np.min(filtered_prices),
-                'price_std': np.std(filtered_prices),
-                'quality_coefficient': max(0, quality_coefficient),  # 품질 계수는 항상 양수
-                'trade_count_coefficient': min(0, trade_coefficient),  # 거래 횟수 계수는 항상 음수
-                'common_option_values': common_option_values,
-                'sample_count': len(filtered_prices),
-                'total_sample_count': len(items),
-                'last_update': datetime.now()
-            }
+        # 계수 계산
+        quality_coefficient = self._calculate_quality_coefficient(filtered_prices, filtered_qualities)
+        trade_coefficient = self._calculate_trade_coefficient(filtered_prices, filtered_trade_counts)
+
+        # Common 옵션 값 계산
+        common_option_values = self._calculate_common_option_values(filtered_items, exclusive_key, role,
+                                                                    logger, window, explanation)
+        if explanation is not None:
+            explanation.update({
+                "min_price": int(np.min(filtered_prices)), "price_std": float(np.std(filtered_prices)),
+                "quality_coefficient": float(quality_coefficient), "trade_count_coefficient": float(trade_coefficient),
+            })
+
+        if log_info:
+            logger.info("group_price", exclusive_key, window=window, role=role, items=len(items),
+                        filtered=len(filtered_items), base_items=len(base_items), second_lowest=base_price,
+                        price_cap=base_price * MAX_PRICE_MULTIPLIER, samples=len(filtered_prices),
+                        min_price=np.min(filtered_prices), price_std=round(float(np.std(filtered_prices)), 2),
+                        quality_coefficient=round(float(quality_coefficient), 2),
+                        trade_count_coefficient=round(float(trade_coefficient), 2))
+
+        return {
+            'base_price': np.min(filtered_prices),
+            'price_std': np.std(filtered_prices),
+            'quality_coefficient': max(0, quality_coefficient),  # 품질 계수는 항상 양수
+            'trade_count_coefficient': min(0, trade_coefficient),  # 거래 횟수 계수는 항상 음수
+            'common_option_values': common_option_values,
+            'sample_count': len(filtered_prices),
+            'total_sample_count': len(items),
+        }
 
     def _calculate_quality_coefficient(self, prices, qualities) -> float:
         """품질에 따른 가격 계수 계산"""
@@ -708,109 +971,182 @@ class MarketPriceCache:
         slope, _ = np.polyfit(trade_counts, prices, 1)
         return slope
     
-    def _calculate_bracelet_prices(self, grade: str) -> Dict:
-        """팔찌 패턴별 가격 계산"""
+    def _calculate_bracelet_prices(self, grade: str, cutoffs: Dict[str, datetime],
+                                   logger: Optional[CacheBuildLogger] = None,
+                                   explanations: Optional[List[Dict]] = None) -> Dict[str, Dict]:
+        """
+        팔찌 패턴별 가격 계산 (패턴별 두 번째 최저가, 표본 2개 이상). 반환값: {기간: 패턴 타입별 가격}
+        가장 넓은 기간을 한 번 읽고 중복 제거/분류도 한 번만 한 뒤 기간마다 시각으로 잘라서 계산
+        """
+        logger = logger or CacheBuildLogger("off")
         try:
-            print(f"\n=== Calculating Bracelet Prices for {grade} Grade ===")
-            
             with self.db.get_read_session() as session:
-                recent_time = datetime.now() - timedelta(hours=24)
-                
-                records = session.query(BraceletPriceRecord).filter(
-                    BraceletPriceRecord.timestamp >= recent_time,
-                    BraceletPriceRecord.grade == grade
+                # 비정규화 테이블에서 팔찌 1개 = 1행, ORM 객체 없이 컬럼 튜플로 읽음
+                rows = session.execute(
+                    select(*[getattr(BraceletFlatRecord, column) for column in BRACELET_FLAT_COLUMNS]).where(
+                        BraceletFlatRecord.timestamp >= min(cutoffs.values()),
+                        BraceletFlatRecord.grade == grade
+                    ).order_by(BraceletFlatRecord.timestamp, BraceletFlatRecord.id)
                 ).all()
 
-                print(f"Found {len(records)} records in last 24 hours before deduplication")
-                
-                # 중복 제거
-                records = self._get_unique_items(records)
-                print(f"Records after deduplication: {len(records)}")
-
-                pattern_prices = {
-                    "전특2": {},
-                    "전특1+기본": {},
-                    "전특1+공이속": {},
-                    "전특1+잡옵": {},
-                    "전특1": {}
-                }
-
-                # 패턴별 카운트 추가
-                pattern_counts = {k: 0 for k in pattern_prices.keys()}
-
-                for record in records:
-                    session.refresh(record)
-                    
-                    item_data = {
-                        'fixed_option_count': record.fixed_option_count,
-                        'extra_option_count': record.extra_option_count,
-                        'combat_stats': [(stat.stat_type, stat.value) for stat in record.combat_stats],
-                        'base_stats': [(stat.stat_type, stat.value) for stat in record.base_stats],
-                        'special_effects': [(effect.effect_type, effect.value) for effect in record.special_effects]
-                    }
-
-                    # 디버깅을 위한 출력 추가
-                    print("\nProcessing record:")
-                    print(f"Fixed options: {record.fixed_option_count}")
-                    print(f"Extra options: {record.extra_option_count}")
-                    print(f"Combat stats: {item_data['combat_stats']}")
-                    print(f"Base stats: {item_data['base_stats']}")
-                    print(f"Special effects: {item_data['special_effects']}")
-
-                    pattern_info = self._classify_bracelet_pattern(item_data)
-                    if not pattern_info:
-                        print("No pattern found for this record")
-                        continue
-
-                    pattern_type, details = pattern_info
-                    pattern_counts[pattern_type] += 1  # 패턴 카운트 증가
-                    
-                    key = (details['pattern'], details['values'], details['extra_slots'])
-                    
-                    if pattern_type not in pattern_prices:
-                        pattern_prices[pattern_type] = {}
-                    
-                    if key not in pattern_prices[pattern_type]:
-                        pattern_prices[pattern_type][key] = []
-                    
-                    pattern_prices[pattern_type][key].append(record.price)
+            # 중복 제거 (같은 매물은 가장 최근 것만 남기므로 기간별로 잘라도 결과가 같음)
+            raw_count = len(rows)
+            rows = self._get_unique_bracelet_rows(rows)
+            logger.info("bracelet_rows", grade=grade, rows=raw_count, unique=len(rows))
 
-                # 패턴별 통계 출력
-                print("\nPattern counts:")
-                for pattern_type, count in pattern_counts.items():
-                    print(f"{pattern_type}: {count}")
+            arrays = self._bracelet_arrays(rows)
+            classified = self._classify_bracelet_batch(arrays)
 
-                # 최종 가격 계산
-                result = {}
-                for pattern_type, patterns in pattern_prices.items():
-                    print(f"\nProcessing {pattern_type} patterns:")
-                        
-                    result[pattern_type] = {}
-                    for key, prices in patterns.items():
-                        if len(prices) >= 2:
-                            sorted_prices = sorted(prices)
-                            selected_price = sorted_prices[1]
-                            
-                            print(f"\n  Pattern {key}:")
-                            print(f"  - Total samples: {len(prices)}")
-                            print(f"  - Price range: {min(prices):,} ~ {max(prices):,}")
-                            print(f"  - Selected price: {selected_price:,}")
-                            
-                            result[pattern_type][key] = selected_price
-
-                return result
+            results = {}
+            for window, cutoff in cutoffs.items():
+                selected = arrays["timestamp"] >= np.datetime64(cutoff)
+                results[window] = self._bracelet_second_prices(classified, selected, logger, grade, window,
+                                                               explanations)
+                logger.info("bracelet_window", grade=grade, window=window, records=int(selected.sum()),
+                            priced={pattern_type: len(prices) for pattern_type, prices in results[window].items()})
+            return results
 
         except Exception as e:
             print(f"Error calculating bracelet prices: {e}")
             if self.debug:
                 import traceback
                 traceback.print_exc()
-            return {}
+            return {window: {} for window in cutoffs}
+
+    def _bracelet_arrays(self, rows: List[tuple]) -> Dict[str, np.ndarray]:
+        """BRACELET_FLAT_COLUMNS 튜플 목록 -> 분류에 필요한 컬럼 배열 (빈 슬롯은 이름 "", 값 0)"""
+        columns = dict(zip(BRACELET_FLAT_COLUMNS, zip(*rows))) if rows else \
+            {column: () for column in BRACELET_FLAT_COLUMNS}
+
+        def names(column):
+            return np.array([name or "" for name in columns[column]], dtype=str)
+
+        def values(column):
+            return np.array([value or 0 for value in columns[column]], dtype=float)
+
+        combat_stat_1, combat_stat_2 = names("combat_stat_1"), names("combat_stat_2")
+        has_speed = np.zeros(len(rows), dtype=bool)
+        for i in (1, 2, 3):
+            has_speed |= np.char.strip(names(f"special_effect_{i}")) == SPEED_EFFECT
+
+        return {
+            "fixed": np.array(columns["fixed_option_count"], dtype=np.int64),
+            "extra": np.array(columns["extra_option_count"], dtype=np.int64),
+            "combat_count": (combat_stat_1 != "").astype(np.int64) + (combat_stat_2 != ""),
+            "combat_stat_1": combat_stat_1,
+            "combat_value_1": values("combat_value_1"),
+            "combat_stat_2": combat_stat_2,
+            "combat_value_2": values("combat_value_2"),
+            "base_stat": names("base_stat"),
+            "base_value": values("base_value"),
+            "has_speed": has_speed,
+            "price": np.array(columns["price"], dtype=np.int64),
+            "timestamp": np.array(columns["timestamp"], dtype="datetime64[us]"),
+            "id": np.array(columns["bracelet_id"], dtype=np.int64),
+        }
 
-    def get_bracelet_price(self, grade: str, item_data: Dict) -> Optional[int]:
-        """팔찌 가격 조회"""
-        pattern_info = self._classify_bracelet_pattern(item_data)
-        # print(f"찾아진 패턴 for item {item_data}: {pattern_info}")
+    def _classify_bracelet_batch(self, arrays: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        _classify_bracelet_pattern의 배열 버전
+        - type: BRACELET_PATTERN_TYPES 인덱스 (분류 안 되면 -1)
+        - name_1/name_2, value_1/value_2: 패턴 키의 이름/구간 값 (값이 하나인 패턴은 name_2 "", value_2 0)
+        """
+        fixed, combat_count = arrays["fixed"], arrays["combat_count"]
+        has_base = arrays["base_stat"] != ""
+
+        single = combat_count == 1
+        conditions = [
+            (fixed == 2) & (combat_count == 2),                                   # 전특2
+            (fixed == 2) & single & has_base,                                     # 전특1+기본
+            (fixed == 2) & single & ~has_base & arrays["has_speed"],              # 전특1+공이속
+            (fixed == 2) & single & ~has_base & ~arrays["has_speed"],             # 전특1+잡옵
+            (fixed == 1) & single,                                                # 전특1
+        ]
+        pattern_type = np.select(conditions, np.arange(len(conditions)), default=-1)
+
+        combat_1 = round_to_thresholds(arrays["combat_value_1"], COMBAT_STAT_THRESHOLDS)
+        combat_2 = round_to_thresholds(arrays["combat_value_2"], COMBAT_STAT_THRESHOLDS)
+        base = round_to_thresholds(arrays["base_value"], BASE_STAT_THRESHOLDS)
+
+        # 전특2는 스탯명 순서로 정렬
+        two_combat = pattern_type == 0
+        swap = two_combat & (arrays["combat_stat_2"] < arrays["combat_stat_1"])
+        name_1 = np.where(swap, arrays["combat_stat_2"], arrays["combat_stat_1"])
+        value_1 = np.where(swap, combat_2, combat_1)
+        with_base = pattern_type == 1
+        name_2 = np.where(two_combat, np.where(swap, arrays["combat_stat_1"], arrays["combat_stat_2"]),
+                          np.where(with_base, arrays["base_stat"], ""))
+        value_2 = np.where(two_combat, np.where(swap, combat_1, combat_2), np.where(with_base, base, 0))
+
+        return {"type": pattern_type, "name_1": name_1, "name_2": name_2,
+                "value_1": value_1, "value_2": value_2, "extra": arrays["extra"], "price": arrays["price"],
+                "id": arrays["id"]}
+
+    def _bracelet_second_prices(self, classified: Dict[str, np.ndarray], selected: np.ndarray,
+                                logger: Optional[CacheBuildLogger] = None, grade: str = "",
+                                window: str = DEFAULT_WINDOW,
+                                explanations: Optional[List[Dict]] = None) -> Dict[str, Dict]:
+        """
+        선택된 매물의 분류 결과를 키별로 묶어서 두 번째 최저가 계산 (정렬 한 번, 키는 처음 나온 순서 유지)
+        패턴별 debug 기록/가격 설명 키는 bracelet_pattern_label (표본 1개라 가격이 없는 패턴도 설명은 남김)
+        """
+        result = {pattern_type: {} for pattern_type in BRACELET_PATTERN_TYPES}
+        valid = np.flatnonzero((classified["type"] >= 0) & selected)
+        if not len(valid):
+            return result
+
+        names, name_codes = np.unique(np.concatenate([classified["name_1"][valid], classified["name_2"][valid]]),
+                                      return_inverse=True)
+        keys = np.stack([classified["type"][valid], name_codes[:len(valid)], name_codes[len(valid):],
+                         classified["value_1"][valid], classified["value_2"][valid], classified["extra"][valid]])
+        prices = classified["price"][valid]
+        ids = classified["id"][valid]
+
+        order = np.lexsort((prices,) + tuple(keys[::-1]))
+        sorted_keys = keys[:, order]
+        starts = np.flatnonzero(np.r_[True, (sorted_keys[:, 1:] != sorted_keys[:, :-1]).any(axis=0)])
+        counts = np.diff(np.r_[starts, len(order)])
+        first_seen = np.minimum.reduceat(order, starts)
+
+        pattern_debug = logger is not None and logger.wants_debug
+        for group in np.argsort(first_seen, kind='stable'):
+            if counts[group] < 2 and not pattern_debug and explanations is None:
+                continue
+            start = starts[group]
+            type_id, code_1, code_2, value_1, value_2, extra = sorted_keys[:, start]
+            if names[code_2]:
+                key = (f"{names[code_1]}+{names[code_2]}", f"{value_1}+{value_2}", f"부여{extra}")
+            else:
+                key = (str(names[code_1]), str(value_1), f"부여{extra}")
+            pattern_type = BRACELET_PATTERN_TYPES[type_id]
+            price = int(prices[order[start + 1]]) if counts[group] > 1 else None
+            if pattern_debug or explanations is not None:
+                label = bracelet_pattern_label(grade, pattern_type, key)
+                members = order[start:start + counts[group]]
+                if pattern_debug and logger.enabled("debug", label):
+                    logger.debug("bracelet_pattern", label, window=window, samples=int(counts[group]),
+                                 lowest_prices=prices[members[:5]].tolist(), price=price)
+                if explanations is not None:
+                    shown = members[:EXPLANATION_SAMPLE_IDS]
+                    explanations.append({"window": window, "kind": "bracelet", "cache_key": label, "price": price,
+                                         "sample_count": int(counts[group]), "details": {
+                                             "samples": int(counts[group]), "second_lowest": price,
+                                             "sample_ids": ids[shown].tolist(), "sample_prices": prices[shown].tolist(),
+                                         }})
+            if price is None:
+                continue
+            result[pattern_type][key] = price
+        return result
+
+    def get_bracelet_price(self, grade: str, listing: BraceletListing, window: str = DEFAULT_WINDOW) -> Optional[int]:
+        """팔찌 가격 조회 (window: PRICE_WINDOWS의 기간)"""
+        match = self.match_bracelet_price(grade, listing, window)
+        return match[2] if match else None
+
+    def match_bracelet_price(self, grade: str, listing: BraceletListing,
+                             window: str = DEFAULT_WINDOW) -> Optional[Tuple[str, Tuple[str, str, str], int]]:
+        """팔찌 가격을 찾은 캐시 항목. 반환값: (패턴 타입, 캐시 키, 가격) - 유사 패턴이면 찾은 패턴의 키"""
+        pattern_info = self._classify_bracelet_pattern(listing)
         if not pattern_info:
             return None
 
@@ -821,13 +1157,14 @@ class MarketPriceCache:
         cache_key = f"bracelet_{grade}"
 
         # 1. 기본적인 캐시 존재 여부 확인
-        if cache_key not in self.cache:
+        view = self._window_view(window)
+        if view is None or cache_key not in view:
             if self.debug:
-                print(f"No cache data found for {cache_key}")
+                print(f"No cache data found for {cache_key} ({window})")
             return None
 
         # 2. 해당 패턴 타입의 가격 데이터 가져오기
-        pattern_prices = self.cache[cache_key].get(pattern_type, {})
+        pattern_prices = view[cache_key].get(pattern_type, {})
 
         # 3. 정확한 매칭 시도
         if key in pattern_prices:
@@ -835,106 +1172,77 @@ class MarketPriceCache:
                 print(f"\nExact pattern match found:")
                 print(f"Pattern: {pattern_type} {key}")
                 print(f"Price: {pattern_prices[key]:,}")
-            return pattern_prices[key]
-
-        # 4. 정확한 매칭이 없는 경우 비슷한 패턴 찾기
-        # (기존 비슷한 패턴 찾기 로직 유지)
-        for cached_key, price in pattern_prices.items():
-            cached_pattern, cached_values, cached_extra = cached_key
-            if (cached_pattern == details['pattern'] and 
-                cached_extra == details['extra_slots']):
-                if self._is_similar_values(cached_values, details['values'], pattern_type):
-                    if self.debug:
-                        print(f"\nSimilar pattern match found:")
-                        print(f"Original pattern: {pattern_type} {key}")
-                        print(f"Matched pattern: {pattern_type} {cached_key}")
-                        print(f"Price: {price:,}")
-                    return price
+            return pattern_type, key, pattern_prices[key]
+
+        # 4. 정확한 매칭이 없는 경우 허용 범위 안에서 가장 가까운 패턴 찾기 (컴파일된 인덱스, O(log n))
+        match = self.bracelet_indexes[window].lookup(grade, pattern_type, details['pattern'],
+                                           details['extra_slots'], details['numbers'])
+        if match:
+            matched_values, price = match
+            if self.debug:
+                print(f"\nSimilar pattern match found:")
+                print(f"Original pattern: {pattern_type} {key}")
+                print(f"Matched values: {matched_values}")
+                print(f"Price: {price:,}")
+            return pattern_type, (details['pattern'], matched_values, details['extra_slots']), price
 
         if self.debug:
             print(f"No matching pattern found for {pattern_type} {key}")
 
         return None
 
-    def _is_similar_values(self, cached_values: str, target_values: str, pattern_type: str = None) -> bool:
-        """
-        값들이 충분히 비슷한지 확인
-        전투특성은 10, 기본스탯은 1600 단위로 비교
-        """
-        try:
-            if self.debug:
-                print(f"\nComparing values for pattern {pattern_type}:")
-                print(f"Cached values: {cached_values}")
-                print(f"Target values: {target_values}")
-                
-            # 전특1+기본 패턴의 경우
-            if pattern_type == "전특1+기본":
-                if '+' not in cached_values or '+' not in target_values:
-                    return False
-                    
-                cached_v1, cached_v2 = map(float, cached_values.split('+'))
-                target_v1, target_v2 = map(float, target_values.split('+'))
-                
-                # 첫 번째 값은 전투특성(10), 두 번째 값은 기본스탯(1600)
-                combat_similar = abs(cached_v1 - target_v1) <= 10
-                base_similar = abs(cached_v2 - target_v2) <= 1600
-                
-                if self.debug:
-                    print(f"Combat stat comparison: {cached_v1} vs {target_v1} (diff: {abs(cached_v1 - target_v1)})")
-                    print(f"Base stat comparison: {cached_v2} vs {target_v2} (diff: {abs(cached_v2 - target_v2)})")
-                    print(f"Results - Combat: {combat_similar}, Base: {base_similar}")
-                
-                return combat_similar and base_similar
-                
-            # 그 외 패턴들 (전투특성만 있는 경우)
-            elif '+' in cached_values and '+' in target_values:
-                cached_v1, cached_v2 = map(float, cached_values.split('+'))
-                target_v1, target_v2 = map(float, target_values.split('+'))
-                return (abs(cached_v1 - target_v1) <= 10 and 
-                    abs(cached_v2 - target_v2) <= 10)
-            else:
-                cached_v = float(cached_values)
-                target_v = float(target_values)
-                return abs(cached_v - target_v) <= 10
-                
-        except Exception as e:
-            if self.debug:
-                print(f"Error comparing values: {e}")
-            return False
-
-    def _get_unique_items(self, items):
-        """완전히 동일한 매물은 가장 최근 것만 남김"""
+    def _get_unique_bracelet_rows(self, rows: List[tuple]) -> List[tuple]:
+        """_get_unique_items와 같은 기준(등급, 이름, 가격, 거래 횟수, 전체 스탯)으로 팔찌 행 중복 제거"""
+        unique_rows = {}
+        for row in rows:
+            stats = tuple(sorted(
+                (row[name_index], row[name_index + 1]) for name_index in BRACELET_STAT_INDEXES
+                if row[name_index] is not None
+            ))
+            key = (row.grade, row.name, row.price, row.trade_count, stats)
+            if key not in unique_rows or row.timestamp > unique_rows[key].timestamp:
+                unique_rows[key] = row
+        return list(unique_rows.values())
+
+    def _unique_item_indices(self, records: List[PriceRecordRow], indices: List[int]) -> List[int]:
+        """완전히 동일한 매물은 가장 최근 것만 남김. 반환값: 남은 스냅샷 인덱스 (스냅샷 순)"""
         unique_items = {}
-        for item in items:
+        for index in indices:
+            item = records[index]
             # 매물의 고유 특성을 키로 사용
-            if "팔찌" in item.name:
-                combat_stats = [(stat.stat_type, stat.value) for stat in item.combat_stats]
-                base_stats = [(stat.stat_type, stat.value)
-                              for stat in item.base_stats]
-                special_effects = [(effect.effect_type, effect.value)
-                                   for effect in item.special_effects]
-                option_tuple = tuple(
-                    sorted(combat_stats+base_stats+special_effects))
-            else:
-                option_tuple = tuple(sorted(
-                    (opt.option_name, opt.option_value, opt.is_percentage)
-                    for opt in item.raw_options 
-                    if opt.option_name not in ["깨달음", "도약"]
-                ))
-            
-            key = (
-                item.grade,
-                item.name, 
-                item.part if hasattr(item, 'part') else None,  # 팔찌는 part 속성이 없음
-                item.level if hasattr(item, 'level') else None,  # 팔찌는 level 속성이 없음
-                item.quality if hasattr(item, 'quality') else None,  # 팔찌는 quality 속성이 없음
-                item.price,
-                item.trade_count,
-                option_tuple
-            )
-            
+            option_tuple = tuple(sorted(
+                (opt.option_name, opt.option_value, opt.is_percentage)
+                for opt in item.raw_options 
+                if opt.option_name not in ["깨달음", "도약"]
+            ))
+            key = (item.grade, item.name, item.part, item.level, item.quality,
+                   item.price, item.trade_count, option_tuple)
+
             # 이미 있는 매물이면 타임스탬프 비교해서 최신 것만 유지
-            if key not in unique_items or item.timestamp > unique_items[key].timestamp:
-                unique_items[key] = item
+            if key not in unique_items or item.timestamp > records[unique_items[key]].timestamp:
+                unique_items[key] = index
         
-        return list(unique_items.values())
\ No newline at end of file
+        return sorted(unique_items.values())
+
+def build_market_cache() -> Tuple[Optional[Dict], Optional[datetime]]:
+    """
+    별도 프로세스에서 캐시를 재빌드하고 결과를 그대로 돌려줌 (오케스트레이터용)
+    파일 캐시도 함께 갱신되므로 대시보드 등 다른 프로세스는 기존처럼 파일을 읽으면 됨
+    """
+    price_cache = MarketPriceCache(DatabaseManager())
+    if not price_cache.update_cache():
+        return None, None
+    return price_cache.cache, price_cache.last_update
+
+def main():
+    parser = argparse.ArgumentParser(description="시세 캐시 재빌드")
+    parser.add_argument("--log-level", choices=list(LOG_LEVELS), default=DEFAULT_LOG_LEVEL,
+                        help="빌드 로그 레벨 (off면 로그 파일 없음)")
+    parser.add_argument("--focus-key", help="이 키만 debug까지 기록 (예: \"고대:목걸이:3:base\", \"고대|전특2|치명+특화|80+90|부여2\")")
+    parser.add_argument("--workers", type=int, help="그룹 계산 프로세스 수 (1이면 직렬)")
+    args = parser.parse_args()
+
+    MarketPriceCache(DatabaseManager()).update_cache(args.log_level, args.focus_key, args.workers)
+
+if __name__ == "__main__":
+    main()
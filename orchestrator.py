@@ -0,0 +1,163 @@
+from typing import List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import multiprocessing as mp
+import asyncio
+import time
+from async_api_client import TokenBatchRequester
+from async_price_collector import AsyncPriceCollector, COLLECTION_INTERVAL_MINUTES
+from async_item_checker import AsyncMarketMonitor
+from market_price_cache import MarketPriceCache, build_market_cache
+from item_evaluator import ItemEvaluator
+from async_discord_manager import AsyncAlertDelivery, AsyncAlertTracker
+from enhancement_sim_with_auction import EnhancementAnalyzer, run_batch_analysis
+from enhancement_policy import EnhancementPolicySolver
+from price_rollup import backfill_all
+from price_retention import compact_old_cycles
+from price_miss_tracker import PriceMissTracker
+from database import DatabaseManager
+from config import config
+import os
+
+RETENTION_HOUR = 5  # 매일 이 시각에 오래된 상세 데이터 정리
+# 연마 정책표/배치 분석 갱신 간격 (캐시는 30분마다 재빌드되지만 분석은 수집 사이클마다 한 번이면 충분)
+ANALYSIS_INTERVAL_MINUTES = COLLECTION_INTERVAL_MINUTES
+
+class MarketOrchestrator:
+    """
+    수집 스케줄, 시장 스캔, 캐시 재빌드, 알림 전송/추적을 하나의 asyncio 런타임에서 실행
+    - aiohttp 세션과 토큰 풀은 TokenBatchRequester 하나를 공유
+    - 캐시 재빌드는 워커 프로세스에서 돌리고, 결과를 평가기 캐시에 메모리로 바로 교체
+      (ItemEvaluator의 60초 파일 폴링을 기다릴 필요 없음)
+    """
+    def __init__(self, db_manager: DatabaseManager, tokens: List[str], debug: bool = False):
+        self.db = db_manager
+        self.debug = debug
+        self.requester = TokenBatchRequester(tokens)
+
+        # 알림 전송/추적은 스캔 루프와 분리된 태스크에서 처리
+        self.delivery = AsyncAlertDelivery(os.getenv("WEBHOOK1"), os.getenv("WEBHOOK2"))
+        self.tracker = AsyncAlertTracker(self.delivery, self.requester)
+        self.delivery.on_posted = self.tracker.track
+
+        # 스캐너가 평가하다 캐시에 가격이 없던 키 -> 수집기가 남는 예산으로 추가 검색
+        self.miss_tracker = PriceMissTracker()
+        self.price_cache = MarketPriceCache(db_manager, debug=debug)
+        self.evaluator = ItemEvaluator(self.price_cache, debug=debug, watch_cache_file=False,
+                                       miss_tracker=self.miss_tracker)
+
+        # 연마 판매/계속 정책표 (캐시가 바뀔 때마다 새로 계산)
+        self.policy_solver = EnhancementPolicySolver(EnhancementAnalyzer(db_manager, evaluator=self.evaluator))
+
+        self.collector = AsyncPriceCollector(
+            db_manager, requester=self.requester, on_cycle_complete=self.rebuild_cache,
+            miss_tracker=self.miss_tracker)
+        self.monitor = AsyncMarketMonitor(
+            db_manager, self.delivery, debug=debug, evaluator=self.evaluator, requester=self.requester,
+            collection_planner=self.collector.planner)
+
+        # 재빌드는 CPU를 오래 쓰므로 별도 프로세스에서 실행 (fork 시 열린 세션/DB 커넥션이 복제되지 않게 spawn 사용)
+        self._rebuild_executor = ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn"))
+        self._rebuild_lock: Optional[asyncio.Lock] = None
+        self._analysis_lock: Optional[asyncio.Lock] = None
+        self._last_analysis: Optional[float] = None   # 마지막 분석 갱신 시작 시각 (monotonic)
+
+    async def rebuild_cache(self):
+        """워커 프로세스에서 캐시를 재빌드한 뒤 평가기 캐시를 즉시 교체"""
+        if self._rebuild_lock is None:
+            self._rebuild_lock = asyncio.Lock()
+
+        async with self._rebuild_lock:
+            start_time = datetime.now()
+            loop = asyncio.get_running_loop()
+            try:
+                new_cache, last_update = await loop.run_in_executor(self._rebuild_executor, build_market_cache)
+            except Exception as e:
+                print(f"Error rebuilding cache in worker: {e}")
+                return
+
+            if new_cache is None:
+                print("Cache rebuild failed, keeping previous cache")
+                return
+
+            self.price_cache.swap_cache(new_cache, last_update)
+            self.evaluator.last_check_time = last_update
+            print(f"Cache swapped at {datetime.now()} (rebuild took {(datetime.now() - start_time).total_seconds():.2f} seconds)")
+
+        # 정책/배치 분석은 재빌드 잠금 밖에서 (다음 재빌드가 분석이 끝나기를 기다리지 않게), ANALYSIS_INTERVAL_MINUTES마다
+        now = time.monotonic()
+        if self._last_analysis is not None and now - self._last_analysis < ANALYSIS_INTERVAL_MINUTES * 60:
+            return
+        self._last_analysis = now
+        await self.refresh_analysis()
+
+    async def refresh_analysis(self):
+        """현재 캐시로 연마 정책표와 배치 분석 갱신 (겹쳐서 호출되면 앞의 갱신이 끝난 뒤 실행)"""
+        if self._analysis_lock is None:
+            self._analysis_lock = asyncio.Lock()
+
+        async with self._analysis_lock:
+            await self.refresh_policy()
+            await self.refresh_batch_analysis()
+
+    async def refresh_policy(self):
+        """현재 캐시로 연마 정책표 재계산 (평가 수천 번이라 스레드에서 실행)"""
+        try:
+            await asyncio.to_thread(self.policy_solver.refresh)
+        except Exception as e:
+            print(f"Error refreshing enhancement policy: {e}")
+
+    async def refresh_batch_analysis(self):
+        """새 캐시 스냅샷으로 전체 연마 분석 매트릭스(JSON/CSV) 재생성"""
+        try:
+            await asyncio.to_thread(run_batch_analysis, self.price_cache)
+        except Exception as e:
+            print(f"Error running enhancement batch analysis: {e}")
+
+    async def retention_loop(self):
+        """매일 RETENTION_HOUR에 오래된 사이클 정리 (배치 삭제라 수집 쓰기와 번갈아 실행됨)"""
+        while True:
+            now = datetime.now()
+            next_run = now.replace(hour=RETENTION_HOUR, minute=0, second=0, microsecond=0)
+            if next_run <= now:
+                next_run += timedelta(days=1)
+            await asyncio.sleep((next_run - now).total_seconds())
+
+            try:
+                await asyncio.to_thread(compact_old_cycles, self.db)
+            except Exception as e:
+                print(f"Error compacting old price data: {e}")
+
+    async def run(self):
+        """수집 루프와 모니터링 루프를 함께 실행"""
+        print(f"Starting orchestrator at {datetime.now()}")
+        await self.delivery.start()
+        await self.delivery.post_status("경매장 모니터 시작")
+        # 파생 테이블(집계/팔찌 비정규화 행)에 빠진 기존 데이터가 있으면 먼저 채움
+        await asyncio.to_thread(backfill_all, self.db)
+        await self.refresh_policy()
+        try:
+            await asyncio.gather(
+                self.collector.run(),
+                self.monitor.run(),
+                self.tracker.run(),
+                self.retention_loop()
+            )
+        finally:
+            await self.close()
+
+    async def close(self):
+        await self.delivery.post_status("경매장 모니터 종료")
+        await self.delivery.close()
+        await self.requester.close()
+        self._rebuild_executor.shutdown(wait=False, cancel_futures=True)
+
+async def main():
+    db_manager = DatabaseManager()
+
+    # 수집용/모니터용 토큰을 하나의 풀로 합쳐서 사용
+    orchestrator = MarketOrchestrator(db_manager, tokens=config.price_tokens + config.monitor_tokens)
+    await orchestrator.run()
+
+if __name__ == "__main__":
+    asyncio.run(main())
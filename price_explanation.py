@@ -0,0 +1,110 @@
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import delete, select
+from database import *
+from cache_build_log import json_default
+
+"""
+"왜 이 가격인지" 설명 저장/조회 (README TODO: 키를 입력하면 왜 그 가격이 나왔는지 출력)
+- 캐시 빌드가 이미 계산한 중간값을 키별로 price_explanations 테이블에 저장
+  * 악세: 두 번째 최저가, 5배 상한, 표본 id/가격(낮은 순), 품질/거래 횟수 계수, 공통 옵션 값별 가치와 표본 수
+  * 팔찌: 패턴별 표본 수, 두 번째 최저가, 표본 id/가격
+- build_time은 캐시 파일의 last_update와 같음 -> 로드된 캐시와 같은 빌드의 설명을 찾음
+- 조회는 인덱스 한 번 (재빌드/디버그 출력 없음). 매물 단위 설명은 ItemEvaluator.explain_listing, CLI는 item_test.py
+"""
+
+KEEP_BUILDS = 3            # 이전 캐시를 쓰는 프로세스가 있을 수 있어서 최근 몇 번은 남김
+INSERT_BATCH_SIZE = 5000   # 쓰기 세션 하나에 넣는 행 수 (수집기 쓰기를 오래 막지 않음)
+
+def save_explanations(db_manager: DatabaseManager, build_time: datetime, rows: List[Dict[str, Any]]) -> int:
+    """
+    빌드 하나의 설명 행 저장 후 오래된 빌드 삭제. 반환값: 저장한 행 수
+    rows: {"window", "kind", "cache_key", "price", "sample_count", "details"} (MarketPriceCache.build_cache가 채움)
+    """
+    if build_time is None or not rows:
+        return 0
+
+    with db_manager.get_write_session() as session:
+        # 같은 빌드를 다시 저장하면 덮어씀
+        session.execute(delete(PriceExplanation).where(PriceExplanation.build_time == build_time))
+
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        with db_manager.get_write_session() as session:
+            session.bulk_insert_mappings(PriceExplanation, [
+                {**row, "build_time": build_time,
+                 "details": json.dumps(row["details"], ensure_ascii=False, separators=(",", ":"),
+                                       default=json_default)}
+                for row in rows[start:start + INSERT_BATCH_SIZE]
+            ])
+
+    with db_manager.get_write_session() as session:
+        builds = session.execute(
+            select(PriceExplanation.build_time).distinct().order_by(PriceExplanation.build_time.desc())
+        ).scalars().all()
+        if len(builds) > KEEP_BUILDS:
+            session.execute(delete(PriceExplanation).where(PriceExplanation.build_time <= builds[KEEP_BUILDS]))
+    return len(rows)
+
+def load_explanation(db_manager: DatabaseManager, kind: str, cache_key: str, window: str,
+                     build_time: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+    """
+    키 하나의 설명. build_time(보통 로드된 캐시의 last_update)과 같은 빌드를 우선, 없으면 가장 최근 빌드
+    반환값: 저장한 details에 build_time/window/kind/cache_key/price/sample_count/stale을 합친 dict
+    """
+    with db_manager.get_read_session() as session:
+        rows = session.execute(
+            select(PriceExplanation).where(
+                PriceExplanation.kind == kind,
+                PriceExplanation.cache_key == cache_key,
+                PriceExplanation.window == window,
+            ).order_by(PriceExplanation.build_time.desc())
+        ).scalars().all()
+        if not rows:
+            return None
+        row = next((row for row in rows if row.build_time == build_time), rows[0])
+        return {
+            "build_time": row.build_time,
+            "window": row.window,
+            "kind": row.kind,
+            "cache_key": row.cache_key,
+            "price": row.price,
+            "sample_count": row.sample_count,
+            "stale": build_time is not None and row.build_time != build_time,
+            **json.loads(row.details),
+        }
+
+def format_explanation(explanation: Dict[str, Any]) -> List[str]:
+    """load_explanation 결과를 출력용 줄 목록으로"""
+    lines = [f"[{explanation['kind']} {explanation['window']}] {explanation['cache_key']}"
+             f" (빌드 {explanation['build_time']:%Y-%m-%d %H:%M:%S}{', 현재 캐시와 다른 빌드' if explanation['stale'] else ''})"]
+    if explanation.get("skipped"):
+        lines.append(f"  표본 부족으로 캐시에 없음: 상한 이내 {explanation['samples']}개 (최소 3개)")
+    elif explanation["price"] is None:
+        lines.append(f"  표본 부족으로 캐시에 없음: {explanation['samples']}개 (최소 2개)")
+
+    if "items" in explanation:
+        lines.append(f"  매물 {explanation['items']}개 -> 다른 전용 옵션 제외 {explanation['filtered']}개, "
+                     f"공통 옵션 없는 매물 {explanation['base_items']}개"
+                     f"{'' if explanation['used_base_items'] else ' (없어서 필터링된 매물 전체 사용)'}")
+        lines.append(f"  두 번째 최저가 {explanation['second_lowest']:,} -> 상한 {explanation['price_cap']:,.0f} "
+                     f"이내 표본 {explanation['samples']}개")
+    else:
+        second_lowest = explanation["second_lowest"]
+        lines.append(f"  표본 {explanation['samples']}개"
+                     + (f", 두 번째 최저가 {second_lowest:,}" if second_lowest is not None else ""))
+
+    if "min_price" in explanation:
+        lines.append(f"  기본 가격(상한 이내 최저가) {explanation['min_price']:,}, 표준편차 {explanation['price_std']:,.0f}")
+        lines.append(f"  품질 계수 {explanation['quality_coefficient']:,.2f} (음수면 0), "
+                     f"거래 횟수 계수 {explanation['trade_count_coefficient']:,.2f} (양수면 0)")
+    if "common_base_price" in explanation:
+        lines.append(f"  공통 옵션 기준 가격 {explanation['common_base_price']:,} (값별 두 번째 최저가와의 차이가 가치, 표본 5개 이상)")
+    for option in explanation.get("common_options", []):
+        lines.append(f"  {option['option']} {option['value']:g}: 표본 {option['samples']}개, 가격 {option['price']:,}, "
+                     f"가치 {option['delta']:+,}{'' if option['used'] else ' (미반영)'}")
+
+    samples = ", ".join(f"#{sample_id} {price:,}" for sample_id, price in
+                        zip(explanation["sample_ids"], explanation["sample_prices"]))
+    lines.append(f"  표본(낮은 순): {samples}")
+    return lines
@@ -0,0 +1,111 @@
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from listing import AccessoryListing, BraceletListing
+from market_price_cache import COMBAT_STAT_THRESHOLDS, BASE_STAT_THRESHOLDS, SPEED_EFFECT
+
+"""
+가격 조회 실패(캐시 미스) 기록 -> 수집기가 남는 요청 예산으로 그 키를 채우는 검색을 추가로 실행
+- 스캐너가 평가한 실제 매물의 미스만 기록 (연마 정책 계산 같은 가상 매물은 기록하지 않음)
+- 같은 검색 프리셋으로 채워지는 미스는 하나로 합쳐서 횟수 순으로 꺼냄
+- 검색한 항목은 큐에서 빠지고, 나머지는 사이클마다 횟수가 절반으로 줄어서 오래된 미스는 밀려남
+- 옵션 없는 악세 키는 전체 수집이 이미 모든 페이지를 보므로 기록하지 않음
+"""
+
+MISS_DECAY = 0.5
+MAX_TRACKED_MISSES = 2000
+SEARCH_QUALITY = 60   # SearchPresetGenerator 기본 품질과 같음
+
+def threshold_range(thresholds: np.ndarray, value: float) -> Tuple[int, int]:
+    """캐시 키의 구간 값 -> 그 구간에 드는 실제 수치 범위 (첫 구간은 그보다 작은 값도 포함)"""
+    index = max(int(np.searchsorted(thresholds, value, side='right')) - 1, 0)
+    low = int(thresholds[index]) if index > 0 else 0
+    if index + 1 < len(thresholds):
+        high = int(thresholds[index + 1]) - 1
+    else:
+        high = int(thresholds[index] + (thresholds[index] - thresholds[index - 1])) - 1
+    return low, high
+
+class PriceMiss:
+    """검색 프리셋 하나로 채울 수 있는 미스 (kind: accessory / bracelet)"""
+    __slots__ = ("kind", "grade", "part", "label", "preset", "count", "last_seen")
+
+    def __init__(self, kind: str, grade: str, part: Optional[str], label: str, preset: Dict[str, Any]):
+        self.kind = kind
+        self.grade = grade
+        self.part = part
+        self.label = label
+        self.preset = preset
+        self.count = 0.0
+        self.last_seen = None
+
+class PriceMissTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._misses: Dict[tuple, PriceMiss] = {}
+
+    def __len__(self) -> int:
+        return len(self._misses)
+
+    def _record(self, key: tuple, kind: str, grade: str, part: Optional[str], label: str, preset: Dict[str, Any]):
+        with self._lock:
+            miss = self._misses.get(key)
+            if miss is None:
+                if len(self._misses) >= MAX_TRACKED_MISSES:
+                    return
+                miss = self._misses[key] = PriceMiss(kind, grade, part, label, preset)
+            miss.count += 1
+            miss.last_seen = datetime.now()
+
+    def record_accessory(self, listing: AccessoryListing, role: str, reference_options: Dict[str, Any]):
+        """역할 키(전용 옵션 조합)의 가격이 없는 악세 매물 기록. 프리셋은 create_search_data_acc 형식"""
+        scales = dict(listing.scaled_options())
+        options = tuple(sorted((name, scales.get(name, 1)) for name, _ in reference_options[f"{role}_exclusive"]))
+        if not options or listing.part is None:
+            return
+        label = f"{listing.grade}:{listing.part}:{listing.level}:{list(options)}"
+        preset = {'enhancement_level': listing.level, 'quality': SEARCH_QUALITY, 'options': list(options)}
+        self._record(("accessory", listing.grade, listing.part, listing.level, options),
+                     "accessory", listing.grade, listing.part, label, preset)
+
+    def record_bracelet(self, listing: BraceletListing, pattern_info: Optional[Tuple[str, Dict]]):
+        """
+        패턴 가격이 없는 팔찌 매물 기록 (pattern_info: MarketPriceCache._classify_bracelet_pattern 결과)
+        프리셋은 create_search_data_bracelet 형식, 수치는 캐시 키 구간 전체를 (최소, 최대) 범위로 검색
+        """
+        if not pattern_info:
+            return
+        pattern_type, details = pattern_info
+        options = [("팔찌 옵션 수량", "고정 효과 수량", listing.fixed_option_count),
+                   ("팔찌 옵션 수량", "부여 효과 수량", listing.extra_option_count)]
+        names = details["pattern"].split("+")
+        for index, (name, number) in enumerate(zip(names, details["numbers"])):
+            if pattern_type == "전특1+기본" and index == 1:
+                options.append(("팔찌 기본 효과", name, threshold_range(BASE_STAT_THRESHOLDS, number)))
+            else:
+                options.append(("전투 특성", name, threshold_range(COMBAT_STAT_THRESHOLDS, number)))
+        if pattern_type == "전특1+공이속":
+            options.append(("팔찌 특수 효과", SPEED_EFFECT, None))
+
+        label = "|".join((listing.grade, pattern_type, details["pattern"], details["values"], details["extra_slots"]))
+        self._record(("bracelet", label), "bracelet", listing.grade, None, label, {'options': options})
+
+    def pop_top(self, limit: int) -> List[PriceMiss]:
+        """자주 미스된 순으로 limit개를 꺼냄 (꺼낸 항목은 큐에서 제거)"""
+        if limit <= 0:
+            return []
+        with self._lock:
+            ranked = sorted(self._misses.items(), key=lambda entry: (-entry[1].count, entry[1].label))[:limit]
+            for key, _ in ranked:
+                del self._misses[key]
+        return [miss for _, miss in ranked]
+
+    def decay(self):
+        """사이클마다 호출: 횟수를 줄이고 1회 미만이 된 미스는 버림"""
+        with self._lock:
+            for key in list(self._misses):
+                miss = self._misses[key]
+                miss.count *= MISS_DECAY
+                if miss.count < 1:
+                    del self._misses[key]
@@ -0,0 +1,162 @@
+import argparse
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+from sqlalchemy import text
+from database import *
+from price_rollup import backfill_all
+
+"""
+오래된 시세 데이터 정리 (README TODO: 일주일 이상 된 데이터는 하루에 2~3개 timestamp만 남기기)
+- RETENTION_DAYS보다 오래된 날은 사이클을 하루 CYCLES_PER_DAY개만 남기고 상세 행(매물/옵션/스탯) 삭제
+- 사이클별 집계(price_rollup)는 모든 사이클을 그대로 보존 -> 대시보드 장기 추이는 집계 테이블로 그대로 보임
+- 삭제는 DELETE_BATCH_SIZE개 레코드씩 짧은 쓰기 트랜잭션으로 나눠서 수집기 쓰기를 오래 막지 않음
+- auto_vacuum=INCREMENTAL인 DB면 정리 후 빈 페이지를 조금씩 반환 (최초 전환은 --enable-incremental-vacuum)
+"""
+
+RETENTION_DAYS = 7
+CYCLES_PER_DAY = 3
+DELETE_BATCH_SIZE = 2000
+BATCH_PAUSE_SECONDS = 0.05   # 배치 사이에 다른 쓰기가 끼어들 틈
+VACUUM_PAGES_PER_STEP = 1000
+
+def cycle_datetime(cycle_id: str) -> datetime:
+    """search_cycle_id(YYYYmmdd_HHMM) -> datetime"""
+    return datetime.strptime(cycle_id, "%Y%m%d_%H%M")
+
+def select_cycles_to_drop(cycle_ids: List[str], now: datetime = None,
+                          retention_days: int = RETENTION_DAYS,
+                          cycles_per_day: int = CYCLES_PER_DAY) -> List[str]:
+    """보존 기간이 지난 날마다 사이클을 고르게 cycles_per_day개만 남기고 나머지 반환"""
+    now = now or datetime.now()
+    cutoff = (now - timedelta(days=retention_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    by_day: Dict = defaultdict(list)
+    for cycle_id in cycle_ids:
+        try:
+            cycle_time = cycle_datetime(cycle_id)
+        except ValueError:
+            continue  # 형식이 다른 사이클 id는 건드리지 않음
+        if cycle_time < cutoff:
+            by_day[cycle_time.date()].append(cycle_id)
+
+    to_drop = []
+    for day_cycles in by_day.values():
+        day_cycles.sort()
+        if len(day_cycles) <= cycles_per_day:
+            continue
+        # 하루 안에서 처음/중간/끝처럼 고르게 남김
+        step = (len(day_cycles) - 1) / (cycles_per_day - 1) if cycles_per_day > 1 else 0
+        keep = {day_cycles[round(i * step)] for i in range(cycles_per_day)}
+        to_drop.extend(cycle_id for cycle_id in day_cycles if cycle_id not in keep)
+    return sorted(to_drop)
+
+def _delete_in_batches(db_manager: DatabaseManager, id_query: str, child_deletes: List[str],
+                       parent_delete: str, cycle_ids: List[str]) -> int:
+    """사이클 목록의 레코드를 배치 단위로 삭제 (자식 테이블 먼저)"""
+    deleted = 0
+    for cycle_id in cycle_ids:
+        while True:
+            with db_manager.get_write_session() as session:
+                ids = [row[0] for row in session.execute(
+                    text(id_query), {"cycle_id": cycle_id, "limit": DELETE_BATCH_SIZE})]
+                if not ids:
+                    break
+                params = {f"id{i}": record_id for i, record_id in enumerate(ids)}
+                placeholders = ", ".join(f":id{i}" for i in range(len(ids)))
+                for statement in child_deletes + [parent_delete]:
+                    session.execute(text(statement.format(ids=placeholders)), params)
+                deleted += len(ids)
+            time.sleep(BATCH_PAUSE_SECONDS)
+    return deleted
+
+def compact_old_cycles(db_manager: DatabaseManager, now: datetime = None, dry_run: bool = False) -> Tuple[int, int]:
+    """
+    오래된 사이클의 상세 행 삭제. 반환값: (삭제한 악세 레코드 수, 삭제한 팔찌 레코드 수)
+    - 삭제 전에 집계/팔찌 비정규화 행 백필을 먼저 돌려서 요약이 빠지지 않게 함
+    """
+    start_time = datetime.now()
+    backfill_all(db_manager)
+
+    with db_manager.get_read_session() as session:
+        acc_cycles = [row[0] for row in session.execute(text("SELECT DISTINCT search_cycle_id FROM price_records"))]
+        bracelet_cycles = [row[0] for row in session.execute(
+            text("SELECT DISTINCT search_cycle_id FROM bracelet_price_records"))]
+
+    acc_drop = select_cycles_to_drop(acc_cycles, now)
+    bracelet_drop = select_cycles_to_drop(bracelet_cycles, now)
+    print(f"Retention: dropping {len(acc_drop)} accessory cycles, {len(bracelet_drop)} bracelet cycles")
+    if dry_run:
+        return 0, 0
+
+    acc_deleted = _delete_in_batches(
+        db_manager,
+        "SELECT id FROM price_records WHERE search_cycle_id = :cycle_id LIMIT :limit",
+        ["DELETE FROM item_options WHERE price_record_id IN ({ids})",
+         "DELETE FROM raw_item_options WHERE price_record_id IN ({ids})"],
+        "DELETE FROM price_records WHERE id IN ({ids})",
+        acc_drop,
+    )
+    bracelet_deleted = _delete_in_batches(
+        db_manager,
+        "SELECT id FROM bracelet_price_records WHERE search_cycle_id = :cycle_id LIMIT :limit",
+        ["DELETE FROM bracelet_flat_records WHERE bracelet_id IN ({ids})",
+         "DELETE FROM bracelet_combat_stats WHERE bracelet_id IN ({ids})",
+         "DELETE FROM bracelet_base_stats WHERE bracelet_id IN ({ids})",
+         "DELETE FROM bracelet_special_effects WHERE bracelet_id IN ({ids})"],
+        "DELETE FROM bracelet_price_records WHERE id IN ({ids})",
+        bracelet_drop,
+    )
+
+    reclaim_free_pages(db_manager)
+    print(f"Retention complete: deleted {acc_deleted} accessory / {bracelet_deleted} bracelet records "
+          f"({(datetime.now() - start_time).total_seconds():.2f} seconds)")
+    return acc_deleted, bracelet_deleted
+
+def reclaim_free_pages(db_manager: DatabaseManager) -> int:
+    """auto_vacuum=INCREMENTAL이면 빈 페이지를 조금씩 반환하고 WAL을 비움. 반환값: 반환한 페이지 수"""
+    # sqlite3 모듈의 execute는 문장을 한 번만 step해서 incremental_vacuum이 1페이지만 반환함
+    # -> 끝까지 실행하는 executescript를 쓰기 위해 DBAPI 커서를 직접 사용
+    connection = db_manager.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:  # 2 = INCREMENTAL
+            return 0
+        freed = 0
+        while True:
+            free_pages = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+            if not free_pages:
+                break
+            step = min(free_pages, VACUUM_PAGES_PER_STEP)
+            cursor.executescript(f"PRAGMA incremental_vacuum({step});")
+            freed += step
+            time.sleep(BATCH_PAUSE_SECONDS)
+        cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    finally:
+        connection.close()
+    if freed:
+        print(f"Incremental vacuum: reclaimed {freed} pages")
+    return freed
+
+def enable_incremental_vacuum(db_manager: DatabaseManager):
+    """auto_vacuum을 INCREMENTAL로 전환 (기존 DB는 전체 VACUUM이 한 번 필요해서 수집기를 멈춘 상태에서 실행)"""
+    with db_manager.engine.connect() as conn:
+        conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+        conn.execute(text("VACUUM"))
+        print(f"auto_vacuum = {conn.execute(text('PRAGMA auto_vacuum')).scalar()}")
+
+def main():
+    parser = argparse.ArgumentParser(description="오래된 시세 데이터 정리")
+    parser.add_argument("--dry-run", action="store_true", help="삭제할 사이클 수만 출력")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="auto_vacuum을 INCREMENTAL로 전환 (전체 VACUUM 1회)")
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager()
+    if args.enable_incremental_vacuum:
+        enable_incremental_vacuum(db_manager)
+    compact_old_cycles(db_manager, dry_run=args.dry_run)
+
+if __name__ == "__main__":
+    main()
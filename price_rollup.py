@@ -0,0 +1,185 @@
+from typing import Dict, List, Optional, Tuple, Iterable
+from datetime import datetime
+from sqlalchemy import text, case, func
+from sqlalchemy.dialects.sqlite import insert
+from database import *
+from listing import AccessoryListing, BraceletListing
+
+"""
+원본 가격 레코드에서 파생되는 조회용 테이블 관리
+- 사이클별 집계(rollup): 대시보드 추이 차트가 원본 전체 JOIN/GROUP_CONCAT 대신 사이클당 몇 백 행만 읽음
+- 팔찌 비정규화 행(bracelet_flat_records): 팔찌 1개 = 1행이라 스탯/효과 JOIN 팬아웃이 없음
+- 둘 다 수집기가 원본을 저장하는 같은 쓰기 세션에서 갱신 (집계는 같은 키를 UPSERT로 합침)
+- 기존 데이터는 backfill_rollups로 채움 (python price_rollup.py, 오케스트레이터 시작 시에도 실행)
+"""
+
+def accessory_options_key(scaled_options: Iterable[Tuple[str, int]]) -> str:
+    """(옵션, 하중상) -> "옵션 등급"을 정렬해서 ','로 연결"""
+    return ",".join(sorted(f"{name} {grade}" for name, grade in scaled_options))
+
+def bracelet_pattern_key(item: BraceletListing) -> Tuple[str, str, str]:
+    """(전투특성 값 포함, 기본스탯 종류, 특수효과 종류)"""
+    return (
+        ",".join(sorted(f"{stat} {int(value)}" for stat, value in item.combat_stats)),
+        ",".join(sorted(stat for stat, _ in item.base_stats)),
+        ",".join(sorted(effect for effect, _ in item.special_effects)),
+    )
+
+def _stats_str(stats) -> str:
+    return ",".join(f"{name} {value:g}" if value is not None else name for name, value in stats)
+
+def _accumulate(groups: Dict[tuple, dict], key: tuple, timestamp: datetime, price: int, detail: dict):
+    """한 매물을 그룹 집계에 반영 (최저가/두 번째 최저가/개수/합계)"""
+    group = groups.get(key)
+    if group is None:
+        groups[key] = {"timestamp": timestamp, "min_price": price, "second_price": None,
+                       "listing_count": 1, "price_sum": price, **detail}
+        return
+
+    group["timestamp"] = min(group["timestamp"], timestamp)
+    group["listing_count"] += 1
+    group["price_sum"] += price
+    if price < group["min_price"]:
+        group["second_price"] = group["min_price"]
+        group["min_price"] = price
+        group.update(detail)
+    elif group["second_price"] is None or price < group["second_price"]:
+        group["second_price"] = price
+
+def _upsert(session, model, key_columns: List[str], groups: Dict[tuple, dict], detail_columns: List[str]):
+    """집계 결과를 기존 행과 합쳐서 저장 (두 번째 최저가는 네 값 중 두 번째로 작은 값)"""
+    if not groups:
+        return
+    rows = [dict(zip(key_columns, key), **values) for key, values in groups.items()]
+    table = model.__table__
+    stmt = insert(table)
+    excluded = stmt.excluded
+    new_is_lower = excluded.min_price < table.c.min_price
+
+    update = {
+        "timestamp": func.min(table.c.timestamp, excluded.timestamp),
+        "min_price": func.min(table.c.min_price, excluded.min_price),
+        "second_price": case(
+            (new_is_lower, func.min(table.c.min_price, func.coalesce(excluded.second_price, table.c.min_price))),
+            else_=func.min(func.coalesce(table.c.second_price, excluded.min_price), excluded.min_price),
+        ),
+        "listing_count": table.c.listing_count + excluded.listing_count,
+        "price_sum": table.c.price_sum + excluded.price_sum,
+    }
+    for column in detail_columns:
+        update[column] = case((new_is_lower, getattr(excluded, column)), else_=getattr(table.c, column))
+
+    session.execute(stmt.on_conflict_do_update(index_elements=key_columns, set_=update), rows)
+
+ACC_KEY_COLUMNS = ["search_cycle_id", "grade", "part", "level", "options"]
+ACC_DETAIL_COLUMNS = ["min_name", "min_quality"]
+BRACELET_KEY_COLUMNS = ["search_cycle_id", "grade", "fixed_option_count", "extra_option_count",
+                        "combat_stats", "base_stats", "special_effects"]
+BRACELET_DETAIL_COLUMNS = ["min_base_stats", "min_special_effects"]
+
+def update_accessory_rollups(session, items: Iterable[AccessoryListing], search_cycle_id: str):
+    """저장한 악세 매물들을 집계 테이블에 반영 (수집기의 쓰기 세션 안에서 호출)"""
+    groups = {}
+    for item in items:
+        key = (search_cycle_id, item.grade, item.part, item.level, accessory_options_key(item.scaled_options()))
+        _accumulate(groups, key, item.timestamp, item.price,
+                    {"min_name": item.name, "min_quality": item.quality})
+    _upsert(session, AccessoryPriceRollup, ACC_KEY_COLUMNS, groups, ACC_DETAIL_COLUMNS)
+
+def update_bracelet_rollups(session, items: Iterable[BraceletListing], search_cycle_id: str):
+    """저장한 팔찌 매물들을 집계 테이블에 반영 (수집기의 쓰기 세션 안에서 호출)"""
+    groups = {}
+    for item in items:
+        key = (search_cycle_id, item.grade, item.fixed_option_count, item.extra_option_count,
+               *bracelet_pattern_key(item))
+        _accumulate(groups, key, item.timestamp, item.price,
+                    {"min_base_stats": _stats_str(item.base_stats),
+                     "min_special_effects": _stats_str(item.special_effects)})
+    _upsert(session, BraceletPriceRollup, BRACELET_KEY_COLUMNS, groups, BRACELET_DETAIL_COLUMNS)
+
+def add_bracelet_flat_records(session, saved: Iterable[Tuple[BraceletPriceRecord, BraceletListing]]):
+    """저장한 팔찌 레코드마다 비정규화 행 추가 (flush 후 호출해야 record.id가 있음)"""
+    session.bulk_insert_mappings(BraceletFlatRecord, [
+        {
+            "bracelet_id": record.id,
+            "timestamp": record.timestamp,
+            "search_cycle_id": record.search_cycle_id,
+            "grade": record.grade,
+            "name": record.name,
+            "trade_count": record.trade_count,
+            "price": record.price,
+            "end_time": record.end_time,
+            "fixed_option_count": record.fixed_option_count,
+            "extra_option_count": record.extra_option_count,
+            **item.flat_columns(),
+        }
+        for record, item in saved
+    ])
+
+def backfill_bracelet_flat(db_manager: DatabaseManager, chunk_size: int = 5000) -> int:
+    """비정규화 행이 없는 팔찌 레코드를 채움. 반환값: 추가한 행 수"""
+    total = 0
+    while True:
+        with db_manager.get_write_session() as session:
+            records = session.query(BraceletPriceRecord).filter(
+                ~BraceletPriceRecord.id.in_(session.query(BraceletFlatRecord.bracelet_id))
+            ).order_by(BraceletPriceRecord.id).limit(chunk_size).all()
+            if not records:
+                break
+            add_bracelet_flat_records(
+                session,
+                [(record, BraceletListing.from_record(record)) for record in records],
+            )
+            total += len(records)
+
+    if total:
+        print(f"Bracelet flat backfill complete: {total} records")
+    return total
+
+def backfill_rollups(db_manager: DatabaseManager) -> Tuple[int, int]:
+    """집계 테이블에 없는 사이클을 원본 레코드에서 채움. 반환값: (악세 사이클 수, 팔찌 사이클 수)"""
+    with db_manager.get_read_session() as session:
+        acc_cycles = [row[0] for row in session.execute(text("""
+            SELECT DISTINCT search_cycle_id FROM price_records
+            WHERE search_cycle_id NOT IN (SELECT DISTINCT search_cycle_id FROM accessory_price_rollups)
+        """))]
+        bracelet_cycles = [row[0] for row in session.execute(text("""
+            SELECT DISTINCT search_cycle_id FROM bracelet_flat_records
+            WHERE search_cycle_id NOT IN (SELECT DISTINCT search_cycle_id FROM bracelet_price_rollups)
+        """))]
+
+    for cycle_id in acc_cycles:
+        with db_manager.get_write_session() as session:
+            records = session.query(PriceRecord).filter(PriceRecord.search_cycle_id == cycle_id).all()
+            groups = {}
+            for record in records:
+                options_key = accessory_options_key((opt.option_name, opt.option_grade) for opt in record.options)
+                key = (cycle_id, record.grade, record.part, record.level, options_key)
+                _accumulate(groups, key, record.timestamp, record.price,
+                            {"min_name": record.name, "min_quality": record.quality})
+            _upsert(session, AccessoryPriceRollup, ACC_KEY_COLUMNS, groups, ACC_DETAIL_COLUMNS)
+
+    for cycle_id in bracelet_cycles:
+        with db_manager.get_write_session() as session:
+            # 비정규화 행에서 읽음 (backfill_all은 팔찌 행을 먼저 채움)
+            rows = session.query(BraceletFlatRecord).filter(BraceletFlatRecord.search_cycle_id == cycle_id).all()
+            groups = {}
+            for row in rows:
+                item = BraceletListing.from_flat(row)
+                key = (cycle_id, item.grade, item.fixed_option_count, item.extra_option_count,
+                       *bracelet_pattern_key(item))
+                _accumulate(groups, key, item.timestamp, item.price,
+                            {"min_base_stats": _stats_str(item.base_stats),
+                             "min_special_effects": _stats_str(item.special_effects)})
+            _upsert(session, BraceletPriceRollup, BRACELET_KEY_COLUMNS, groups, BRACELET_DETAIL_COLUMNS)
+
+    print(f"Rollup backfill complete: {len(acc_cycles)} accessory cycles, {len(bracelet_cycles)} bracelet cycles")
+    return len(acc_cycles), len(bracelet_cycles)
+
+def backfill_all(db_manager: DatabaseManager):
+    """모든 파생 테이블 백필"""
+    backfill_bracelet_flat(db_manager)
+    backfill_rollups(db_manager)
+
+if __name__ == "__main__":
+    backfill_all(DatabaseManager())